@@ -7,7 +7,7 @@ from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from apps.sign.authentication import ClaimsJWTAuthentication
 from .models import *
 from .serializers import *
 from utils import functionUtils
@@ -18,7 +18,7 @@ logger = logging.getLogger(__name__)
 
 # Create your views here.
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def findAll(request: Request):
     try:
@@ -33,7 +33,7 @@ def findAll(request: Request):
 
 
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def findById(request: Request, id):
     """
@@ -50,7 +50,7 @@ def findById(request: Request, id):
 
 
 @api_view(["POST"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def save(request: Request):
     try:
@@ -74,7 +74,7 @@ def save(request: Request):
 
 
 @api_view(["PATCH"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def update(request: Request):
     """
@@ -104,7 +104,7 @@ def update(request: Request):
 
 
 @api_view(["DELETE"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def delete(request: Request, id):
     """
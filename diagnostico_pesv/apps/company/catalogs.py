@@ -0,0 +1,48 @@
+from collections import defaultdict
+from types import MappingProxyType
+from utils.catalog import register_catalog
+from .ciiu_index import CiiuIndex
+from .models import (
+    Ciiu,
+    CompanySize,
+    MisionalitySizeCriteria,
+    Mission,
+    Segments,
+    SizeCriteria,
+)
+from .serializers import (
+    MisionalitySizeCriteriaSerializer,
+    MissionSerializer,
+    SegmentSerializer,
+)
+
+
+@register_catalog("segments", models=[Segments])
+def load_segments():
+    return tuple(SegmentSerializer(Segments.objects.all(), many=True).data)
+
+
+@register_catalog("missions", models=[Mission])
+def load_missions():
+    return tuple(MissionSerializer(Mission.objects.all(), many=True).data)
+
+
+@register_catalog(
+    "size_criteria_by_mission",
+    models=[MisionalitySizeCriteria, SizeCriteria, CompanySize, Mission],
+)
+def load_size_criteria_by_mission():
+    criteria = MisionalitySizeCriteria.objects.select_related(
+        "mission", "size", "criteria"
+    )
+    by_mission = defaultdict(list)
+    for row in MisionalitySizeCriteriaSerializer(criteria, many=True).data:
+        by_mission[row["mission_detail"]["id"]].append(row)
+    return MappingProxyType(
+        {mission_id: tuple(rows) for mission_id, rows in by_mission.items()}
+    )
+
+
+@register_catalog("ciius", models=[Ciiu])
+def load_ciius():
+    return CiiuIndex(Ciiu.objects.values("id", "name", "code"))
@@ -0,0 +1,71 @@
+import json
+from bisect import bisect_left
+from utils.functionUtils import normalize_search_terms
+
+# Mayor que cualquier caracter usado en codigos y nombres, cierra el rango del prefijo
+_PREFIX_END = "\uffff"
+
+
+class CiiuIndex:
+    """
+    Indice inmutable de los codigos CIIU para autocompletar.
+
+    Guarda los CIIU ordenados por codigo junto a dos arreglos ordenados para
+    buscar por prefijo con ``bisect``: los codigos y las palabras normalizadas
+    (sin tildes ni mayusculas) de los nombres. Cada fila se serializa a JSON una
+    sola vez al cargar el catalogo.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: row["code"] or "")
+        self.rows = tuple(rows)
+        self.ids = frozenset(row["id"] for row in rows)
+        self._codes = [row["code"] or "" for row in rows]
+        self._fragments = tuple(json.dumps(row, ensure_ascii=False) for row in rows)
+        words = sorted(
+            (word, position)
+            for position, row in enumerate(rows)
+            for word in normalize_search_terms(row["name"])
+        )
+        self._words = [word for word, _ in words]
+        self._word_positions = [position for _, position in words]
+
+    @staticmethod
+    def _prefix_range(keys, prefix):
+        return bisect_left(keys, prefix), bisect_left(keys, prefix + _PREFIX_END)
+
+    def _positions_by_code(self, prefix: str) -> set:
+        start, end = self._prefix_range(self._codes, prefix)
+        return set(range(start, end))
+
+    def _positions_by_name(self, terms) -> set:
+        positions = None
+        for term in terms:
+            start, end = self._prefix_range(self._words, term)
+            matches = set(self._word_positions[start:end])
+            positions = matches if positions is None else positions & matches
+            if not positions:
+                break
+        return positions or set()
+
+    def search(self, text: str, limit: int) -> list:
+        """
+        Posiciones (en orden de codigo) de los CIIU cuyo codigo empieza por
+        ``text`` o cuyo nombre tiene palabras que empiezan por cada palabra de
+        ``text``. Sin texto retorna los primeros ``limit``.
+        """
+        text = (text or "").strip()
+        if not text:
+            return list(range(min(limit, len(self.rows))))
+        positions = self._positions_by_code(text) | self._positions_by_name(
+            normalize_search_terms(text)
+        )
+        return sorted(positions)[:limit]
+
+    def render(self, positions) -> bytes:
+        """Arreglo JSON armado con los fragmentos ya serializados."""
+        fragments = ",".join(self._fragments[position] for position in positions)
+        return f"[{fragments}]".encode("utf-8")
+
+    def missing_ids(self, ids) -> set:
+        return set(ids) - self.ids
@@ -0,0 +1,126 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from apps.company.models import Company, CompanySearchToken
+from apps.company.service import CompanyService
+from apps.corporate_group.models import Corporate_Company_Diagnosis
+from utils.functionUtils import normalize_search_terms
+
+# Palabras para armar nombres de empresas de prueba
+WORDS = [
+    "transportes",
+    "logistica",
+    "andina",
+    "rapido",
+    "carga",
+    "pesada",
+    "servicios",
+    "integrales",
+    "del",
+    "caribe",
+    "pacifico",
+    "express",
+    "distribuciones",
+    "colombia",
+    "sas",
+    "ltda",
+]
+
+
+class Rollback(Exception):
+    """Descarta las empresas de prueba al terminar la medicion."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la busqueda de empresas del selector de grupos empresariales "
+        "(CompanyService.search) y muestra el plan de la consulta (EXPLAIN)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("text", nargs="+", help="Textos a buscar")
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument(
+            "--companies",
+            type=int,
+            default=0,
+            help="Crea esta cantidad de empresas de prueba (se descartan al final)",
+        )
+        parser.add_argument(
+            "--max-ms",
+            type=float,
+            default=50,
+            help="Falla si alguna busqueda tarda mas en promedio",
+        )
+
+    def seed(self, total):
+        started = Company.objects.count()
+        companies = Company.objects.bulk_create(
+            [
+                Company(
+                    name=" ".join(random.sample(WORDS, 4)) + f" {number}",
+                    nit=f"9{number:09d}",
+                )
+                for number in range(started, started + total)
+            ],
+            batch_size=2000,
+        )
+        CompanySearchToken.objects.bulk_create(
+            [
+                CompanySearchToken(company=company, token=token)
+                for company in companies
+                for token in normalize_search_terms(company.name)
+            ],
+            batch_size=5000,
+        )
+
+    def queryset(self, text):
+        """Misma consulta que companies_not_in_corporate, primera pagina."""
+        companies = Company.objects.filter(
+            ~Exists(
+                Corporate_Company_Diagnosis.objects.filter(
+                    corporate_id=0, company=OuterRef("pk")
+                )
+            )
+        ).order_by("name")
+        return CompanyService.search(companies, text)[:10]
+
+    def measure(self, text, iterations):
+        list(self.queryset(text))
+        started = time.perf_counter()
+        for _ in range(iterations):
+            list(self.queryset(text))
+        return (time.perf_counter() - started) / iterations * 1000
+
+    def report(self, options):
+        self.stdout.write(
+            f"{Company.objects.count()} empresas, "
+            f"{options['iterations']} iteraciones ({connection.vendor})"
+        )
+        slow = []
+        for text in options["text"]:
+            elapsed = self.measure(text, options["iterations"])
+            self.stdout.write(f"  {text!r:24} {elapsed:8.2f} ms/busqueda")
+            self.stdout.write(self.queryset(text).explain())
+            if elapsed > options["max_ms"]:
+                slow.append(text)
+        return slow
+
+    def handle(self, *args, **options):
+        slow = []
+        try:
+            with transaction.atomic():
+                if options["companies"]:
+                    self.seed(options["companies"])
+                slow = self.report(options)
+                if options["companies"]:
+                    raise Rollback()
+        except Rollback:
+            pass
+        if slow:
+            raise CommandError(
+                f"Busquedas sobre {options['max_ms']} ms: {', '.join(slow)}"
+            )
+        self.stdout.write(self.style.SUCCESS("Todas las busquedas bajo el limite"))
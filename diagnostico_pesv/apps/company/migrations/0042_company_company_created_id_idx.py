@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-19 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arl', '0001_initial'),
+        ('company', '0041_alter_company_enable_for_counting'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['created_at', 'id'], name='company_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1 on 2026-10-19 11:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+from utils.functionUtils import normalize_search_terms
+
+
+def index_company_names(apps, schema_editor):
+    Company = apps.get_model("company", "Company")
+    CompanySearchToken = apps.get_model("company", "CompanySearchToken")
+    tokens = [
+        CompanySearchToken(company_id=company_id, token=token)
+        for company_id, name in Company.objects.values_list("id", "name").iterator()
+        for token in normalize_search_terms(name)
+    ]
+    CompanySearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0042_company_company_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanySearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='company.company')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'company'], name='company_search_token_idx')],
+            },
+        ),
+        migrations.RunPython(index_company_names, migrations.RunPython.noop),
+    ]
@@ -58,3 +58,29 @@ class Company(SoftDeletes, Timestampable):
     )  # Añadido
     ciius = models.ManyToManyField(Ciiu, related_name="companies")
     enable_for_counting = models.BooleanField(default=True)
+
+    class Meta:
+        # Paginacion por llave (utils.pagination.KeysetPagination)
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="company_created_id_idx")
+        ]
+
+
+class CompanySearchToken(models.Model):
+    """
+    Palabras normalizadas (minusculas y sin tildes) del nombre de cada empresa.
+
+    Permite buscar por prefijo de palabra con el indice de ``token`` en vez de
+    recorrer la tabla de empresas con ``icontains``. Se mantiene desde
+    ``apps.company.signals`` al guardar la empresa.
+    """
+
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name="search_tokens"
+    )
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["token", "company"], name="company_search_token_idx")
+        ]
@@ -13,6 +13,9 @@ from apps.arl.serializers import ArlSerializer
 from apps.diagnosis.models import Diagnosis
 from apps.sign.models import User
 from apps.sign.serializers import UserDetailSerializer
+from django.db.models import Prefetch
+from utils.catalog import get_catalog
+from utils.serializers import DynamicFieldsMixin
 
 
 class MissionSerializer(serializers.ModelSerializer):
@@ -114,7 +117,7 @@ class DiagnosisInCompanySerializer(serializers.ModelSerializer):
         ]
 
 
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     segment = serializers.PrimaryKeyRelatedField(
         queryset=Segments.objects.all(), write_only=True
     )
@@ -170,11 +173,33 @@ class CompanySerializer(serializers.ModelSerializer):
         ]
 
     def get_misionality_size_criteria(self, obj):
-        # Get the related MisionalitySizeCriteria objects for this company
-        misionality_size_criteria = MisionalitySizeCriteria.objects.filter(
-            mission=obj.mission, size=obj.size
-        )
-        serializer = MisionalitySizeCriteriaSerializer(
-            misionality_size_criteria, many=True
-        )
-        return serializer.data
+        # Se toma del catalogo en memoria en vez de consultar por cada empresa
+        criteria_by_mission = get_catalog("size_criteria_by_mission").get()
+        return [
+            criteria
+            for criteria in criteria_by_mission.get(obj.mission_id, ())
+            if criteria["size_detail"]["id"] == obj.size_id
+        ]
+
+    @staticmethod
+    def setup_eager_loading(queryset, prefix: str = "", include_diagnosis=True):
+        """
+        Agrega al queryset las relaciones que usa el serializador, de modo que
+        la cantidad de consultas no depende de la cantidad de empresas.
+
+        :param prefix: Ruta de la empresa si el queryset es de otro modelo
+            (por ejemplo "company__" para diagnósticos).
+        :param include_diagnosis: Si es False no carga los diagnósticos de la empresa.
+        """
+        queryset = queryset.select_related(
+            *[f"{prefix}{name}" for name in ("segment", "mission", "arl", "size")]
+        ).prefetch_related(f"{prefix}ciius")
+        if include_diagnosis:
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    f"{prefix}company_diagnosis",
+                    queryset=Diagnosis.objects.select_related("type", "consultor"),
+                ),
+                f"{prefix}company_diagnosis__consultor__groups",
+            )
+        return queryset
@@ -1,7 +1,19 @@
 # service.py
 from .models import *
 from apps.sign.models import User
-from django.core.exceptions import ObjectDoesNotExist
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Sum
+from utils.catalog import get_catalog
+from utils.functionUtils import normalize_search_terms
+from .size_index import company_size_index
+
+DIAGNOSIS_SUMMARY_VERSION_KEY = "company:diagnosis_summary:version"
+COMPANY_NIT_KEY = "company:nit:{}"
+COMPANY_DETAIL_KEY = "company:detail:{}"
+# Se guarda en cache para los NIT que no existen (cache negativa)
+NIT_NOT_FOUND = 0
 
 
 class CompanyService:
@@ -14,6 +26,9 @@ class CompanyService:
     class ConsultorNotFound(Exception):
         pass
 
+    class CiiuNotFound(Exception):
+        pass
+
     @staticmethod
     def validate_nit(nit):
         if Company.objects.filter(nit=nit).exists():
@@ -26,6 +41,14 @@ class CompanyService:
                 "La empresa con este nombre ya existe."
             )
 
+    @staticmethod
+    def validate_ciius(ciius_ids):
+        missing = get_catalog("ciius").get().missing_ids(ciius_ids)
+        if missing:
+            raise CompanyService.CiiuNotFound(
+                f"Los codigos CIIU {sorted(missing)} no existen"
+            )
+
     @staticmethod
     def validate_consultor(consultor_id):
         if not User.objects.filter(pk=consultor_id).exists():
@@ -37,43 +60,218 @@ class CompanyService:
 
     @staticmethod
     def determine_company_size(mission_id, total_vehicles: int, total_drivers: int):
-        try:
-            # Obtener todos los criterios de tamaño para la misión específica
-            misionality_criteria = MisionalitySizeCriteria.objects.filter(
-                mission_id=mission_id
-            )
-            selected_size = None
-            for criteria in misionality_criteria:
-                size_criteria = criteria.criteria
-
-                # Comprobar los valores de vehículos y conductores
-                vehicle_in_range = (
-                    size_criteria.vehicle_min
-                    <= total_vehicles
-                    <= (size_criteria.vehicle_max or float("inf"))
+        # Los criterios por misionalidad se resuelven en memoria (ver size_index)
+        selected_size = company_size_index.lookup(
+            mission_id, total_vehicles, total_drivers
+        )
+        if selected_size:
+            return selected_size
+
+        raise ValueError(
+            f"No se pudo determinar el tamaño de la organización para mission_id={mission_id} con total_vehicles={total_vehicles} y total_drivers={total_drivers}."
+        )
+
+    @staticmethod
+    def get_company_totals(company_ids):
+        """
+        Obtiene los totales de vehiculos y conductores del ultimo conteo de cada empresa.
+
+        :param company_ids: Ids de las empresas a consultar.
+        :return: Diccionario {company_id: (total_vehicles, total_drivers)}.
+        """
+        # Import local para evitar dependencias circulares
+        from apps.diagnosis_counter.models import Diagnosis_Counter, Fleet, Driver
+
+        last_counters = dict(
+            Diagnosis_Counter.objects.filter(company_id__in=company_ids)
+            .values("company_id")
+            .annotate(last_id=Max("id"))
+            .values_list("last_id", "company_id")
+        )
+        vehicles = dict(
+            Fleet.objects.filter(diagnosis_counter_id__in=last_counters)
+            .values("diagnosis_counter_id")
+            .annotate(
+                total=Sum(
+                    F("quantity_owned")
+                    + F("quantity_third_party")
+                    + F("quantity_arrended")
+                    + F("quantity_contractors")
+                    + F("quantity_intermediation")
+                    + F("quantity_leasing")
+                    + F("quantity_renting")
+                    + F("quantity_employees")
                 )
-                driver_in_range = (
-                    size_criteria.driver_min
-                    <= total_drivers
-                    <= (size_criteria.driver_max or float("inf"))
+            )
+            .values_list("diagnosis_counter_id", "total")
+        )
+        drivers = dict(
+            Driver.objects.filter(diagnosis_counter_id__in=last_counters)
+            .values("diagnosis_counter_id")
+            .annotate(total=Sum("quantity"))
+            .values_list("diagnosis_counter_id", "total")
+        )
+        return {
+            company_id: (vehicles.get(counter_id) or 0, drivers.get(counter_id) or 0)
+            for counter_id, company_id in last_counters.items()
+        }
+
+    @staticmethod
+    def classify(companies):
+        """
+        Recalcula en bloque el tamaño de varias empresas segun su ultimo conteo.
+
+        Las empresas sin conteo, sin misionalidad o cuyo conteo no encaja en
+        ningun criterio conservan su tamaño actual.
+
+        :param companies: Iterable de instancias de Company.
+        :return: Lista de empresas cuyo tamaño cambio.
+        """
+        companies = [company for company in companies if company.mission_id]
+        totals = CompanyService.get_company_totals([c.id for c in companies])
+        changed = []
+        for company in companies:
+            if company.id not in totals:
+                continue
+            size_id = company_size_index.lookup(company.mission_id, *totals[company.id])
+            if size_id and size_id != company.size_id:
+                company.size_id = size_id
+                changed.append(company)
+        if changed:
+            Company.objects.bulk_update(changed, ["size"])
+        return changed
+
+    @staticmethod
+    def diagnosis_summary(arl_id=None, segment_id=None):
+        """
+        Empresas anotadas con el total de diagnósticos, los finalizados y los
+        que estan en progreso, en una sola consulta agrupada.
+
+        :param arl_id: Filtra por ARL si se indica.
+        :param segment_id: Filtra por segmento si se indica.
+        :return: Queryset de Company con total_diagnostics,
+            finalized_diagnostics e in_progress_diagnostics.
+        """
+        # Los diagnósticos eliminados (soft delete) no se cuentan
+        active = Q(company_diagnosis__deleted_at__isnull=True)
+        companies = Company.objects.annotate(
+            total_diagnostics=Count("company_diagnosis", filter=active),
+            finalized_diagnostics=Count(
+                "company_diagnosis",
+                filter=active & Q(company_diagnosis__is_finalized=True),
+            ),
+            in_progress_diagnostics=Count(
+                "company_diagnosis",
+                filter=active & Q(company_diagnosis__in_progress=True),
+            ),
+        )
+        if arl_id:
+            companies = companies.filter(arl_id=arl_id)
+        if segment_id:
+            companies = companies.filter(segment_id=segment_id)
+        return companies
+
+    @staticmethod
+    def diagnosis_summary_cache_key(params: dict) -> str:
+        """Llave de cache del resumen para la version vigente y los parametros."""
+        version = cache.get(DIAGNOSIS_SUMMARY_VERSION_KEY)
+        if version is None:
+            cache.add(DIAGNOSIS_SUMMARY_VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(DIAGNOSIS_SUMMARY_VERSION_KEY)
+        query = "&".join(f"{key}={params.get(key, '')}" for key in sorted(params))
+        return f"company:diagnosis_summary:{version}:{query}"
+
+    @staticmethod
+    def invalidate_diagnosis_summary():
+        cache.set(DIAGNOSIS_SUMMARY_VERSION_KEY, uuid.uuid4().hex, None)
+
+    @staticmethod
+    def index_company_name(company):
+        """Reemplaza las palabras de busqueda de la empresa segun su nombre."""
+        CompanySearchToken.objects.filter(company=company).delete()
+        CompanySearchToken.objects.bulk_create(
+            CompanySearchToken(company=company, token=token)
+            for token in normalize_search_terms(company.name)
+        )
+
+    @staticmethod
+    def search(queryset, text: str):
+        """
+        Filtra empresas cuyo NIT empiece por ``text`` o cuyo nombre tenga una
+        palabra que empiece por cada palabra de ``text`` (sin tildes ni
+        mayusculas). Ambas condiciones buscan por prefijo en sus indices.
+
+        Se usa ``istartswith``: en MySQL ``startswith`` genera ``LIKE BINARY``,
+        que no usa los indices con collation ``_ci``. Los tokens ya estan en
+        minusculas y sin tildes, asi que el resultado es el mismo. Ver el
+        comando ``benchmark_company_search``.
+
+        :param queryset: Queryset de Company a filtrar.
+        :param text: Texto escrito por el usuario.
+        """
+        terms = normalize_search_terms(text)
+        if not terms:
+            return queryset
+        name_match = Q()
+        for term in terms:
+            name_match &= Exists(
+                CompanySearchToken.objects.filter(
+                    company=OuterRef("pk"), token__istartswith=term
                 )
-                # Si ambos criterios se cumplen, devolvemos el tamaño mayor
-                if vehicle_in_range and driver_in_range:
-                    return criteria.size.id
+            )
+        return queryset.filter(name_match | Q(nit__istartswith=text.strip()))
 
-                # Si solo uno de los criterios se cumple, guardamos temporalmente el tamaño
-                if vehicle_in_range or driver_in_range:
-                    selected_size = criteria.size.id
+    @staticmethod
+    def find_serialized_by_nit(nit: str):
+        """
+        Empresa serializada (CompanySerializer) para el NIT, desde cache.
 
-            # Si se encontró al menos un criterio que coincida, devolvemos el tamaño seleccionado
-            if selected_size:
-                return selected_size
+        La cache guarda NIT -> id (o NIT_NOT_FOUND por COMPANY_NIT_NEGATIVE_TTL
+        segundos) y id -> datos serializados, que se invalida al guardar la
+        empresa, sus CIIU o sus diagnósticos (ver signals).
 
-            raise ValueError(
-                f"No se pudo determinar el tamaño de la organización para mission_id={mission_id} con total_vehicles={total_vehicles} y total_drivers={total_drivers}."
+        :return: Diccionario con la empresa o None si el NIT no existe.
+        """
+        from .serializers import CompanySerializer
+
+        nit_key = COMPANY_NIT_KEY.format(nit)
+        company_id = cache.get(nit_key)
+        if company_id is None:
+            company_id = (
+                Company.objects.filter(nit=nit).values_list("id", flat=True).first()
+                or NIT_NOT_FOUND
+            )
+            cache.set(
+                nit_key,
+                company_id,
+                (
+                    settings.COMPANY_NIT_CACHE_TTL
+                    if company_id
+                    else settings.COMPANY_NIT_NEGATIVE_TTL
+                ),
             )
-        except ObjectDoesNotExist:
-            raise ValueError(f"El valor de mission_id={mission_id} no es válido.")
+        if company_id == NIT_NOT_FOUND:
+            return None
+
+        detail_key = COMPANY_DETAIL_KEY.format(company_id)
+        company_data = cache.get(detail_key)
+        if company_data is None:
+            company = CompanySerializer.setup_eager_loading(
+                Company.objects.filter(pk=company_id)
+            ).first()
+            if company is None:
+                cache.delete(nit_key)
+                return None
+            company_data = CompanySerializer(company).data
+            cache.set(detail_key, company_data, settings.COMPANY_NIT_CACHE_TTL)
+        return company_data
+
+    @staticmethod
+    def invalidate_company_cache(company_id, nit=None):
+        keys = [COMPANY_DETAIL_KEY.format(company_id)]
+        if nit:
+            keys.append(COMPANY_NIT_KEY.format(nit))
+        cache.delete_many(keys)
 
     @staticmethod
     def get_company(company_id):
@@ -82,13 +280,13 @@ class CompanyService:
     @staticmethod
     def update_company_size(company, total_vehicles, total_drivers):
         company_size_id = CompanyService.determine_company_size(
-            company.mission.id, total_vehicles, total_drivers
+            company.mission_id, total_vehicles, total_drivers
         )
         return CompanySize.objects.get(pk=company_size_id)
 
     @staticmethod
     def update_company_size_highest(company, total_vehicles, total_drivers):
         company_size_id = CompanyService.determine_company_size(
-            company.mission.id, total_vehicles, total_drivers
+            company.mission_id, total_vehicles, total_drivers
         )
         return CompanySize.objects.get(pk=company_size_id)
@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from apps.diagnosis.models import Diagnosis
+from .models import Company, MisionalitySizeCriteria, SizeCriteria
+from .service import CompanyService
+from .size_index import company_size_index
+
+
+def resize_companies_of_missions(mission_ids):
+    # Se invalida al confirmar, antes de reclasificar, para no depender del
+    # orden en que se ejecutan los callbacks on_commit del catalogo
+    company_size_index.invalidate()
+    companies = Company.objects.filter(mission_id__in=mission_ids)
+    CompanyService.classify(companies)
+
+
+@receiver([post_save, post_delete], sender=SizeCriteria)
+def size_criteria_changed(sender, instance, **kwargs):
+    mission_ids = list(
+        MisionalitySizeCriteria.objects.filter(criteria=instance)
+        .values_list("mission_id", flat=True)
+        .distinct()
+    )
+    transaction.on_commit(lambda: resize_companies_of_missions(mission_ids))
+
+
+@receiver([post_save, post_delete], sender=MisionalitySizeCriteria)
+def misionality_size_criteria_changed(sender, instance, **kwargs):
+    mission_ids = [instance.mission_id]
+    transaction.on_commit(lambda: resize_companies_of_missions(mission_ids))
+
+
+SUMMARY_FIELDS = {"company", "is_finalized", "in_progress", "deleted_at"}
+
+
+@receiver([post_save, post_delete], sender=Company)
+def company_changed(sender, instance, **kwargs):
+    company_id, nit = instance.id, instance.nit
+    transaction.on_commit(
+        lambda: CompanyService.invalidate_company_cache(company_id, nit)
+    )
+    transaction.on_commit(CompanyService.invalidate_diagnosis_summary)
+
+
+@receiver(m2m_changed, sender=Company.ciius.through)
+def company_ciius_changed(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(
+        instance, Company
+    ):
+        company_id = instance.id
+        transaction.on_commit(
+            lambda: CompanyService.invalidate_company_cache(company_id)
+        )
+
+
+@receiver(post_save, sender=Company)
+def index_company_name(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or "name" in update_fields:
+        CompanyService.index_company_name(instance)
+
+
+@receiver([post_save, post_delete], sender=Diagnosis)
+def diagnosis_changed(sender, instance, update_fields=None, **kwargs):
+    # La empresa en cache incluye sus diagnósticos
+    company_id = instance.company_id
+    if company_id:
+        transaction.on_commit(
+            lambda: CompanyService.invalidate_company_cache(company_id)
+        )
+    # Solo cambia el resumen si cambia la empresa o el estado del diagnóstico
+    if update_fields is not None and not SUMMARY_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(CompanyService.invalidate_diagnosis_summary)
@@ -0,0 +1,69 @@
+from collections import defaultdict
+from types import MappingProxyType
+from utils.catalog import get_catalog, register_catalog
+from .models import MisionalitySizeCriteria, SizeCriteria
+
+INFINITE = float("inf")
+SIZE_RANGES_CATALOG = "company_size_ranges"
+
+
+@register_catalog(SIZE_RANGES_CATALOG, models=[SizeCriteria, MisionalitySizeCriteria])
+def load_size_ranges():
+    ranges_by_mission = defaultdict(list)
+    rows = MisionalitySizeCriteria.objects.order_by("id").values_list(
+        "mission_id",
+        "size_id",
+        "criteria__vehicle_min",
+        "criteria__vehicle_max",
+        "criteria__driver_min",
+        "criteria__driver_max",
+    )
+    for mission_id, size_id, v_min, v_max, d_min, d_max in rows:
+        # El valor NULL (o 0) en los maximos representa sin limite
+        ranges_by_mission[mission_id].append(
+            (v_min, v_max or INFINITE, d_min, d_max or INFINITE, size_id)
+        )
+    return MappingProxyType(
+        {mission: tuple(ranges) for mission, ranges in ranges_by_mission.items()}
+    )
+
+
+class CompanySizeIndex:
+    """
+    Indice en memoria (por proceso) de los criterios de tamaño por misionalidad.
+
+    Los rangos viven en el catalogo ``company_size_ranges`` (ver utils.catalog),
+    que se recarga en todos los procesos cuando cambian ``SizeCriteria`` o
+    ``MisionalitySizeCriteria``. Cada misionalidad guarda sus rangos como
+    tuplas ``(vehicle_min, vehicle_max, driver_min, driver_max, size_id)`` en el
+    mismo orden en que se evaluaban en base de datos.
+    """
+
+    def _get_ranges(self):
+        return get_catalog(SIZE_RANGES_CATALOG).get()
+
+    def invalidate(self):
+        get_catalog(SIZE_RANGES_CATALOG).invalidate()
+
+    def lookup(self, mission_id, total_vehicles: int, total_drivers: int):
+        """
+        Retorna el id del tamaño que corresponde a los totales dados o None.
+
+        Igual que la version original: si un criterio cumple vehiculos y
+        conductores se retorna de inmediato, si no se retorna el ultimo que
+        cumpla al menos uno de los dos.
+        """
+        selected_size = None
+        for v_min, v_max, d_min, d_max, size_id in self._get_ranges().get(
+            mission_id, ()
+        ):
+            vehicle_in_range = v_min <= total_vehicles <= v_max
+            driver_in_range = d_min <= total_drivers <= d_max
+            if vehicle_in_range and driver_in_range:
+                return size_id
+            if vehicle_in_range or driver_in_range:
+                selected_size = size_id
+        return selected_size
+
+
+company_size_index = CompanySizeIndex()
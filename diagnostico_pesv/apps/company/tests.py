@@ -63,4 +63,459 @@ class CompanyTests(TestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.company.refresh_from_db()
-        self.assertIsNotNone(self.company.deleted_at)  # Asumiendo que tienes un campo deleted_at para soft deletes
\ No newline at end of file
+        self.assertIsNotNone(self.company.deleted_at)  # Asumiendo que tienes un campo deleted_at para soft deletes
+
+class CompanySizeIndexTests(TestCase):
+    def setUp(self):
+        from .models import Mission, CompanySize, SizeCriteria, MisionalitySizeCriteria
+        from .size_index import company_size_index
+
+        self.index = company_size_index
+        self.index.invalidate()
+        self.mission = Mission.objects.create(name="Mision")
+        self.basic = CompanySize.objects.create(name="BASICO")
+        self.advanced = CompanySize.objects.create(name="AVANZADO")
+        self.basic_criteria = SizeCriteria.objects.create(
+            name="Basico", vehicle_min=11, vehicle_max=19, driver_min=2, driver_max=19
+        )
+        self.advanced_criteria = SizeCriteria.objects.create(
+            name="Avanzado",
+            vehicle_min=20,
+            vehicle_max=None,
+            driver_min=20,
+            driver_max=None,
+        )
+        MisionalitySizeCriteria.objects.create(
+            mission=self.mission, size=self.basic, criteria=self.basic_criteria
+        )
+        MisionalitySizeCriteria.objects.create(
+            mission=self.mission, size=self.advanced, criteria=self.advanced_criteria
+        )
+
+    def test_lookup_is_served_from_memory(self):
+        self.index.lookup(self.mission.id, 0, 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.index.lookup(self.mission.id, 15, 5), self.basic.id)
+            self.assertEqual(
+                self.index.lookup(self.mission.id, 500, 500), self.advanced.id
+            )
+            # Solo cumple por conductores
+            self.assertEqual(self.index.lookup(self.mission.id, 0, 30), self.advanced.id)
+            self.assertIsNone(self.index.lookup(self.mission.id, 0, 0))
+
+    def test_criteria_change_invalidates_index(self):
+        self.assertEqual(self.index.lookup(self.mission.id, 25, 5), self.advanced.id)
+        self.basic_criteria.vehicle_max = 30
+        with self.captureOnCommitCallbacks(execute=True):
+            self.basic_criteria.save()
+        self.assertEqual(self.index.lookup(self.mission.id, 25, 5), self.basic.id)
+
+    def test_classify_resizes_companies_from_last_count(self):
+        from apps.diagnosis.models import Diagnosis
+        from apps.diagnosis_counter.models import Diagnosis_Counter, Driver
+        from .service import CompanyService
+
+        company = Company.objects.create(
+            name="Empresa", nit="9001", mission=self.mission, size=self.basic
+        )
+        diagnosis = Diagnosis.objects.create(company=company, date_elabored="2024-01-01")
+        counter = Diagnosis_Counter.objects.create(company=company, diagnosis=diagnosis)
+        Driver.objects.create(diagnosis_counter=counter, quantity=40)
+
+        changed = CompanyService.classify([company])
+
+        self.assertEqual(changed, [company])
+        company.refresh_from_db()
+        self.assertEqual(company.size_id, self.advanced.id)
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="catalogo", password="clave")
+        self.client.force_authenticate(user=self.user)
+        Segments.objects.create(name="Transporte")
+        self.url = reverse("company-findAllSegments")
+
+    def test_conditional_get_returns_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["name"] for row in response.data], ["Transporte"])
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_changes_version(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Segments.objects.create(name="Carga")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data), 2)
+
+
+class CompanyQueryBudgetTests(TestCase):
+    MAX_QUERIES = 8
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="budget", password="clave", cedula="budget"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("company-list")
+
+    def create_companies(self, total):
+        from django.contrib.auth.models import Group
+        from apps.arl.models import Arl
+        from apps.diagnosis.models import Diagnosis
+        from .models import Ciiu, CompanySize, Mission
+
+        group, _ = Group.objects.get_or_create(name="Consultor")
+        for _ in range(total):
+            number = Company.objects_with_deleted.count()
+            consultor = User.objects.create_user(
+                username=f"consultor{number}", password="clave", cedula=f"{number}"
+            )
+            consultor.groups.add(group)
+            company = Company.objects.create(
+                name=f"Empresa {number}",
+                nit=f"900{number}",
+                segment=Segments.objects.create(name=f"Segmento {number}"),
+                mission=Mission.objects.create(name=f"Mision {number}"),
+                arl=Arl.objects.create(name=f"Arl {number}"),
+                size=CompanySize.objects.create(name=f"Tamaño {number}"),
+            )
+            company.ciius.add(Ciiu.objects.create(name="Ciiu", code=f"C{number}"))
+            for _ in range(2):
+                Diagnosis.objects.create(
+                    company=company, consultor=consultor, date_elabored="2024-01-01"
+                )
+
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # Como en una peticion real, el usuario (y sus grupos) se carga de nuevo
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        self.create_companies(1)
+        few, _ = self.count_queries(self.url)
+        self.create_companies(4)
+        many, response = self.count_queries(self.url)
+
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, self.MAX_QUERIES)
+
+    def test_retrieve_query_budget(self):
+        self.create_companies(1)
+        company = Company.objects.get()
+        queries, response = self.count_queries(
+            reverse("company-detail", args=[company.id])
+        )
+        self.assertLessEqual(queries, self.MAX_QUERIES)
+        self.assertEqual(len(response.data["company_diagnosis"]), 2)
+
+    def test_fields_param_limits_payload(self):
+        self.create_companies(2)
+        queries, response = self.count_queries(f"{self.url}?fields=id,name")
+        self.assertEqual(set(response.data[0]), {"id", "name"})
+        self.assertLessEqual(queries, self.MAX_QUERIES)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(
+                username="pages", password="clave", cedula="pages"
+            )
+        )
+        for number in range(5):
+            Company.objects.create(name=f"Empresa {number}", nit=f"800{number}")
+        # Empates en created_at se resuelven por id
+        Company.objects.update(created_at=timezone.now())
+        self.url = reverse("company-list")
+
+    def test_walks_all_pages_without_repeating_rows(self):
+        ids = []
+        url = f"{self.url}?page_size=2&fields=id"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            ids += [row["id"] for row in response.data["results"]]
+            url = response.data["next"]
+
+        expected = list(Company.objects.order_by("-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_without_params_returns_plain_list(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f"{self.url}?cursor=invalido")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class DiagnosisByCompanyTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.arl.models import Arl
+        from apps.diagnosis.models import Diagnosis
+
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(
+                username="summary", password="clave", cedula="summary"
+            )
+        )
+        self.arl = Arl.objects.create(name="Arl")
+        self.companies = []
+        for number in range(3):
+            company = Company.objects.create(
+                name=f"Empresa {number}",
+                nit=f"700{number}",
+                arl=self.arl if number else None,
+            )
+            Diagnosis.objects.create(
+                company=company, date_elabored="2024-01-01", is_finalized=True
+            )
+            Diagnosis.objects.create(
+                company=company, date_elabored="2024-01-01", in_progress=True
+            )
+            Diagnosis.objects.create(company=company, date_elabored="2024-01-01")
+            self.companies.append(company)
+        Diagnosis.objects.get(company=self.companies[0], in_progress=True).delete()
+        self.url = reverse("company-diagnosis-by-company")
+
+    def test_single_query_with_filters(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{self.url}?arl={self.arl.id}")
+        self.assertEqual(
+            sorted(row["name"] for row in response.data), ["Empresa 1", "Empresa 2"]
+        )
+        self.assertEqual(
+            {
+                key: response.data[0][key]
+                for key in (
+                    "total_diagnostics",
+                    "finalized_diagnostics",
+                    "in_progress_diagnostics",
+                )
+            },
+            {
+                "total_diagnostics": 3,
+                "finalized_diagnostics": 1,
+                "in_progress_diagnostics": 1,
+            },
+        )
+
+    def test_cached_until_diagnosis_changes_state(self):
+        from apps.diagnosis.models import Diagnosis
+
+        first = {row["id"]: row for row in self.client.get(self.url).data}
+        self.assertEqual(first[self.companies[0].id]["total_diagnostics"], 2)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        diagnosis = Diagnosis.objects.filter(
+            company=self.companies[0], is_finalized=False
+        ).get()
+        diagnosis.is_finalized = True
+        with self.captureOnCommitCallbacks(execute=True):
+            diagnosis.save()
+
+        second = {row["id"]: row for row in self.client.get(self.url).data}
+        self.assertEqual(second[self.companies[0].id]["finalized_diagnostics"], 2)
+
+    def test_paginated(self):
+        response = self.client.get(f"{self.url}?page_size=2")
+        self.assertEqual(len(response.data["results"]), 2)
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+
+
+class CompanySearchTests(TestCase):
+    def setUp(self):
+        from apps.corporate_group.models import Corporate, Corporate_Company_Diagnosis
+
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(
+                username="search", password="clave", cedula="search"
+            )
+        )
+        self.rapido = Company.objects.create(
+            name="Transportes El Rápido S.A.S", nit="9001234567"
+        )
+        self.logistica = Company.objects.create(
+            name="Logística Andina", nit="8009876543"
+        )
+        self.grouped = Company.objects.create(name="Rápido Express", nit="9005555555")
+        self.corporate = Corporate.objects.create(name="Grupo")
+        Corporate_Company_Diagnosis.objects.create(
+            corporate=self.corporate, company=self.grouped
+        )
+
+    def search(self, text):
+        from .service import CompanyService
+
+        return set(
+            CompanyService.search(Company.objects.all(), text).values_list(
+                "id", flat=True
+            )
+        )
+
+    def test_matches_word_prefix_without_accents(self):
+        self.assertEqual(self.search("rapi"), {self.rapido.id, self.grouped.id})
+        self.assertEqual(self.search("LOGISTICA and"), {self.logistica.id})
+        self.assertEqual(self.search("tra rap"), {self.rapido.id})
+        self.assertEqual(self.search("ndina"), set())
+
+    def test_matches_nit_prefix(self):
+        self.assertEqual(self.search("800987"), {self.logistica.id})
+
+    def test_benchmark_discards_seeded_companies(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command(
+            "benchmark_company_search",
+            "rapi",
+            companies=50,
+            iterations=1,
+            max_ms=10_000,
+            stdout=out,
+        )
+        self.assertIn("53 empresas", out.getvalue())
+        self.assertEqual(Company.objects.count(), 3)
+
+    def test_rename_reindexes(self):
+        self.logistica.name = "Carga Pesada"
+        self.logistica.save()
+        self.assertEqual(self.search("logistica"), set())
+        self.assertEqual(self.search("pesada"), {self.logistica.id})
+
+    def test_companies_not_in_corporate(self):
+        url = reverse("corporate-companies-not-in-corporate")
+        response = self.client.get(
+            url, {"corporate": self.corporate.id, "search": "rapido"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row["id"] for row in response.data["results"]], [self.rapido.id]
+        )
+
+
+class CiiuIndexTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Ciiu
+
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(
+                username="ciiu", password="clave", cedula="ciiu"
+            )
+        )
+        self.cultivo = Ciiu.objects.create(code="0111", name="Cultivo de cereales")
+        self.pesca = Ciiu.objects.create(code="0311", name="Pesca marítima")
+        self.carga = Ciiu.objects.create(
+            code="4923", name="Transporte de carga por carretera"
+        )
+        self.url = reverse("company-findCiiuByCode")
+
+    def codes(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row["code"] for row in response.json()]
+
+    def test_code_prefix_and_name_search(self):
+        self.assertEqual(self.codes(ciiu_code="01"), ["0111"])
+        self.assertEqual(self.codes(ciiu_code="MARITIMA"), ["0311"])
+        self.assertEqual(self.codes(ciiu_code="transp carre"), ["4923"])
+        self.assertEqual(self.codes(ciiu_code="cereales pesca"), [])
+        self.assertEqual(self.codes(limit=2), ["0111", "0311"])
+        self.assertEqual(self.codes(limit=0), ["0111"])
+        self.assertEqual(self.codes(limit=-3), ["0111"])
+
+    def test_validate_ciius_without_queries(self):
+        from .service import CompanyService
+
+        self.codes()
+        with self.assertNumQueries(0):
+            CompanyService.validate_ciius([self.cultivo.id, self.carga.id])
+            with self.assertRaises(CompanyService.CiiuNotFound):
+                CompanyService.validate_ciius([self.pesca.id, 0])
+
+
+class CompanyNitCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.diagnosis.models import Diagnosis
+
+        cache.clear()
+        self.company = Company.objects.create(name="Empresa Nit", nit="9001234567")
+        self.diagnosis = Diagnosis.objects.create(
+            company=self.company, date_elabored="2024-01-01"
+        )
+
+    def test_second_lookup_is_served_from_cache(self):
+        from .service import CompanyService
+
+        data = CompanyService.find_serialized_by_nit(self.company.nit)
+        self.assertEqual(data["id"], self.company.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(CompanyService.find_serialized_by_nit(self.company.nit), data)
+
+    def test_unknown_nit_is_cached(self):
+        from .service import CompanyService
+
+        self.assertIsNone(CompanyService.find_serialized_by_nit("9999999999"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(CompanyService.find_serialized_by_nit("9999999999"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Company.objects.create(name="Nueva", nit="9999999999")
+        self.assertEqual(
+            CompanyService.find_serialized_by_nit("9999999999")["name"], "Nueva"
+        )
+
+    def test_writes_invalidate_cached_company(self):
+        from .service import CompanyService
+
+        CompanyService.find_serialized_by_nit(self.company.nit)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.name = "Renombrada"
+            self.company.save()
+        data = CompanyService.find_serialized_by_nit(self.company.nit)
+        self.assertEqual(data["name"], "Renombrada")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.diagnosis.delete()
+        data = CompanyService.find_serialized_by_nit(self.company.nit)
+        self.assertEqual(data["company_diagnosis"], [])
@@ -27,7 +27,10 @@ from apps.diagnosis.serializers import (
     VehicleQuestionSerializer,
     DriverQuestionSerializer,
 )
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from apps.sign.authentication import (
+    CachedUserJWTAuthentication,
+    ClaimsJWTAuthentication,
+)
 from django.shortcuts import get_object_or_404
 from apps.sign.permissions import IsSuperAdmin, IsAdmin
 from utils import functionUtils
@@ -35,29 +38,48 @@ from rest_framework.exceptions import ValidationError
 from http import HTTPMethod
 from .service import CompanyService
 from django.db import transaction
-from apps.sign.models import User, QueryLog
+from django.conf import settings
+from django.core.cache import cache
+from apps.sign.models import User
+from apps.sign.services import log_query
 from utils.functionUtils import validate_max_length, validate_min_length
+from utils.catalog import catalog_response
+from utils.conditional import ConditionalGetMixin, conditional_get
+from utils.pagination import KeysetPagination
 
 
 logger = logging.getLogger(__name__)
 
 
 # Create your views here.
-class CompanyViewSet(viewsets.ModelViewSet):
+class CompanyViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    conditional_fields = ("updated_at", "company_diagnosis__updated_at")
 
     def get_queryset(self):
         arlId = self.request.query_params.get("arlId")
         if arlId is not None:
-            return Company.objects.filter(arl=arlId)
-        if IsSuperAdmin().has_permission(
+            queryset = Company.objects.filter(arl=arlId)
+        elif IsSuperAdmin().has_permission(
             user=self.request.user
         ) or IsAdmin().has_permission(user=self.request.user):
-            return Company.objects_with_deleted
-        return Company.objects.all()
+            queryset = Company.objects_with_deleted.all()
+        else:
+            queryset = Company.objects.all()
+        search = self.request.query_params.get("search")
+        if search:
+            queryset = CompanyService.search(queryset, search)
+        if self.request.method == HTTPMethod.GET:
+            # Con ?fields= sin company_diagnosis no se cargan los diagnósticos
+            fields = self.request.query_params.get("fields")
+            queryset = CompanySerializer.setup_eager_loading(
+                queryset, include_diagnosis=not fields or "company_diagnosis" in fields
+            )
+        return queryset
 
     def create(self, request: Request, *args, **kwargs):
         try:
@@ -69,6 +91,12 @@ class CompanyViewSet(viewsets.ModelViewSet):
             with transaction.atomic():
                 transformed_data = self.prepare_data(data)
 
+                # Los CIIU se validan contra el catalogo en memoria, sin consultas
+                ciuus_ids = [
+                    int(identifier) for identifier in transformed_data.pop("ciius", [])
+                ]
+                CompanyService.validate_ciius(ciuus_ids)
+
                 # Deserialize and validate the data
                 serializer = self.get_serializer(data=transformed_data)
 
@@ -85,15 +113,8 @@ class CompanyViewSet(viewsets.ModelViewSet):
                 # Get the created Company instance
                 company_instance = serializer.instance
 
-                # Handle the many-to-many relationships
-                ciuus_codes = transformed_data.get("ciius", [])
-                ciuus_ids = [int(identifier) for identifier in ciuus_codes]
-
-                # Find or create CIIU instances based on the provided codes
-                ciius = Ciiu.objects.filter(pk__in=ciuus_ids)
-
-                # Set the many-to-many relationship
-                company_instance.ciius.set(ciius)
+                # Set the many-to-many relationship, los ids ya se validaron
+                company_instance.ciius.set(ciuus_ids)
                 headers = self.get_success_headers(serializer.data)
 
                 if external_user:
@@ -108,6 +129,8 @@ class CompanyViewSet(viewsets.ModelViewSet):
             return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
         except CompanyService.ConsultorNotFound as ex:
             return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        except CompanyService.CiiuNotFound as ex:
+            return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as ex:
             return Response(
                 {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -127,6 +150,7 @@ class CompanyViewSet(viewsets.ModelViewSet):
 
         return data
 
+    @conditional_get()
     def retrieve(self, request: Request, pk=None):
         """
         Obtiene una empresa específica por su ID.
@@ -176,70 +200,66 @@ class CompanyViewSet(viewsets.ModelViewSet):
             )
 
     # Actions personalizadas para funciones en especifico
-    @action(detail=False)
+    @action(detail=False, authentication_classes=[CachedUserJWTAuthentication])
     def findAllSegments(self, request):
         """
         Consulta todos los datos segun el criterio del filter
         """
         try:
-            segments = Segments.objects.all()
-            serializer = SegmentSerializer(segments, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return catalog_response(request, "segments")
         except Exception as ex:
             logger.error(f"Error en findAllSegments: {str(ex)}")
             return Response(
                 {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False)
+    @action(detail=False, authentication_classes=[CachedUserJWTAuthentication])
     def findAllMissions(self, request):
         """
         Consulta todos los datos segun el criterio del filter
         """
         try:
-            missions = Mission.objects.all()
-            serializer = MissionSerializer(missions, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return catalog_response(request, "missions")
         except Exception as ex:
             logger.error(f"Error en findAllSegments: {str(ex)}")
             return Response(
                 {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False)
+    @action(detail=False, authentication_classes=[CachedUserJWTAuthentication])
     def findCompanySizeByMissionId(self, request: Request):
         """
         Consulta todos los datos segun el criterio del filter
         """
         mission_id = request.query_params.get("mission")
         try:
-            missions = MisionalitySizeCriteria.objects.filter(mission=mission_id)
-            serializer = MisionalitySizeCriteriaSerializer(missions, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return catalog_response(
+                request,
+                "size_criteria_by_mission",
+                select=lambda by_mission: by_mission.get(
+                    int(mission_id) if mission_id else None, ()
+                ),
+            )
         except Exception as ex:
             logger.error(f"Error en findAllSegments: {str(ex)}")
             return Response(
                 {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False)
+    @action(detail=False, authentication_classes=[CachedUserJWTAuthentication])
     def findAllVehicleQuestions(self, request: Request):
         try:
-            vehicleCuestions = VehicleQuestions.objects.all()
-            serializer = VehicleQuestionSerializer(vehicleCuestions, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return catalog_response(request, "vehicle_questions")
         except Exception as ex:
             logger.error(f"Error en findAllVehicleQuestions: {str(ex)}")
             return Response(
                 {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False)
+    @action(detail=False, authentication_classes=[CachedUserJWTAuthentication])
     def findAllDriverQuestions(self, request: Request):
         try:
-            driverQuestions = DriverQuestion.objects.all()
-            serializer = DriverQuestionSerializer(driverQuestions, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return catalog_response(request, "driver_questions")
         except Exception as ex:
             logger.error(f"Error en findAllDriverQuestions: {str(ex)}")
             return Response(
@@ -289,18 +309,32 @@ class CompanyViewSet(viewsets.ModelViewSet):
 
         return Response(processed_data, status=status.HTTP_201_CREATED)
 
-    @action(detail=False)
+    @action(detail=False, authentication_classes=[CachedUserJWTAuthentication])
     def findCiiuByCode(self, request: Request):
+        """
+        Autocompletado de CIIU por prefijo de codigo o de palabras del nombre
+        (sin tildes), desde el indice en memoria. Retorna maximo ?limit=
+        resultados (CIIU_SEARCH_LIMIT por defecto).
+        """
         ciiu_code = request.query_params.get("ciiu_code", "")
         try:
-            ciiu = None
-            if ciiu_code:
-                ciiu = Ciiu.objects.filter(code__icontains=ciiu_code)
-            else:
-                ciiu = Ciiu.objects.all()
-
-            serializer = CiiuSerializer(ciiu, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            limit = max(
+                1,
+                min(
+                    int(request.query_params.get("limit", settings.CIIU_SEARCH_LIMIT)),
+                    settings.CIIU_SEARCH_MAX_LIMIT,
+                ),
+            )
+            return catalog_response(
+                request,
+                "ciius",
+                select=lambda index: index.render(index.search(ciiu_code, limit)),
+            )
+        except ValueError:
+            return Response(
+                {"error": "El limite debe ser un numero"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         except Exception as ex:
             return Response(
                 {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -308,28 +342,48 @@ class CompanyViewSet(viewsets.ModelViewSet):
 
     @action(detail=False)
     def diagnosis_by_company(self, request: Request):
-        companies = Company.objects.all()
-        diagnostics_data = [
-            {
-                "name": company.name,
-                "total_diagnostics": company.company_diagnosis.count(),
-                "finalized_diagnostics": company.company_diagnosis.filter(
-                    is_finalized=True
-                ).count(),
-                "in_progress_diagnostics": company.company_diagnosis.filter(
-                    in_progress=True
-                ).count(),
-            }
-            for company in companies
-        ]
+        """
+        Cantidad de diagnósticos por empresa (total, finalizados y en progreso).
+
+        Acepta ?arl= y ?segment= y paginacion por llave (?page_size=, ?cursor=).
+        El resultado se guarda en cache hasta que cambie algun diagnóstico.
+        """
+        params = {
+            key: request.query_params.get(key)
+            for key in ("arl", "segment", "cursor", "page_size")
+            if request.query_params.get(key)
+        }
+        cache_key = CompanyService.diagnosis_summary_cache_key(params)
+        diagnostics_data = cache.get(cache_key)
+        if diagnostics_data is None:
+            companies = CompanyService.diagnosis_summary(
+                arl_id=params.get("arl"), segment_id=params.get("segment")
+            )
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(companies, request)
+            rows = [
+                {
+                    "id": company.id,
+                    "name": company.name,
+                    "total_diagnostics": company.total_diagnostics,
+                    "finalized_diagnostics": company.finalized_diagnostics,
+                    "in_progress_diagnostics": company.in_progress_diagnostics,
+                }
+                for company in (companies if page is None else page)
+            ]
+            if page is None:
+                diagnostics_data = rows
+            else:
+                diagnostics_data = {"next": paginator.get_next_link(), "results": rows}
+            cache.set(
+                cache_key, diagnostics_data, settings.DIAGNOSIS_SUMMARY_CACHE_TTL
+            )
 
         return Response(diagnostics_data)
 
     @action(detail=False, methods=["GET"])
     def find_company_by_nit(self, request: Request):
         nit = request.query_params.get("nit")
-        ip_address = request.META.get("REMOTE_ADDR", "0.0.0.0")
-        user_agent = request.META.get("HTTP_USER_AGENT", "")
 
         if not nit or nit == 0:
             return Response(
@@ -348,47 +402,24 @@ class CompanyViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            try:
-                # Intenta obtener la empresa por el NIT
-                company = Company.objects.get(nit=nit)
-                serializer = CompanySerializer(company)
-                QueryLog.objects.create(
-                    user=request.user if request.user.is_authenticated else None,
-                    ip_address=ip_address,
-                    action="find_company_by_nit",
-                    http_method=request.method,
-                    query_params=dict(request.query_params),
-                    user_agent=user_agent,
-                )
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except Company.DoesNotExist:
+            # Intenta obtener la empresa por el NIT (desde cache)
+            company_data = CompanyService.find_serialized_by_nit(nit)
+            if company_data is None:
                 # Si no encuentra la empresa, envía una respuesta vacía
-                QueryLog.objects.create(
-                    user=request.user if request.user.is_authenticated else None,
-                    ip_address=ip_address,
-                    action="find_company_by_nit - company not found",
-                    http_method=request.method,
-                    query_params=dict(request.query_params),
-                    user_agent=user_agent,
-                )
+                log_query(request, "find_company_by_nit - company not found")
                 return Response({}, status=status.HTTP_200_OK)
+            log_query(request, "find_company_by_nit")
+            return Response(company_data, status=status.HTTP_200_OK)
         except Exception as ex:
             # Registra la excepción en QueryLog
-            QueryLog.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                ip_address=ip_address,
-                action=f"find_company_by_nit - error: {str(ex)}",
-                http_method=request.method,
-                query_params=dict(request.query_params),
-                user_agent=user_agent,
-            )
+            log_query(request, f"find_company_by_nit - error: {str(ex)}")
             return Response(
                 {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
 # @api_view(["POST"])
-# @authentication_classes([JWTAuthentication])
+# @authentication_classes([ClaimsJWTAuthentication])
 # @permission_classes([IsAuthenticated])
 # def findSizeByCounts(request):
 #     min_vehicle = request.query_params.get("min_vehicle")
@@ -1,7 +1,7 @@
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from apps.sign.authentication import ClaimsJWTAuthentication
 from rest_framework import status, viewsets
 from .models import *
 from .serializers import *
@@ -14,7 +14,8 @@ from django.db import transaction
 from apps.diagnosis.models import Diagnosis
 from http import HTTPMethod
 import traceback
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
+from apps.company.service import CompanyService
 
 
 class CustomPagination(PageNumberPagination):
@@ -27,7 +28,7 @@ class CustomPagination(PageNumberPagination):
 class CorporateGroupViewSet(viewsets.ModelViewSet):
     queryset = Corporate.objects.all()
     serializer_class = CorporateGroupSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     pagination_class = CustomPagination
 
@@ -68,17 +69,22 @@ class CorporateGroupViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-            # Obtener todas las compañías que no están asociadas a este Corporate
-        companies_not_in_corporate = Company.objects.exclude(
-            id__in=Corporate_Company_Diagnosis.objects.filter(
-                corporate=corporate
-            ).values_list("company_id", flat=True)
-        ).distinct()  # Usar distinct() para evitar duplicados
-        # Aplicar filtro de búsqueda
+        # Compañías sin relacion con este Corporate (NOT EXISTS, sin DISTINCT)
+        companies_not_in_corporate = Company.objects.filter(
+            ~Exists(
+                Corporate_Company_Diagnosis.objects.filter(
+                    corporate=corporate, company=OuterRef("pk")
+                )
+            )
+        ).order_by("name")
+        # Aplicar filtro de búsqueda por prefijo de NIT o de palabras del nombre
         if search:
-            companies_not_in_corporate = companies_not_in_corporate.filter(
-                Q(name__icontains=search) | Q(nit__icontains=search)
+            companies_not_in_corporate = CompanyService.search(
+                companies_not_in_corporate, search
             )
+        companies_not_in_corporate = CompanySerializer.setup_eager_loading(
+            companies_not_in_corporate
+        )
         # Aplicar paginación
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(companies_not_in_corporate, request)
@@ -0,0 +1,50 @@
+from collections import defaultdict
+from types import MappingProxyType
+from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+from utils.catalog import register_catalog
+from .models import Compliance, Diagnosis_Questions, DriverQuestion, VehicleQuestions
+from .serializers import DriverQuestionSerializer, VehicleQuestionSerializer
+
+
+@register_catalog("vehicle_questions", models=[VehicleQuestions])
+def load_vehicle_questions():
+    return tuple(
+        VehicleQuestionSerializer(VehicleQuestions.objects.all(), many=True).data
+    )
+
+
+@register_catalog("driver_questions", models=[DriverQuestion])
+def load_driver_questions():
+    return tuple(DriverQuestionSerializer(DriverQuestion.objects.all(), many=True).data)
+
+
+@register_catalog("compliance", models=[Compliance])
+def load_compliance():
+    """{id: nombre} de los cumplimientos."""
+    return MappingProxyType(dict(Compliance.objects.values_list("id", "name")))
+
+
+@register_catalog("diagnosis_requirements", models=[Diagnosis_Requirement])
+def load_diagnosis_requirements():
+    """{id: {"id", "name", "cycle", "step"}} de los requisitos (pasos)."""
+    return MappingProxyType(
+        {
+            row["id"]: MappingProxyType(row)
+            for row in Diagnosis_Requirement.objects.values(
+                "id", "name", "cycle", "step"
+            )
+        }
+    )
+
+
+@register_catalog("diagnosis_questions", models=[Diagnosis_Questions])
+def load_diagnosis_questions():
+    """{requirement_id: (pregunta, ...)} ordenadas por id."""
+    by_requirement = defaultdict(list)
+    for row in Diagnosis_Questions.objects.order_by("id").values(
+        "id", "name", "variable_value", "requirement_id"
+    ):
+        by_requirement[row.pop("requirement_id")].append(MappingProxyType(row))
+    return MappingProxyType(
+        {requirement_id: tuple(rows) for requirement_id, rows in by_requirement.items()}
+    )
@@ -1,24 +1,139 @@
 import json
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from apps.diagnosis.models import Diagnosis
+from apps.sign.authentication import get_group_names
+from apps.sign.permissions import GroupTypes
+from .groups import BROADCAST_GROUP, corporate_group, diagnosis_group, user_group
+from .pipeline import DeltaCoalescer, TokenBucket
+
+# Cantidad maxima de diagnósticos o grupos empresariales suscritos por socket
+MAX_SUBSCRIPTIONS = 50
+
+# Tipo de suscripcion -> nombre del grupo
+SUBSCRIPTION_GROUPS = {
+    "diagnosis": diagnosis_group,
+    "corporate_group": corporate_group,
+}
+
+# Roles que pueden ver los eventos de cualquier diagnóstico
+STAFF_GROUPS = {GroupTypes.ADMIN.value, GroupTypes.SUPER_ADMIN.value}
+
+
+@database_sync_to_async
+def can_subscribe(user, kind: str, object_id: int) -> bool:
+    """
+    Solo Admin, SuperAdmin o el consultor del diagnóstico (o de alguno de los
+    diagnósticos del grupo empresarial) reciben sus eventos.
+    """
+    if STAFF_GROUPS & get_group_names(user):
+        return True
+    diagnoses = Diagnosis.objects.filter(consultor=user)
+    if kind == "diagnosis":
+        return diagnoses.filter(id=object_id).exists()
+    return diagnoses.filter(corporate_group=object_id).exists()
 
 
 class DiagnosisConsumer(AsyncWebsocketConsumer):
+    """
+    Socket de eventos de diagnósticos y notificaciones.
+
+    Requiere usuario autenticado (ver JWTAuthMiddleware). Al conectar entra a su
+    grupo de usuario y al general; para recibir los eventos de un diagnóstico o
+    de un grupo empresarial se suscribe en la url
+    (``?diagnosis=1&corporate_group=2``) o enviando:
+
+        {"action": "subscribe", "diagnosis": 1}
+        {"action": "unsubscribe", "corporate_group": 2}
+
+    Solo se permite suscribirse a diagnósticos o grupos empresariales a los que
+    el usuario tiene acceso (ver can_subscribe), si no se responde un error.
+    Los mensajes del cliente nunca se reenvian a otros sockets. Si un cliente
+    supera WEBSOCKET_RATE_LIMIT mensajes por segundo se cierra con 4429. Los
+    cambios del checklist de un diagnóstico se agrupan durante
+    WEBSOCKET_COALESCE_WINDOW segundos y se envian en un solo mensaje.
+    """
+
     async def connect(self):
-        self.room_group_name = "diagnosis"
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        # Grupos fijos del socket, el consumidor base los deja al desconectar
+        self.groups = [user_group(user.id), BROADCAST_GROUP]
+        self.subscriptions = set()
+        self.rate_limit = TokenBucket(
+            settings.WEBSOCKET_RATE_LIMIT, settings.WEBSOCKET_RATE_BURST
+        )
+        self.coalescer = DeltaCoalescer(
+            self.send_checklist_delta, settings.WEBSOCKET_COALESCE_WINDOW
+        )
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        denied = []
+        for kind, group_name in SUBSCRIPTION_GROUPS.items():
+            for value in query.get(kind, [])[:MAX_SUBSCRIPTIONS]:
+                if not value.isdigit():
+                    continue
+                if await can_subscribe(user, kind, int(value)):
+                    self.subscriptions.add(group_name(int(value)))
+                else:
+                    denied.append(value)
+        for group in [*self.groups, *self.subscriptions]:
+            await self.channel_layer.group_add(group, self.channel_name)
         await self.accept()
+        if denied:
+            await self.send_error(f"Sin acceso a: {', '.join(denied)}")
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if hasattr(self, "coalescer"):
+            self.coalescer.cancel()
+        for group in getattr(self, "subscriptions", ()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if not self.rate_limit.consume():
+            await self.close(code=4429)
+            return
+        if text_data is None or len(text_data) > settings.WEBSOCKET_MAX_MESSAGE_SIZE:
+            await self.send_error("Mensaje invalido")
+            return
+        try:
+            text_data_json = json.loads(text_data)
+            action = text_data_json["action"]
+            (kind,) = [kind for kind in SUBSCRIPTION_GROUPS if kind in text_data_json]
+            group = SUBSCRIPTION_GROUPS[kind](int(text_data_json[kind]))
+        except (ValueError, TypeError, KeyError):
+            await self.send_error("Mensaje invalido")
+            return
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        # Notify the group about the change
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {"type": "websocket_diagnosis", "message": f"{text_data_json}"},
+        if action == "subscribe":
+            if group not in self.subscriptions:
+                if len(self.subscriptions) >= MAX_SUBSCRIPTIONS:
+                    await self.send_error("Demasiadas suscripciones")
+                    return
+                if not await can_subscribe(
+                    self.scope["user"], kind, int(text_data_json[kind])
+                ):
+                    await self.send_error("Sin acceso")
+                    return
+                self.subscriptions.add(group)
+                await self.channel_layer.group_add(group, self.channel_name)
+        elif action == "unsubscribe":
+            if group in self.subscriptions:
+                self.subscriptions.discard(group)
+                await self.channel_layer.group_discard(group, self.channel_name)
+        else:
+            await self.send_error("Accion invalida")
+            return
+        await self.send(
+            text_data=json.dumps({"type": action, kind: text_data_json[kind]})
         )
 
+    async def send_error(self, message: str):
+        await self.send(text_data=json.dumps({"type": "error", "message": message}))
+
     async def external_count(self, diagnosis):
         await self.send(
             text_data=json.dumps(
@@ -38,3 +153,31 @@ class DiagnosisConsumer(AsyncWebsocketConsumer):
                 }
             )
         )
+
+    async def checklist_delta(self, delta):
+        await self.coalescer.add(
+            delta["diagnosis"], delta["questions"], delta["requirements"]
+        )
+
+    async def score_delta(self, delta):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "score_delta",
+                    "diagnosis": delta["diagnosis"],
+                    "cycles": delta["cycles"],
+                }
+            )
+        )
+
+    async def send_checklist_delta(self, diagnosis_id, questions, requirements):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "checklist_delta",
+                    "diagnosis": diagnosis_id,
+                    "questions": questions,
+                    "requirements": requirements,
+                }
+            )
+        )
@@ -0,0 +1,40 @@
+"""
+    Nombres de los grupos de websocket.
+
+    Cada socket autenticado entra a su grupo de usuario y al grupo general; a
+    los grupos de diagnóstico y de grupo empresarial entra solo si se suscribe,
+    asi los eventos de un diagnóstico llegan solo a quien lo esta viendo.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+# Notificaciones para todos los usuarios (Notification.user = None)
+BROADCAST_GROUP = "notifications"
+
+
+def user_group(user_id) -> str:
+    return f"user.{user_id}"
+
+
+def diagnosis_group(diagnosis_id) -> str:
+    return f"diagnosis.{diagnosis_id}"
+
+
+def corporate_group(corporate_group_id) -> str:
+    return f"corporate.{corporate_group_id}"
+
+
+def diagnosis_groups(diagnosis) -> list:
+    """Grupos interesados en los eventos del diagnóstico."""
+    groups = [diagnosis_group(diagnosis.id)]
+    if diagnosis.corporate_group_id:
+        groups.append(corporate_group(diagnosis.corporate_group_id))
+    return groups
+
+
+def send_to_groups(groups, message: dict):
+    """Envia el mensaje a cada grupo desde codigo sincrono."""
+    channel_layer = get_channel_layer()
+    for group in groups:
+        async_to_sync(channel_layer.group_send)(group, message)
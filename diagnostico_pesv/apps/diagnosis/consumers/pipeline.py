@@ -0,0 +1,89 @@
+"""
+    Piezas del flujo de eventos de DiagnosisConsumer.
+
+    ``DeltaCoalescer`` junta los cambios del checklist que llegan en rafaga para
+    un mismo diagnóstico y los envia en un solo mensaje al cerrar la ventana;
+    ``TokenBucket`` limita los mensajes que puede enviar cada conexion.
+"""
+
+import asyncio
+import time
+
+
+def _merge(pending: dict, deltas: list):
+    """Guarda en ``pending`` (id -> delta) la version mas reciente de cada fila."""
+    for delta in deltas:
+        current = pending.get(delta["id"])
+        if current is None or delta.get("version", 0) >= current.get("version", 0):
+            pending[delta["id"]] = delta
+
+
+class DeltaCoalescer:
+    """
+    Agrupa los cambios por diagnóstico durante ``window`` segundos.
+
+    La ventana empieza con el primer cambio, asi la demora maxima es ``window``
+    aunque los cambios no paren de llegar.
+
+    :param send: Corrutina que recibe (diagnosis_id, questions, requirements).
+    """
+
+    def __init__(self, send, window: float):
+        self.send = send
+        self.window = window
+        self._pending = {}
+        self._tasks = {}
+
+    async def add(self, diagnosis_id, questions, requirements):
+        if self.window <= 0:
+            await self.send(diagnosis_id, questions, requirements)
+            return
+        pending = self._pending.setdefault(
+            diagnosis_id, {"questions": {}, "requirements": {}}
+        )
+        _merge(pending["questions"], questions)
+        _merge(pending["requirements"], requirements)
+        if diagnosis_id not in self._tasks:
+            self._tasks[diagnosis_id] = asyncio.ensure_future(
+                self._flush_later(diagnosis_id)
+            )
+
+    async def _flush_later(self, diagnosis_id):
+        await asyncio.sleep(self.window)
+        self._tasks.pop(diagnosis_id, None)
+        await self.flush(diagnosis_id)
+
+    async def flush(self, diagnosis_id):
+        pending = self._pending.pop(diagnosis_id, None)
+        if pending:
+            await self.send(
+                diagnosis_id,
+                list(pending["questions"].values()),
+                list(pending["requirements"].values()),
+            )
+
+    def cancel(self):
+        """Descarta lo pendiente, se llama al desconectar."""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._pending.clear()
+
+
+class TokenBucket:
+    """Permite ``rate`` mensajes por segundo con rafagas de hasta ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def consume(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
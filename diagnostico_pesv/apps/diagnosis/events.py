@@ -0,0 +1,65 @@
+from utils.constants import DomainEvents
+from utils.events import subscribe
+from .consumers.groups import (
+    BROADCAST_GROUP,
+    diagnosis_group,
+    diagnosis_groups,
+    send_to_groups,
+    user_group,
+)
+from .models import Diagnosis
+from .serializers import NotificationEventSerializer
+from .services import DiagnosisService, NotificationService
+
+
+@subscribe(DomainEvents.DIAGNOSIS_EXTERNAL_COUNT_COMPLETED.value)
+def notify_external_count_completed(diagnosis_id):
+    diagnosis = Diagnosis.objects.only(
+        "id", "corporate_group_id", "external_count_complete"
+    ).get(pk=diagnosis_id)
+    notification = NotificationService.notify(
+        f"Se ha Completado el conteo de la flota vehicular.", diagnosis
+    )
+    send_to_groups(
+        [user_group(notification.user_id) if notification.user_id else BROADCAST_GROUP],
+        {
+            "type": "external_notification",  # Tipo de mensaje
+            "notification_data": NotificationEventSerializer(notification).data,
+        },
+    )
+    send_to_groups(
+        diagnosis_groups(diagnosis),
+        {
+            "type": "external_count",  # Tipo de mensaje
+            # Solo lo que cambio, el cliente ya tiene el resto del diagnóstico
+            "diagnosis_data": {
+                "id": diagnosis.id,
+                "external_count_complete": diagnosis.external_count_complete,
+            },
+        },
+    )
+
+
+@subscribe(DomainEvents.CHECKLIST_DELTAS_APPLIED.value)
+def broadcast_checklist_deltas(diagnosis_id, questions, requirements):
+    send_to_groups(
+        [diagnosis_group(diagnosis_id)],
+        {
+            "type": "checklist_delta",
+            "diagnosis": diagnosis_id,
+            "questions": questions,
+            "requirements": requirements,
+        },
+    )
+
+
+@subscribe(DomainEvents.DIAGNOSIS_SCORE_CHANGED.value)
+def broadcast_score_deltas(diagnosis_id, checklist_ids=(), question_ids=()):
+    cycles = DiagnosisService.calculate_score_deltas(
+        diagnosis_id, checklist_ids, question_ids
+    )
+    if cycles:
+        send_to_groups(
+            [diagnosis_group(diagnosis_id)],
+            {"type": "score_delta", "diagnosis": diagnosis_id, "cycles": cycles},
+        )
@@ -75,6 +75,11 @@ class CheckListRepositoryInterface(ABC):
     def massive_update(self, data_to_save):
         pass
 
+    @abstractmethod
+    def apply_deltas(self, diagnosis_id: int, deltas: List[dict]):
+        """Aplica cambios versionados, retorna (aplicados, conflictos, rechazados)."""
+        pass
+
 
 class CheckListRequirementRepositoryInterface(ABC):
     @abstractmethod
@@ -99,6 +104,11 @@ class CheckListRequirementRepositoryInterface(ABC):
     def get_requirement_by_id(self, id) -> Diagnosis_Requirement:
         pass
 
+    @abstractmethod
+    def get_requirement_ids_by_diagnosis_id(self, diagnosis_id) -> set:
+        """Obtiene los ids de requisitos que ya tienen Checklist_Requirement en el diagnóstico."""
+        pass
+
     @abstractmethod
     def massive_save(self, data_to_save):
         pass
@@ -111,6 +121,11 @@ class CheckListRequirementRepositoryInterface(ABC):
     def massive_update(self, data_to_save):
         pass
 
+    @abstractmethod
+    def apply_deltas(self, diagnosis_id: int, deltas: List[dict]):
+        """Aplica cambios versionados, retorna (aplicados, conflictos, rechazados)."""
+        pass
+
 
 class IComplianceRepository(ABC):
     @abstractmethod
@@ -0,0 +1,69 @@
+import json
+import time
+import brotli
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from apps.company.models import Company
+from apps.company.serializers import CompanySerializer
+from apps.diagnosis.models import Diagnosis
+from apps.diagnosis.read_models import QuestionnaireReadModel
+from apps.diagnosis.services import DiagnosisService
+from utils.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el tiempo de serializacion JSON (DRF vs orjson) y los bytes "
+        "enviados (sin comprimir, gzip y brotli) de los endpoints mas grandes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("diagnosis", type=int, help="Id del diagnóstico")
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def payloads(self, diagnosis_id):
+        companies = CompanySerializer.setup_eager_loading(Company.objects.all())
+        return {
+            "tableReport": DiagnosisService.calculate_completion_percentage(
+                diagnosis_id
+            ),
+            "findQuestionsByCompanySize": QuestionnaireReadModel.grouped_by_step(
+                diagnosis_id, include_compliance=True
+            ),
+            "company (lista)": CompanySerializer(companies, many=True).data,
+        }
+
+    def measure(self, renderer, data, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            content = renderer.render(data)
+        return content, (time.perf_counter() - started) / iterations * 1000
+
+    def handle(self, *args, **options):
+        diagnosis_id = options["diagnosis"]
+        iterations = options["iterations"]
+        if not Diagnosis.objects.filter(pk=diagnosis_id).exists():
+            raise CommandError(f"El diagnóstico {diagnosis_id} no existe")
+
+        self.stdout.write(
+            f"{'endpoint':<28}{'drf ms':>9}{'orjson ms':>11}"
+            f"{'bytes':>10}{'gzip':>9}{'brotli':>9}"
+        )
+        for name, data in self.payloads(diagnosis_id).items():
+            drf_content, drf_ms = self.measure(JSONRenderer(), data, iterations)
+            fast_content, fast_ms = self.measure(ORJSONRenderer(), data, iterations)
+            # Ambos renderers deben producir el mismo JSON
+            if json.loads(drf_content) != json.loads(fast_content):
+                raise CommandError(f"{name}: las respuestas no coinciden")
+            gzip_size = len(compress_string(fast_content))
+            brotli_size = len(
+                brotli.compress(
+                    fast_content, quality=settings.COMPRESSION_BROTLI_QUALITY
+                )
+            )
+            self.stdout.write(
+                f"{name:<28}{drf_ms:>9.2f}{fast_ms:>11.2f}"
+                f"{len(fast_content):>10}{gzip_size:>9}{brotli_size:>9}"
+            )
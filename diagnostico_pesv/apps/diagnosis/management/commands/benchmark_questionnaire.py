@@ -0,0 +1,100 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+from apps.diagnosis.models import CheckList, Diagnosis, Diagnosis_Questions
+from apps.diagnosis.read_models import QuestionnaireReadModel
+from apps.diagnosis.repositories import CheckListRequirementRepository
+from apps.diagnosis.services import DiagnosisService
+from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el tiempo de findQuestionsByCompanySize entre la version con "
+        "serializadores (group_questions_by_step) y QuestionnaireReadModel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("diagnosis", type=int, help="Id del diagnóstico")
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument(
+            "--no-compliance",
+            action="store_true",
+            help="Mide el cuestionario sin cumplimiento (diagnóstico nuevo)",
+        )
+
+    def legacy(self, diagnosis_id, include_compliance):
+        """Ruta original de la vista con modelos y serializadores de DRF."""
+        checklist_questions = None
+        questions_queryset = Diagnosis_Questions.objects.all()
+        if include_compliance:
+            checklist_questions = CheckList.objects.filter(
+                diagnosis_id=diagnosis_id
+            ).select_related("question", "compliance")
+            if checklist_questions:
+                questions_queryset = Diagnosis_Questions.objects.filter(
+                    id__in=checklist_questions.values_list("question_id", flat=True)
+                )
+        diagnosis_requirements = (
+            CheckListRequirementRepository().get_checklists_requirement_by_diagnosis_id(
+                diagnosis_id
+            )
+        )
+        requirements = Diagnosis_Requirement.objects.filter(
+            id__in=diagnosis_requirements.values_list("requirement", flat=True)
+        ).prefetch_related(Prefetch("requirements", queryset=questions_queryset))
+        return DiagnosisService.group_questions_by_step(
+            diagnosis_requirements,
+            requirements,
+            checklist_questions=checklist_questions,
+            include_compliance=include_compliance,
+        )
+
+    def measure(self, builder, iterations):
+        with CaptureQueriesContext(connection) as queries:
+            payload = builder()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            json.dumps(builder())
+            reset_queries()
+        elapsed = (time.perf_counter() - started) / iterations * 1000
+        return payload, elapsed, len(queries)
+
+    def handle(self, *args, **options):
+        diagnosis_id = options["diagnosis"]
+        iterations = options["iterations"]
+        include_compliance = not options["no_compliance"]
+        if not Diagnosis.objects.filter(pk=diagnosis_id).exists():
+            raise CommandError(f"El diagnóstico {diagnosis_id} no existe")
+
+        legacy_payload, legacy_ms, legacy_queries = self.measure(
+            lambda: self.legacy(diagnosis_id, include_compliance), iterations
+        )
+        read_payload, read_ms, read_queries = self.measure(
+            lambda: QuestionnaireReadModel.grouped_by_step(
+                diagnosis_id, include_compliance
+            ),
+            iterations,
+        )
+
+        # Ambas rutas deben producir el mismo JSON
+        legacy_json = json.loads(json.dumps(legacy_payload))
+        read_json = json.loads(json.dumps(read_payload))
+        if legacy_json != read_json:
+            raise CommandError("Las respuestas de ambas rutas no coinciden")
+
+        questions = sum(len(item["questions"]) for item in read_payload)
+        self.stdout.write(
+            f"Diagnóstico {diagnosis_id}: {len(read_payload)} requisitos, "
+            f"{questions} preguntas, {iterations} iteraciones"
+        )
+        self.stdout.write(
+            f"  serializadores : {legacy_ms:8.2f} ms/peticion, {legacy_queries} consultas"
+        )
+        self.stdout.write(
+            f"  read model     : {read_ms:8.2f} ms/peticion, {read_queries} consultas"
+        )
+        self.stdout.write(self.style.SUCCESS(f"  mejora x{legacy_ms / read_ms:.1f}"))
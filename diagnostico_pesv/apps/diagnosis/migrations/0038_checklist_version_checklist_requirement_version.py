@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-19 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0037_alter_notification_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checklist',
+            name='version',
+            field=models.PositiveIntegerField(db_comment='Se incrementa en cada guardado, control de concurrencia', default=1),
+        ),
+        migrations.AddField(
+            model_name='checklist_requirement',
+            name='version',
+            field=models.PositiveIntegerField(db_comment='Se incrementa en cada guardado, control de concurrencia', default=1),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-19 11:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0042_company_company_created_id_idx'),
+        ('corporate_group', '0008_corporate_nit'),
+        ('diagnosis', '0038_checklist_version_checklist_requirement_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['created_at', 'id'], name='diagnosis_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at', 'id'], name='notification_created_id_idx'),
+        ),
+    ]
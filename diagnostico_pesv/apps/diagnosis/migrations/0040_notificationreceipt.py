@@ -0,0 +1,77 @@
+# Generated by Django 5.1 on 2026-10-19 12:03
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter
+from django.db import migrations, models
+
+
+def create_receipts(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Notification = apps.get_model("diagnosis", "Notification")
+    NotificationReceipt = apps.get_model("diagnosis", "NotificationReceipt")
+    NotificationCounter = apps.get_model("diagnosis", "NotificationCounter")
+    # Mismos destinatarios que NotificationService.FEED_GROUPS
+    active_ids = list(
+        User.objects.filter(
+            is_active=True, groups__name__in=["SuperAdmin", "Admin", "Consultor"]
+        )
+        .values_list("id", flat=True)
+        .distinct()
+    )
+    receipts = []
+    unread = Counter()
+    for notification_id, user_id, created_at, read in Notification.objects.values_list(
+        "id", "user_id", "created_at", "read"
+    ).iterator():
+        for receiver_id in [user_id] if user_id else active_ids:
+            receipts.append(
+                NotificationReceipt(
+                    notification_id=notification_id,
+                    user_id=receiver_id,
+                    created_at=created_at,
+                    read=read,
+                )
+            )
+            if not read:
+                unread[receiver_id] += 1
+    NotificationReceipt.objects.bulk_create(receipts, batch_size=1000)
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id, unread=count) for user_id, count in unread.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0039_diagnosis_diagnosis_created_id_idx_and_more'),
+        ('sign', '0013_user_user_joined_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read', models.BooleanField(default=False)),
+                ('read_at', models.DateTimeField(default=None, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='diagnosis.notification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_receipts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'read', 'created_at'], name='receipt_user_read_created_idx'), models.Index(fields=['user', 'created_at', 'id'], name='receipt_user_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'notification'), name='notification_receipt_unique')],
+            },
+        ),
+        migrations.RunPython(create_receipts, migrations.RunPython.noop),
+    ]
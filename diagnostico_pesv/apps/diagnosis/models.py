@@ -72,6 +72,12 @@ class Diagnosis(SoftDeletes, Timestampable):
         related_name="corporates_diagnosis",
     )
 
+    class Meta:
+        # Paginacion por llave (utils.pagination.KeysetPagination)
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="diagnosis_created_id_idx")
+        ]
+
 
 class CheckList(SoftDeletes, Timestampable):
     question = models.ForeignKey(
@@ -88,6 +94,9 @@ class CheckList(SoftDeletes, Timestampable):
     verify_document = models.TextField(null=True, default=None, blank=False)
     observation = models.TextField(null=False, default="SIN OBSERVACIONES", blank=False)
     is_articuled = models.BooleanField(default=True)
+    version = models.PositiveIntegerField(
+        default=1, db_comment="Se incrementa en cada guardado, control de concurrencia"
+    )
 
 
 class Checklist_Requirement(SoftDeletes, Timestampable):
@@ -99,6 +108,9 @@ class Checklist_Requirement(SoftDeletes, Timestampable):
         Compliance, on_delete=models.SET_NULL, null=True, blank=False
     )
     observation = models.TextField(blank=False, null=True)
+    version = models.PositiveIntegerField(
+        default=1, db_comment="Se incrementa en cada guardado, control de concurrencia"
+    )
 
 
 class Notification(models.Model):
@@ -108,5 +120,60 @@ class Notification(models.Model):
     read = models.BooleanField(default=False)
     diagnosis = models.ForeignKey(Diagnosis, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created_at", "id"], name="notification_created_id_idx"
+            )
+        ]
+
     def __str__(self):
         return f"Notification to {self.user} - {self.message}"
+
+
+class NotificationReceipt(models.Model):
+    """
+    Estado de lectura de una notificación para cada usuario.
+
+    Las notificaciones generales (``user=None``) generan un recibo por cada
+    usuario activo, asi cada uno las marca como leídas por separado.
+    """
+
+    notification = models.ForeignKey(
+        Notification, on_delete=models.CASCADE, related_name="receipts"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="notification_receipts"
+    )
+    read = models.BooleanField(default=False)
+    read_at = models.DateTimeField(null=True, default=None)
+    # Copia de notification.created_at para paginar sin unir tablas
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "notification"], name="notification_receipt_unique"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "read", "created_at"],
+                name="receipt_user_read_created_idx",
+            ),
+            models.Index(
+                fields=["user", "created_at", "id"], name="receipt_user_created_idx"
+            ),
+        ]
+
+
+class NotificationCounter(models.Model):
+    """Cantidad de notificaciones sin leer del usuario, se mantiene al escribir recibos."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="notification_counter",
+    )
+    unread = models.PositiveIntegerField(default=0)
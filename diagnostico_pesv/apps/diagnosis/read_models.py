@@ -0,0 +1,118 @@
+from utils.catalog import get_catalog
+from .models import CheckList, Checklist_Requirement
+
+
+class QuestionnaireReadModel:
+    """
+    Modelo de lectura del cuestionario de un diagnóstico agrupado por paso.
+
+    Construye la misma respuesta que ``DiagnosisService.group_questions_by_step``
+    a partir de filas ``values()`` y de los catalogos de requisitos y preguntas,
+    sin instanciar modelos ni pasar por los serializadores de DRF. El detalle
+    del requisito se arma una sola vez por requisito y se comparte entre todas
+    sus preguntas.
+    """
+
+    @staticmethod
+    def _get_question_compliance(diagnosis_id: int) -> dict:
+        """
+        Retorna {question_id: ({"id", "name"}, {"id", "version"})} con el
+        cumplimiento y la fila del checklist (para autosave_diagnosis). Si una
+        pregunta se repite gana la ultima fila, igual que la version original.
+        """
+        rows = (
+            CheckList.objects.filter(diagnosis_id=diagnosis_id)
+            .order_by("id")
+            .values("question_id", "id", "version", "compliance_id", "compliance__name")
+        )
+        return {
+            row["question_id"]: (
+                {"id": row["compliance_id"], "name": row["compliance__name"]},
+                {"id": row["id"], "version": row["version"]},
+            )
+            for row in rows
+        }
+
+    @staticmethod
+    def _get_questions_by_requirement(
+        requirement_ids, question_ids=None, include_compliance=False, compliance=None
+    ) -> dict:
+        # Requisitos y preguntas salen de los catalogos en memoria (ver catalogs.py)
+        requirements = get_catalog("diagnosis_requirements").get()
+        questions = get_catalog("diagnosis_questions").get()
+
+        empty_compliance = ({"id": None, "name": None}, None)
+        questions_by_requirement = {}
+        for requirement_id in set(requirement_ids):
+            if requirement_id not in requirements:
+                continue
+            requirement_detail = dict(requirements[requirement_id])
+            rows = []
+            for question in questions.get(requirement_id, ()):
+                if question_ids is not None and question["id"] not in question_ids:
+                    continue
+                row = {**question, "requirement_detail": requirement_detail}
+                if include_compliance:
+                    row["compliance_detail"], row["checklist"] = compliance.get(
+                        question["id"], empty_compliance
+                    )
+                rows.append(row)
+            questions_by_requirement[requirement_id] = rows
+        return questions_by_requirement
+
+    @classmethod
+    def grouped_by_step(cls, diagnosis_id: int, include_compliance: bool = False):
+        """
+        Retorna los requisitos del checklist del diagnóstico con sus preguntas.
+
+        :param diagnosis_id: Id del diagnóstico.
+        :param include_compliance: Si es True incluye el cumplimiento de cada
+            pregunta y, si el diagnóstico ya tiene checklist, solo sus preguntas.
+        :return: Lista de diccionarios ordenada por paso.
+        """
+        checklist_requirements = list(
+            Checklist_Requirement.objects.filter(diagnosis=diagnosis_id)
+            .order_by("requirement__step")
+            .values(
+                "id",
+                "version",
+                "observation",
+                "requirement_id",
+                "requirement__step",
+                "requirement__cycle",
+                "requirement__name",
+                "compliance_id",
+                "compliance__name",
+            )
+        )
+
+        compliance = {}
+        question_ids = None
+        if include_compliance:
+            compliance = cls._get_question_compliance(diagnosis_id)
+            if compliance:
+                question_ids = compliance.keys()
+
+        questions_by_requirement = cls._get_questions_by_requirement(
+            [cr["requirement_id"] for cr in checklist_requirements],
+            question_ids,
+            include_compliance,
+            compliance,
+        )
+
+        return [
+            {
+                "id": cr["id"],
+                "version": cr["version"],
+                "step": cr["requirement__step"],
+                "cycle": cr["requirement__cycle"],
+                "observation": cr["observation"],
+                "requirement_name": cr["requirement__name"],
+                "compliance": {
+                    "id": cr["compliance_id"],
+                    "name": cr["compliance__name"],
+                },
+                "questions": questions_by_requirement.get(cr["requirement_id"], []),
+            }
+            for cr in checklist_requirements
+        ]
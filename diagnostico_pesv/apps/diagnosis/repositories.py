@@ -7,6 +7,8 @@ from apps.diagnosis.models import (
     Diagnosis_Questions,
 )
 from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
 from apps.diagnosis.interfaces import (
     DiagnosisRepositoryInterface,
     CheckListRepositoryInterface,
@@ -16,6 +18,76 @@ from apps.diagnosis.interfaces import (
 )
 
 
+def apply_versioned_deltas(model, diagnosis_id, deltas, fields):
+    """
+    Aplica cambios parciales con control de concurrencia optimista.
+
+    Solo se aplican los cambios cuya version coincide con la de base de datos,
+    todos en un unico UPDATE con CASE por campo. Las filas se bloquean solo
+    durante la lectura de versiones y ese UPDATE.
+
+    :param model: CheckList o Checklist_Requirement.
+    :param diagnosis_id: Diagnóstico al que deben pertenecer las filas.
+    :param deltas: Lista de dicts con "id", "version" y los campos cambiados.
+    :param fields: Campos que se permiten actualizar.
+    :return: Tupla (aplicados, conflictos, rechazados). Los conflictos traen
+        los datos actuales de las filas con version desactualizada; los
+        rechazados son los ids que no pertenecen al diagnóstico, de ellos no se
+        retorna nada.
+    """
+    deltas_by_id = {int(delta["id"]): delta for delta in deltas}
+    current_versions = dict(
+        model.objects.select_for_update()
+        .filter(diagnosis=diagnosis_id, pk__in=deltas_by_id.keys())
+        .values_list("id", "version")
+    )
+    accepted = {
+        pk: delta
+        for pk, delta in deltas_by_id.items()
+        if current_versions.get(pk) == int(delta["version"])
+    }
+
+    if accepted:
+        updates = {}
+        for field_name in fields:
+            field = model._meta.get_field(field_name)
+            output_field = field.target_field if field.is_relation else field
+            whens = [
+                When(pk=pk, then=Value(delta[field_name], output_field=output_field))
+                for pk, delta in accepted.items()
+                if field_name in delta
+            ]
+            if whens:
+                updates[field.attname] = Case(
+                    *whens, default=F(field.attname), output_field=output_field
+                )
+        updates["version"] = F("version") + 1
+        updates["updated_at"] = timezone.now()
+        model.objects.filter(pk__in=accepted.keys()).update(**updates)
+
+    # Solo los campos permitidos, los aplicados se reenvian a otros clientes
+    applied = [
+        {
+            **{name: value for name, value in delta.items() if name in fields},
+            "id": pk,
+            "version": current_versions[pk] + 1,
+        }
+        for pk, delta in accepted.items()
+    ]
+    # Con los mismos nombres de campo que los aplicados ("compliance", no
+    # "compliance_id")
+    attnames = {model._meta.get_field(name).attname: name for name in fields}
+    conflicts = [
+        {attnames.get(attname, attname): value for attname, value in row.items()}
+        for row in model.objects.filter(
+            diagnosis=diagnosis_id,
+            pk__in=[pk for pk in current_versions if pk not in accepted],
+        ).values("id", "version", *attnames)
+    ]
+    rejected = [pk for pk in deltas_by_id if pk not in current_versions]
+    return applied, conflicts, rejected
+
+
 class DiagnosisQuestionRepository(IDiagnosisQuestionRepository):
     def get_by_id(self, id: int):
         return Diagnosis_Questions.objects.filter(pk=id).first()
@@ -74,8 +146,25 @@ class CheckListRepository(CheckListRepositoryInterface):
         return CheckList.objects.bulk_create(data_to_save)
 
     def massive_update(self, data_to_save):
+        for checklist in data_to_save:
+            checklist.version = F("version") + 1
         return CheckList.objects.bulk_update(
             data_to_save,
+            [
+                "observation",
+                "compliance",
+                "is_articuled",
+                "obtained_value",
+                "verify_document",
+                "version",
+            ],
+        )
+
+    def apply_deltas(self, diagnosis_id, deltas):
+        return apply_versioned_deltas(
+            CheckList,
+            diagnosis_id,
+            deltas,
             [
                 "observation",
                 "compliance",
@@ -136,13 +225,30 @@ class CheckListRequirementRepository(CheckListRequirementRepositoryInterface):
         return Checklist_Requirement.objects.bulk_create(data_to_save)
 
     def massive_update(self, data_to_save):
+        for checklist_requirement in data_to_save:
+            checklist_requirement.version = F("version") + 1
         return Checklist_Requirement.objects.bulk_update(
-            data_to_save, ["observation", "compliance"]
+            data_to_save, ["observation", "compliance", "version"]
+        )
+
+    def apply_deltas(self, diagnosis_id, deltas):
+        return apply_versioned_deltas(
+            Checklist_Requirement,
+            diagnosis_id,
+            deltas,
+            ["observation", "compliance"],
         )
 
     def get_requirement_by_id(self, id):
         return Diagnosis_Requirement.objects.filter(pk=id).first()
 
+    def get_requirement_ids_by_diagnosis_id(self, diagnosis_id):
+        return set(
+            Checklist_Requirement.objects.filter(diagnosis=diagnosis_id).values_list(
+                "requirement_id", flat=True
+            )
+        )
+
 
 class ComplianceRepository(IComplianceRepository):
     def get_compliance_by_id(self, id) -> Compliance:
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from utils.serializers import DynamicFieldsMixin
 from .models import *
 from apps.diagnosis_requirement.core.models import (
     Diagnosis_Requirement,
@@ -86,7 +87,7 @@ class CompanySizeSerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
 
-class DiagnosisSerializer(serializers.ModelSerializer):
+class DiagnosisSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 
     type = serializers.PrimaryKeyRelatedField(
         queryset=CompanySize.objects.all(), write_only=True, required=False
@@ -95,7 +96,11 @@ class DiagnosisSerializer(serializers.ModelSerializer):
     # company = serializers.PrimaryKeyRelatedField(
     #     queryset=Company.objects.all(), write_only=True
     # )
-    company_detail = CompanySerializer(source="company", read_only=True)
+    # El historial de diagnósticos de la empresa solo con
+    # ?expand=company_detail.company_diagnosis
+    company_detail = CompanySerializer(
+        source="company", read_only=True, deferred=["company_diagnosis"]
+    )
     consultor = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), write_only=True, required=False, allow_null=True
     )
@@ -129,6 +134,25 @@ class DiagnosisSerializer(serializers.ModelSerializer):
             "consultor": {"allow_null": True, "required": False},
         }
 
+    @staticmethod
+    def setup_eager_loading(queryset, request=None, prefix: str = ""):
+        """
+        Agrega al queryset las relaciones que usa el serializador.
+
+        :param request: Si pide ?expand=company_detail.company_diagnosis tambien
+            se cargan los diagnósticos de la empresa.
+        :param prefix: Ruta del diagnóstico si el queryset es de otro modelo.
+        """
+        expand = request.query_params.get("expand", "") if request else ""
+        queryset = queryset.select_related(
+            f"{prefix}type", f"{prefix}consultor"
+        ).prefetch_related(f"{prefix}consultor__groups")
+        return CompanySerializer.setup_eager_loading(
+            queryset,
+            prefix=f"{prefix}company__",
+            include_diagnosis="company_detail.company_diagnosis" in expand,
+        )
+
 
 class CheckListSerializer(serializers.ModelSerializer):
     compliance = serializers.PrimaryKeyRelatedField(
@@ -159,7 +183,10 @@ class CheckListSerializer(serializers.ModelSerializer):
             "compliance_detail",
             "observation",
             "is_articuled",
+            "version",
         ]
+        # La version solo cambia con autosave_diagnosis
+        read_only_fields = ["version"]
 
     def create(self, validated_data):
         question = validated_data.pop("question")
@@ -206,3 +233,42 @@ class NotificationSerializer(serializers.ModelSerializer):
             "created_at",
             "read",
         ]
+
+
+class NotificationEventSerializer(serializers.ModelSerializer):
+    """Notificación compacta para los websockets, el diagnóstico va solo por id."""
+
+    class Meta:
+        model = Notification
+        fields = ["id", "diagnosis", "message", "created_at", "read"]
+
+
+class NotificationReceiptSerializer(serializers.ModelSerializer):
+    """Notificación vista por un usuario, ``read`` es el estado de su recibo."""
+
+    id = serializers.IntegerField(source="notification_id", read_only=True)
+    user_detail = UserDetailSerializer(source="notification.user", read_only=True)
+    diagnosis_detail = DiagnosisSerializer(
+        source="notification.diagnosis", read_only=True
+    )
+    message = serializers.CharField(source="notification.message", read_only=True)
+
+    class Meta:
+        model = NotificationReceipt
+        fields = [
+            "id",
+            "user_detail",
+            "diagnosis_detail",
+            "message",
+            "created_at",
+            "read",
+        ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        queryset = queryset.select_related("notification__user").prefetch_related(
+            "notification__user__groups"
+        )
+        return DiagnosisSerializer.setup_eager_loading(
+            queryset, prefix="notification__diagnosis__"
+        )
@@ -2,7 +2,7 @@ from .models import *
 from .serializers import *
 from utils import functionUtils
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
 from datetime import datetime
 from collections import defaultdict
 from apps.diagnosis_counter.models import Fleet, Driver, Diagnosis_Counter
@@ -12,13 +12,22 @@ from django.conf import settings
 import os
 from docx import Document
 from apps.sign.models import User
+from apps.sign.authentication import get_group_names
+from apps.sign.permissions import GroupTypes
 from utils.constants import ComplianceIds
 from utils.functionUtils import blank_to_null
+from utils.catalog import get_catalog
 from .helper import *
-from django.db.models import Prefetch, OuterRef, Subquery, Q, Sum, Count
+from django.db.models import Prefetch, OuterRef, Subquery, Q, Sum, Count, F
+from django.db.models import Case, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from apps.diagnosis_requirement.core.models import (
+    Diagnosis_Requirement,
     Recomendation,
 )
+import pandas as pd
+import math
 import platform
 
 
@@ -143,6 +152,70 @@ class DiagnosisService:
 
         return result
 
+    # Campos del checklist que cambian el puntaje
+    SCORE_FIELDS = ("obtained_value", "is_articuled")
+
+    @staticmethod
+    def calculate_score_deltas(diagnosis_id, checklist_ids=(), question_ids=()):
+        """
+        Puntajes de los pasos afectados por un cambio en el checklist.
+
+        Se calcula igual que calculate_completion_percentage pero solo para los
+        ciclos de las filas cambiadas, con una suma agrupada en base de datos.
+
+        :param checklist_ids: Ids de CheckList cambiados.
+        :param question_ids: Ids de preguntas cambiadas (guardado completo).
+        :return: [{"cycle", "cycle_percentage", "steps": [{"step", "percentage"}]}]
+            con solo los pasos afectados de cada ciclo.
+        """
+        checklists = CheckList.objects.filter(diagnosis=diagnosis_id)
+        changed = set(
+            checklists.filter(
+                Q(pk__in=checklist_ids) | Q(question__in=question_ids)
+            ).values_list("question__requirement__cycle", "question__requirement__step")
+        )
+        if not changed:
+            return []
+
+        step_totals = (
+            checklists.filter(
+                question__requirement__cycle__in={cycle for cycle, _ in changed}
+            )
+            .values("question__requirement__cycle", "question__requirement__step")
+            .annotate(
+                variable=Sum("question__variable_value"),
+                # Si no esta articulado se considera el 100% de la pregunta
+                obtained=Sum(
+                    Case(
+                        When(is_articuled=True, then=F("obtained_value")),
+                        default=F("question__variable_value"),
+                        output_field=CheckList._meta.get_field("obtained_value"),
+                    )
+                ),
+            )
+        )
+        cycles = {}
+        for row in step_totals:
+            cycle = row["question__requirement__cycle"]
+            step = row["question__requirement__step"]
+            percentage = (
+                row["obtained"] / row["variable"] * 100 if row["variable"] else 0.0
+            )
+            cycles.setdefault(cycle, {})[step] = percentage
+
+        return [
+            {
+                "cycle": cycle,
+                "cycle_percentage": round(sum(steps.values()) / len(steps), 2),
+                "steps": [
+                    {"step": step, "percentage": round(percentage, 2)}
+                    for step, percentage in sorted(steps.items())
+                    if (cycle, step) in changed
+                ],
+            }
+            for cycle, steps in cycles.items()
+        ]
+
     @staticmethod
     def group_questions_by_step(
         checklist_requirements,
@@ -158,10 +231,13 @@ class DiagnosisService:
         result = []
 
         if include_compliance and checklist_questions is not None:
+            question_checklist_dict = {q.question_id: q for q in checklist_questions}
             question_compliance_dict = {
-                q.question_id: q.compliance for q in checklist_questions
+                question_id: q.compliance
+                for question_id, q in question_checklist_dict.items()
             }
         else:
+            question_checklist_dict = {}
             question_compliance_dict = {}
 
         for cr in checklist_requirements:
@@ -192,6 +268,7 @@ class DiagnosisService:
                 result.append(
                     {
                         "id": cr.id,
+                        "version": cr.version,
                         "step": requirement.step,
                         "cycle": requirement.cycle,
                         "observation": cr.observation,
@@ -200,9 +277,26 @@ class DiagnosisService:
                             "id": compliance.id,
                             "name": compliance.name,
                         },
-                        "questions": Diagnosis_QuestionsChecklistSerializer(
-                            questions_with_compliance, many=True
-                        ).data,
+                        "questions": [
+                            {
+                                **question,
+                                # Fila del checklist para autosave_diagnosis
+                                "checklist": (
+                                    {"id": checklist.id, "version": checklist.version}
+                                    if checklist
+                                    else None
+                                ),
+                            }
+                            for question, checklist in zip(
+                                Diagnosis_QuestionsChecklistSerializer(
+                                    questions_with_compliance, many=True
+                                ).data,
+                                [
+                                    question_checklist_dict.get(question.id)
+                                    for question in questions
+                                ],
+                            )
+                        ],
                     }
                 )
             else:
@@ -210,6 +304,7 @@ class DiagnosisService:
                 result.append(
                     {
                         "id": cr.id,
+                        "version": cr.version,
                         "step": requirement.step,
                         "cycle": requirement.cycle,
                         "observation": cr.observation,
@@ -225,6 +320,86 @@ class DiagnosisService:
                 )
         return result
 
+    # Validacion de los campos que acepta autosave_diagnosis
+    DELTA_FIELDS = {
+        "id": serializers.IntegerField(min_value=1),
+        "version": serializers.IntegerField(min_value=1),
+        "compliance": serializers.IntegerField(min_value=1, allow_null=True),
+        "observation": serializers.CharField(allow_blank=True, allow_null=True),
+        "verify_document": serializers.CharField(allow_blank=True, allow_null=True),
+        "is_articuled": serializers.BooleanField(),
+        "obtained_value": serializers.FloatField(),
+    }
+
+    @classmethod
+    def _validate_delta(cls, delta) -> dict:
+        if not isinstance(delta, dict):
+            raise ValueError("Cada cambio debe ser un objeto.")
+        if delta.get("id") is None or delta.get("version") is None:
+            raise ValueError("Cada cambio debe incluir 'id' y 'version'.")
+        validated = {}
+        for name, value in delta.items():
+            field = cls.DELTA_FIELDS.get(name)
+            if field is None:
+                continue
+            try:
+                value = field.run_validation(value)
+            except serializers.ValidationError as ex:
+                raise ValueError(f"'{name}': {' '.join(map(str, ex.detail))}")
+            if isinstance(value, float) and not math.isfinite(value):
+                raise ValueError(f"'{name}': valor invalido.")
+            validated[name] = value
+        return validated
+
+    @classmethod
+    def prepare_checklist_deltas(cls, questions, requirements):
+        """
+        Valida y normaliza los cambios parciales enviados por el autoguardado.
+
+        :param questions: Cambios de CheckList, cada uno con "id" y "version".
+        :param requirements: Cambios de Checklist_Requirement con "id" y "version".
+        :return: Tupla (questions, requirements) normalizada, solo con los campos
+            conocidos y con su tipo.
+        :raises ValueError: Si algun cambio o valor es invalido o el cumplimiento
+            no existe.
+        """
+        if not isinstance(questions, list) or not isinstance(requirements, list):
+            raise ValueError("'questions' y 'requirements' deben ser listas.")
+        questions = [cls._validate_delta(delta) for delta in questions]
+        requirements = [cls._validate_delta(delta) for delta in requirements]
+
+        for delta in questions:
+            if "observation" in delta:
+                delta["observation"] = (
+                    blank_to_null(delta["observation"]) or "SIN OBSERVACIONES"
+                )
+            if "verify_document" in delta:
+                delta["verify_document"] = blank_to_null(delta["verify_document"])
+
+        compliance_ids = {
+            delta["compliance"]
+            for delta in [*questions, *requirements]
+            if delta.get("compliance") is not None
+        }
+        if not compliance_ids.issubset(get_catalog("compliance").get()):
+            raise ValueError("El cumplimiento enviado no existe.")
+        return questions, requirements
+
+    # Roles que pueden editar cualquier diagnóstico
+    EDITOR_GROUPS = {GroupTypes.ADMIN.value, GroupTypes.SUPER_ADMIN.value}
+
+    @classmethod
+    def can_edit(cls, user, diagnosis_id: int) -> bool:
+        """
+        Admin, SuperAdmin o el consultor asignado al diagnóstico.
+
+        :param user: Usuario autenticado.
+        :param diagnosis_id: Id del diagnóstico a modificar.
+        """
+        if cls.EDITOR_GROUPS & get_group_names(user):
+            return True
+        return Diagnosis.objects.filter(id=diagnosis_id, consultor=user).exists()
+
     @staticmethod
     def process_vehicle_data(diagnosis_count_id, vehicle_data):
         vehicle_errors = []
@@ -310,6 +485,243 @@ class DiagnosisService:
         return new_diagnosis
 
 
+class DiagnosisQuestionsImport:
+    """
+    Importa el banco de preguntas del Excel de uploadDiagnosisQuestions.
+
+    Todo el archivo se valida con operaciones de pandas sobre columnas: los
+    pasos se resuelven con un solo diccionario paso -> requisito y el valor de
+    cada pregunta (100 / preguntas del paso) con un groupby. Si alguna fila
+    tiene errores no se guarda nada y se reportan todas; si no, las preguntas
+    se crean o actualizan (mismo requisito y nombre sin importar mayusculas)
+    con bulk_create/bulk_update en una sola transaccion.
+
+    :param df: DataFrame leido del Excel.
+    """
+
+    STEP_COLUMN = "PASO PESV"
+    NAME_COLUMN = "CRITERIO DE VERIFICACIÓN"
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    def validate(self) -> tuple:
+        """
+        :return: Tupla (preguntas, errores). ``preguntas`` es un DataFrame con
+            requirement, name, key y variable_value; ``errores`` una lista de
+            {"row": fila del Excel, "errors": {columna: mensaje}}.
+        """
+        missing = [
+            column
+            for column in (self.STEP_COLUMN, self.NAME_COLUMN)
+            if column not in self.df.columns
+        ]
+        if missing:
+            required = {column: "Columna requerida" for column in missing}
+            return None, [{"row": None, "errors": required}]
+
+        # Fila 1 del Excel es el encabezado
+        frame = pd.DataFrame(
+            {
+                "row": self.df.index + 2,
+                "step": pd.to_numeric(self.df[self.STEP_COLUMN], errors="coerce"),
+                "name": self.df[self.NAME_COLUMN]
+                .fillna("")
+                .astype(str)
+                .str.strip(),
+            }
+        )
+        invalid_step = frame["step"].isna() | (frame["step"] % 1 != 0)
+        steps = frame.loc[~invalid_step, "step"].astype(int).unique().tolist()
+        requirements = dict(
+            Diagnosis_Requirement.objects.filter(step__in=steps).values_list(
+                "step", "id"
+            )
+        )
+        frame["requirement"] = frame["step"].map(requirements)
+        unknown_step = ~invalid_step & frame["requirement"].isna()
+        empty_name = frame["name"] == ""
+
+        messages = pd.DataFrame(
+            {
+                self.STEP_COLUMN: invalid_step.map({True: "Paso invalido"}),
+                "requirement": unknown_step.map(
+                    {True: "No existe un requisito con ese paso"}
+                ),
+                self.NAME_COLUMN: empty_name.map({True: "El criterio es obligatorio"}),
+            }
+        )
+        # El requisito inexistente se reporta en la columna del paso
+        messages[self.STEP_COLUMN] = messages[self.STEP_COLUMN].fillna(
+            messages.pop("requirement")
+        )
+        has_errors = invalid_step | unknown_step | empty_name
+        errors = [
+            {"row": int(row), "errors": row_messages.dropna().to_dict()}
+            for row, (_, row_messages) in zip(
+                frame.loc[has_errors, "row"], messages[has_errors].iterrows()
+            )
+        ]
+        if errors:
+            return None, errors
+
+        questions = frame.assign(
+            requirement=frame["requirement"].astype(int),
+            key=frame["name"].str.lower(),
+        ).drop_duplicates(["requirement", "key"], keep="last")
+        questions_by_step = questions.groupby("requirement")["key"].transform("nunique")
+        questions["variable_value"] = (100 / questions_by_step).round().astype(int)
+        return questions, []
+
+    def save(self, questions: pd.DataFrame) -> list:
+        """
+        Crea o actualiza las preguntas validadas.
+
+        :return: Las preguntas importadas con su requisito.
+        """
+        requirement_ids = questions["requirement"].unique().tolist()
+        keys = set(zip(questions["requirement"], questions["key"]))
+        now = timezone.now()
+        with transaction.atomic():
+            rows = Diagnosis_Questions.objects.filter(
+                requirement_id__in=requirement_ids
+            ).values_list("id", "requirement_id", "name")
+            existing = {
+                (requirement_id, (name or "").strip().lower()): question_id
+                for question_id, requirement_id, name in rows
+            }
+            to_create, to_update = [], []
+            for requirement_id, key, name, variable_value in zip(
+                questions["requirement"].tolist(),
+                questions["key"],
+                questions["name"],
+                questions["variable_value"].tolist(),
+            ):
+                question = Diagnosis_Questions(
+                    id=existing.get((requirement_id, key)),
+                    requirement_id=requirement_id,
+                    name=name,
+                    variable_value=variable_value,
+                    updated_at=now,
+                )
+                (to_update if question.id else to_create).append(question)
+            Diagnosis_Questions.objects.bulk_update(
+                to_update, ["name", "variable_value", "updated_at"], batch_size=500
+            )
+            Diagnosis_Questions.objects.bulk_create(to_create, batch_size=500)
+            # bulk_create/bulk_update no emiten post_save
+            transaction.on_commit(get_catalog("diagnosis_questions").invalidate)
+
+        # MySQL no retorna los ids de bulk_create, se consultan de nuevo
+        return [
+            question
+            for question in Diagnosis_Questions.objects.filter(
+                requirement_id__in=requirement_ids
+            )
+            .select_related("requirement")
+            .order_by("id")
+            if (question.requirement_id, (question.name or "").strip().lower()) in keys
+        ]
+
+
+class NotificationService:
+    """
+    Notificaciones con recibo de lectura por usuario.
+
+    ``NotificationCounter`` guarda las no leídas de cada usuario y se actualiza
+    en la misma transacción que los recibos, asi el contador no requiere contar.
+
+    Las notificaciones generales (sin usuario) llegan a los usuarios activos
+    de FEED_GROUPS al momento de enviarlas: quien entra despues a esos grupos
+    no ve las anteriores y las cuentas externas de conteo no reciben recibos.
+    """
+
+    # Roles que leen el listado de notificaciones
+    FEED_GROUPS = [
+        GroupTypes.SUPER_ADMIN.value,
+        GroupTypes.ADMIN.value,
+        GroupTypes.CONSULTOR.value,
+    ]
+
+    @classmethod
+    @transaction.atomic
+    def notify(cls, message: str, diagnosis, user=None) -> Notification:
+        """
+        Crea la notificación y los recibos de sus destinatarios.
+
+        :param user: Destinatario, si es None se notifica a los usuarios
+            activos de FEED_GROUPS.
+        """
+        notification = Notification.objects.create(
+            user=user, message=message, diagnosis=diagnosis
+        )
+        if user is not None:
+            user_ids = [user.id]
+        else:
+            user_ids = list(
+                User.objects.filter(is_active=True, groups__name__in=cls.FEED_GROUPS)
+                .values_list("id", flat=True)
+                .distinct()
+            )
+        NotificationReceipt.objects.bulk_create(
+            [
+                NotificationReceipt(
+                    notification=notification,
+                    user_id=user_id,
+                    created_at=notification.created_at,
+                )
+                for user_id in user_ids
+            ],
+            batch_size=500,
+        )
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id) for user_id in user_ids],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(
+            unread=F("unread") + 1
+        )
+        return notification
+
+    @staticmethod
+    def feed(user, unread_only=False):
+        """Recibos del usuario, usar con KeysetPagination (created_at, id)."""
+        receipts = NotificationReceipt.objects.filter(user=user)
+        if unread_only:
+            receipts = receipts.filter(read=False)
+        return NotificationReceiptSerializer.setup_eager_loading(receipts)
+
+    @staticmethod
+    def unread_count(user) -> int:
+        return (
+            NotificationCounter.objects.filter(user=user)
+            .values_list("unread", flat=True)
+            .first()
+            or 0
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def mark_read(user, notification_ids=None) -> int:
+        """
+        Marca como leídas las notificaciones del usuario con un solo UPDATE.
+
+        :param notification_ids: Ids de notificación, si es None se marcan todas.
+        :return: Cantidad de recibos que pasaron a leídos.
+        """
+        receipts = NotificationReceipt.objects.filter(user=user, read=False)
+        if notification_ids is not None:
+            receipts = receipts.filter(notification_id__in=notification_ids)
+        updated = receipts.update(read=True, read_at=timezone.now())
+        if updated:
+            # GREATEST evita que la resta quede negativa (columna sin signo)
+            NotificationCounter.objects.filter(user=user).update(
+                unread=Greatest(F("unread"), updated) - updated
+            )
+        return updated
+
+
 class GenerateReport:
     company = None
     diagnosis = None
@@ -1,3 +1,836 @@
-from django.test import TestCase
+from django.db import transaction
+from django.test import TestCase, override_settings
+from utils.events import publish, subscribe
 
-# Create your tests here.
+TEST_EVENT = "tests.event"
+received = []
+
+
+@subscribe(TEST_EVENT)
+def collect_event(value):
+    received.append(value)
+
+
+@override_settings(DOMAIN_EVENTS_ASYNC=False)
+class DomainEventsTests(TestCase):
+    def setUp(self):
+        received.clear()
+
+    def test_events_are_dispatched_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                publish(TEST_EVENT, value=1)
+                self.assertEqual(received, [])
+        self.assertEqual(received, [1])
+
+    def test_events_are_discarded_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    publish(TEST_EVENT, value=1)
+                    raise ValueError("rollback")
+            except ValueError:
+                pass
+        self.assertEqual(received, [])
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from rest_framework import viewsets
+        from rest_framework.response import Response
+        from rest_framework.permissions import AllowAny
+        from utils.idempotency import idempotent
+
+        cache.clear()
+        self.calls = []
+        calls = self.calls
+
+        class DummyViewSet(viewsets.ViewSet):
+            permission_classes = [AllowAny]
+            authentication_classes = []
+
+            @idempotent()
+            def create(self, request):
+                calls.append(request.data)
+                return Response({"count": len(calls)}, status=201)
+
+        self.view = DummyViewSet.as_view({"post": "create"})
+
+    def post(self, data, key="llave-1"):
+        from rest_framework.test import APIRequestFactory
+
+        request = APIRequestFactory().post(
+            "/dummy", data, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+        return self.view(request)
+
+    def test_retry_replays_first_response(self):
+        first = self.post({"a": 1})
+        retry = self.post({"a": 1})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+
+    def test_reused_key_with_other_body_is_rejected(self):
+        self.post({"a": 1})
+        response = self.post({"a": 2})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+
+class InitChecklistRequirementsTests(TestCase):
+    def test_only_missing_requirements_are_created(self):
+        from apps.diagnosis.models import Checklist_Requirement, Compliance, Diagnosis
+        from apps.diagnosis.repositories import CheckListRequirementRepository
+        from apps.diagnosis.use_cases import InitChecklistRequirements
+        from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+
+        cumple = Compliance.objects.create(name="CUMPLE")
+        no_cumple = Compliance.objects.create(name="NO CUMPLE")
+        diagnosis = Diagnosis.objects.create(date_elabored="2024-01-01")
+        requirements = [
+            Diagnosis_Requirement.objects.create(name=f"Paso {step}", step=step)
+            for step in range(1, 4)
+        ]
+        Checklist_Requirement.objects.create(
+            diagnosis=diagnosis, requirement=requirements[0], compliance=cumple
+        )
+
+        with self.assertNumQueries(2):
+            created = InitChecklistRequirements(
+                CheckListRequirementRepository(), diagnosis, requirements, no_cumple
+            ).execute()
+
+        self.assertEqual(len(created), 2)
+        compliance_by_requirement = dict(
+            Checklist_Requirement.objects.filter(diagnosis=diagnosis).values_list(
+                "requirement_id", "compliance_id"
+            )
+        )
+        self.assertEqual(
+            compliance_by_requirement,
+            {
+                requirements[0].id: cumple.id,
+                requirements[1].id: no_cumple.id,
+                requirements[2].id: no_cumple.id,
+            },
+        )
+
+
+class ApplyChecklistDeltasTests(TestCase):
+    def test_stale_version_is_reported_as_conflict(self):
+        from apps.diagnosis.models import Checklist_Requirement, Compliance, Diagnosis
+        from apps.diagnosis.repositories import (
+            CheckListRepository,
+            CheckListRequirementRepository,
+        )
+        from apps.diagnosis.use_cases import ApplyChecklistDeltas
+        from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+
+        cumple = Compliance.objects.create(name="CUMPLE")
+        no_cumple = Compliance.objects.create(name="NO CUMPLE")
+        diagnosis = Diagnosis.objects.create(date_elabored="2024-01-01")
+        fresh, stale = [
+            Checklist_Requirement.objects.create(
+                diagnosis=diagnosis,
+                requirement=Diagnosis_Requirement.objects.create(
+                    name=f"Paso {step}", step=step
+                ),
+                compliance=no_cumple,
+            )
+            for step in (1, 2)
+        ]
+        Checklist_Requirement.objects.filter(pk=stale.pk).update(version=3)
+        other = Checklist_Requirement.objects.create(
+            diagnosis=Diagnosis.objects.create(date_elabored="2024-01-01"),
+            requirement=fresh.requirement,
+            compliance=no_cumple,
+        )
+
+        result = ApplyChecklistDeltas(
+            CheckListRepository(),
+            CheckListRequirementRepository(),
+            diagnosis.id,
+            [],
+            [
+                {"id": fresh.id, "version": 1, "compliance": cumple.id},
+                {"id": stale.id, "version": 1, "compliance": cumple.id},
+                {"id": other.id, "version": 1, "compliance": cumple.id},
+                {"id": other.id + 100, "version": 1, "compliance": cumple.id},
+            ],
+        ).execute()
+
+        self.assertEqual(
+            [delta["id"] for delta in result["applied"]["requirements"]], [fresh.id]
+        )
+        self.assertEqual(
+            [delta["id"] for delta in result["conflicts"]["requirements"]], [stale.id]
+        )
+        # Aplicados y conflictos usan los mismos nombres de campo
+        self.assertEqual(
+            result["conflicts"]["requirements"][0]["compliance"], no_cumple.id
+        )
+        self.assertNotIn("compliance_id", result["conflicts"]["requirements"][0])
+        # Las filas de otro diagnóstico no se retornan, solo se rechazan
+        self.assertEqual(
+            result["rejected"]["requirements"], [other.id, other.id + 100]
+        )
+        fresh.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertEqual((fresh.compliance_id, fresh.version), (cumple.id, 2))
+        self.assertEqual((stale.compliance_id, stale.version), (no_cumple.id, 3))
+
+
+class QuestionnaireReadModelTests(TestCase):
+    def setUp(self):
+        from apps.diagnosis.models import (
+            CheckList,
+            Checklist_Requirement,
+            Compliance,
+            Diagnosis,
+            Diagnosis_Questions,
+        )
+        from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+
+        cumple = Compliance.objects.create(name="CUMPLE")
+        no_cumple = Compliance.objects.create(name="NO CUMPLE")
+        self.diagnosis = Diagnosis.objects.create(date_elabored="2024-01-01")
+        for step in (2, 1):
+            requirement = Diagnosis_Requirement.objects.create(
+                name=f"Paso {step}", step=step, cycle="P"
+            )
+            Checklist_Requirement.objects.create(
+                diagnosis=self.diagnosis, requirement=requirement, compliance=cumple
+            )
+            for number in range(3):
+                question = Diagnosis_Questions.objects.create(
+                    name=f"Pregunta {step}.{number}",
+                    requirement=requirement,
+                    variable_value=number,
+                )
+                if number < 2:
+                    CheckList.objects.create(
+                        diagnosis=self.diagnosis,
+                        question=question,
+                        compliance=cumple if number else no_cumple,
+                    )
+
+    def test_matches_serializer_payload(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        for flags in ([], ["--no-compliance"]):
+            out = StringIO()
+            call_command(
+                "benchmark_questionnaire",
+                str(self.diagnosis.id),
+                "--iterations=1",
+                *flags,
+                stdout=out,
+            )
+            self.assertIn("2 requisitos", out.getvalue())
+
+    def test_json_benchmark(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command(
+            "benchmark_json", str(self.diagnosis.id), "--iterations=1", stdout=out
+        )
+        self.assertIn("findQuestionsByCompanySize", out.getvalue())
+
+    def test_query_count_does_not_depend_on_questions(self):
+        from apps.diagnosis.read_models import QuestionnaireReadModel
+
+        # La primera llamada carga los catalogos de requisitos y preguntas
+        QuestionnaireReadModel.grouped_by_step(self.diagnosis.id)
+        with self.assertNumQueries(2):
+            payload = QuestionnaireReadModel.grouped_by_step(
+                self.diagnosis.id, include_compliance=True
+            )
+        self.assertEqual([item["step"] for item in payload], [1, 2])
+        self.assertEqual([len(item["questions"]) for item in payload], [2, 2])
+
+    def test_read_payload_carries_rows_for_autosave(self):
+        from rest_framework.test import APIClient
+        from apps.sign.models import User
+
+        client = APIClient()
+        lector = User.objects.create_user(
+            username="lector", password="clave", cedula="lector"
+        )
+        client.force_authenticate(lector)
+        self.diagnosis.consultor = lector
+        self.diagnosis.save()
+
+        def read():
+            return client.get(
+                "/api/v1/diagnosis/findQuestionsByCompanySize/",
+                {"company": 0, "diagnosis": self.diagnosis.id, "group_by_step": "true"},
+            ).json()[0]
+
+        step = read()
+        checklist = step["questions"][0]["checklist"]
+        response = client.patch(
+            f"/api/v1/diagnosis/autosave_diagnosis/?diagnosis={self.diagnosis.id}",
+            {
+                "questions": [{**checklist, "observation": "Revisado"}],
+                "requirements": [
+                    {"id": step["id"], "version": step["version"], "observation": "Ok"}
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        step = read()
+        self.assertEqual(step["version"], 2)
+        self.assertEqual(
+            step["questions"][0]["checklist"], {"id": checklist["id"], "version": 2}
+        )
+
+    def test_autosave_rejects_invalid_input(self):
+        from rest_framework.test import APIClient
+        from apps.diagnosis.models import CheckList
+        from apps.sign.models import User
+
+        client = APIClient()
+        consultor = User.objects.create_user(
+            username="autosave", password="clave", cedula="as"
+        )
+        client.force_authenticate(consultor)
+        self.diagnosis.consultor = consultor
+        self.diagnosis.save()
+        checklist = CheckList.objects.first()
+        url = f"/api/v1/diagnosis/autosave_diagnosis/?diagnosis={self.diagnosis.id}"
+        delta = {"id": checklist.id, "version": 1}
+        for query, body in [
+            ("?diagnosis=abc", {"questions": []}),
+            ("", [delta]),
+            ("", {"questions": [{**delta, "obtained_value": "mucho"}]}),
+            ("", {"questions": [{**delta, "is_articuled": "tal vez"}]}),
+            ("", {"questions": [{**delta, "version": "uno"}]}),
+            ("", {"questions": ["texto"]}),
+            ("", {"requirements": {"id": 1}}),
+        ]:
+            target = f"/api/v1/diagnosis/autosave_diagnosis/{query}" if query else url
+            response = client.patch(target, body, format="json")
+            self.assertEqual(response.status_code, 400, (query, body))
+
+        # Otro usuario sin rol de administrador no puede guardar
+        client.force_authenticate(
+            User.objects.create_user(username="ajeno", password="clave", cedula="aj")
+        )
+        response = client.patch(
+            url, {"questions": [{**delta, "observation": "Ajeno"}]}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+        checklist.refresh_from_db()
+        self.assertEqual(checklist.version, 1)
+
+
+class DiagnosisQueryBudgetTests(TestCase):
+    MAX_QUERIES = 8
+
+    def setUp(self):
+        from django.contrib.auth.models import Group
+        from rest_framework.test import APIClient
+        from apps.company.models import Company
+        from apps.diagnosis.models import Diagnosis
+        from apps.sign.models import User
+
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(
+                username="budget", password="clave", cedula="budget"
+            )
+        )
+        group = Group.objects.create(name="Consultor")
+        for number in range(4):
+            consultor = User.objects.create_user(
+                username=f"consultor{number}", password="clave", cedula=f"{number}"
+            )
+            consultor.groups.add(group)
+            company = Company.objects.create(name=f"Empresa {number}", nit=f"9{number}")
+            for _ in range(3):
+                self.diagnosis = Diagnosis.objects.create(
+                    company=company, consultor=consultor, date_elabored="2024-01-01"
+                )
+
+    def get(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), self.MAX_QUERIES)
+        return response
+
+    def test_list_and_retrieve_stay_within_budget(self):
+        from django.urls import reverse
+
+        response = self.get(reverse("diagnosis-list"))
+        self.assertEqual(len(response.data), 12)
+        self.assertNotIn("company_diagnosis", response.data[0]["company_detail"])
+
+        response = self.get(reverse("diagnosis-detail", args=[self.diagnosis.id]))
+        self.assertEqual(response.data["id"], self.diagnosis.id)
+
+    def test_expand_company_history(self):
+        from django.urls import reverse
+
+        response = self.get(
+            reverse("diagnosis-list")
+            + "?expand=company_detail.company_diagnosis&fields=id,company_detail"
+        )
+        self.assertEqual(set(response.data[0]), {"id", "company_detail"})
+        self.assertEqual(len(response.data[0]["company_detail"]["company_diagnosis"]), 3)
+
+
+class NotificationReceiptTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from apps.diagnosis.models import Diagnosis
+        from apps.sign.models import User
+
+        from django.contrib.auth.models import Group
+
+        self.diagnosis = Diagnosis.objects.create(date_elabored="2024-01-01")
+        self.ana, self.luis, self.externo = [
+            User.objects.create_user(username=name, password="clave", cedula=name)
+            for name in ("ana", "luis", "externo")
+        ]
+        consultor = Group.objects.create(name="Consultor")
+        self.ana.groups.add(consultor, Group.objects.create(name="Admin"))
+        self.luis.groups.add(consultor)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.ana)
+
+    def test_broadcast_is_read_per_user(self):
+        from django.urls import reverse
+        from apps.diagnosis.services import NotificationService
+
+        general = NotificationService.notify("General", self.diagnosis)
+        own = NotificationService.notify("Propia", self.diagnosis, user=self.ana)
+        self.assertEqual(NotificationService.unread_count(self.ana), 2)
+        self.assertEqual(NotificationService.unread_count(self.luis), 1)
+        # Las cuentas sin rol de lectura no reciben las generales
+        self.assertEqual(NotificationService.unread_count(self.externo), 0)
+
+        response = self.client.patch(
+            reverse("diagnosis-read-notifications"),
+            {"notifications": [general.id]},
+            format="json",
+        )
+        self.assertEqual(response.data["unread"], 1)
+        self.assertEqual(NotificationService.unread_count(self.luis), 1)
+
+        response = self.client.get(
+            reverse("diagnosis-find-notifications-by-user"), {"unread": "true"}
+        )
+        self.assertEqual([row["id"] for row in response.data], [own.id])
+        # ?user= no permite leer el listado de otro usuario
+        response = self.client.get(
+            reverse("diagnosis-find-notifications-by-user"),
+            {"unread": "true", "user": self.luis.id},
+        )
+        self.assertEqual([row["id"] for row in response.data], [own.id])
+
+        response = self.client.patch(
+            reverse("diagnosis-read-notifications"), {"all": True}, format="json"
+        )
+        self.assertEqual((response.data["updated"], response.data["unread"]), (1, 0))
+
+    def test_feed_is_cursor_paginated(self):
+        from django.urls import reverse
+        from apps.diagnosis.services import NotificationService
+
+        ids = [
+            NotificationService.notify(f"Aviso {number}", self.diagnosis).id
+            for number in range(3)
+        ]
+        url = reverse("diagnosis-find-notifications-by-user")
+        page = self.client.get(url, {"page_size": 2}).data
+        self.assertEqual([row["id"] for row in page["results"]], ids[:0:-1])
+        page = self.client.get(page["next"]).data
+        self.assertEqual([row["id"] for row in page["results"]], ids[:1])
+        self.assertIsNone(page["next"])
+
+        response = self.client.get(url, {"cursor": "no-es-un-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class DiagnosisConsumerTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import Group
+        from apps.diagnosis.models import Diagnosis
+        from apps.sign.models import User
+
+        self.ana, self.luis, self.externo = [
+            User.objects.create_user(username=name, password="clave", cedula=name)
+            for name in ("ana", "luis", "externo")
+        ]
+        self.luis.groups.add(Group.objects.create(name="Admin"))
+        # ana es la consultora del diagnóstico
+        self.diagnosis = Diagnosis.objects.create(
+            date_elabored="2024-01-01", consultor=self.ana
+        )
+
+    def connect(self, user=None, path="/ws/diagnosis/"):
+        from channels.testing import WebsocketCommunicator
+        from apps.diagnosis.consumers.consumer import DiagnosisConsumer
+        from apps.sign.middleware import JWTAuthMiddleware
+
+        communicator = WebsocketCommunicator(
+            JWTAuthMiddleware(DiagnosisConsumer.as_asgi()), path
+        )
+        if user is not None:
+            communicator.scope["user"] = user
+        return communicator
+
+    async def test_events_reach_only_subscribed_sockets(self):
+        from channels.layers import get_channel_layer
+        from apps.diagnosis.consumers.groups import diagnosis_group, user_group
+
+        ana = self.connect(self.ana, f"/ws/diagnosis/?diagnosis={self.diagnosis.id}")
+        luis = self.connect(self.luis)
+        self.assertTrue((await ana.connect())[0])
+        self.assertTrue((await luis.connect())[0])
+
+        channel_layer = get_channel_layer()
+        diagnosis_id = self.diagnosis.id
+        delta = {
+            "type": "checklist_delta",
+            "diagnosis": diagnosis_id,
+            "questions": [],
+            "requirements": [],
+        }
+        await channel_layer.group_send(diagnosis_group(diagnosis_id), delta)
+        self.assertEqual((await ana.receive_json_from())["diagnosis"], diagnosis_id)
+        self.assertTrue(await luis.receive_nothing())
+
+        await luis.send_json_to({"action": "subscribe", "diagnosis": diagnosis_id})
+        self.assertEqual(
+            await luis.receive_json_from(),
+            {"type": "subscribe", "diagnosis": diagnosis_id},
+        )
+        await luis.send_json_to({"action": "subscribe"})
+        self.assertEqual((await luis.receive_json_from())["type"], "error")
+        await channel_layer.group_send(diagnosis_group(diagnosis_id), delta)
+        self.assertEqual((await luis.receive_json_from())["type"], "checklist_delta")
+
+        notification = {
+            "type": "external_notification",
+            "notification_data": {"id": 1},
+        }
+        await channel_layer.group_send(user_group(self.ana.id), notification)
+        self.assertEqual((await ana.receive_json_from())["type"], "checklist_delta")
+        self.assertEqual((await ana.receive_json_from())["notification_data"], {"id": 1})
+        self.assertTrue(await luis.receive_nothing())
+        await ana.disconnect()
+        await luis.disconnect()
+
+    async def test_subscription_requires_access(self):
+        externo = self.connect(
+            self.externo, f"/ws/diagnosis/?diagnosis={self.diagnosis.id}"
+        )
+        self.assertTrue((await externo.connect())[0])
+        self.assertEqual((await externo.receive_json_from())["type"], "error")
+        for message in (
+            {"action": "subscribe", "diagnosis": self.diagnosis.id},
+            {"action": "subscribe", "corporate_group": 1},
+        ):
+            await externo.send_json_to(message)
+            self.assertEqual(
+                await externo.receive_json_from(),
+                {"type": "error", "message": "Sin acceso"},
+            )
+        await externo.disconnect()
+
+    async def test_requires_authentication(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        anonymous = self.connect()
+        anonymous.scope["user"] = None
+        connected, code = await anonymous.connect()
+        self.assertEqual((connected, code), (False, 4401))
+
+        token = str(AccessToken.for_user(self.ana))
+        communicator = self.connect(path=f"/ws/diagnosis/?token={token}")
+        self.assertTrue((await communicator.connect())[0])
+        await communicator.disconnect()
+
+    @override_settings(WEBSOCKET_COALESCE_WINDOW=0.05)
+    async def test_checklist_bursts_are_coalesced(self):
+        from channels.layers import get_channel_layer
+        from apps.diagnosis.consumers.groups import diagnosis_group
+
+        communicator = self.connect(self.ana, f"/ws/diagnosis/?diagnosis={self.diagnosis.id}")
+        await communicator.connect()
+        channel_layer = get_channel_layer()
+        for version in (2, 4, 3):
+            await channel_layer.group_send(
+                diagnosis_group(self.diagnosis.id),
+                {
+                    "type": "checklist_delta",
+                    "diagnosis": self.diagnosis.id,
+                    "questions": [{"id": 1, "version": version}],
+                    "requirements": [{"id": version, "version": 2}],
+                },
+            )
+        message = await communicator.receive_json_from()
+        self.assertEqual(message["questions"], [{"id": 1, "version": 4}])
+        self.assertEqual(len(message["requirements"]), 3)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    @override_settings(WEBSOCKET_RATE_LIMIT=0, WEBSOCKET_RATE_BURST=2)
+    async def test_flooding_client_is_disconnected(self):
+        communicator = self.connect(self.ana)
+        await communicator.connect()
+        for _ in range(3):
+            await communicator.send_json_to({"action": "subscribe", "diagnosis": 1})
+        await communicator.receive_json_from()
+        await communicator.receive_json_from()
+        output = await communicator.receive_output()
+        self.assertEqual(output, {"type": "websocket.close", "code": 4429})
+
+
+class ScoreDeltaTests(TestCase):
+    def test_matches_full_report_for_changed_steps(self):
+        from apps.diagnosis.models import (
+            CheckList,
+            Compliance,
+            Diagnosis,
+            Diagnosis_Questions,
+        )
+        from apps.diagnosis.services import DiagnosisService
+        from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+
+        cumple = Compliance.objects.create(name="CUMPLE")
+        diagnosis = Diagnosis.objects.create(date_elabored="2024-01-01")
+        checklists = []
+        for step, cycle in ((1, "P"), (2, "P"), (3, "H")):
+            requirement = Diagnosis_Requirement.objects.create(
+                name=f"Paso {step}", step=step, cycle=cycle
+            )
+            for number in range(2):
+                question = Diagnosis_Questions.objects.create(
+                    name=f"Pregunta {step}.{number}",
+                    requirement=requirement,
+                    variable_value=10,
+                )
+                checklists.append(
+                    CheckList.objects.create(
+                        diagnosis=diagnosis,
+                        question=question,
+                        compliance=cumple,
+                        obtained_value=step + number,
+                        is_articuled=number == 0,
+                    )
+                )
+
+        with self.assertNumQueries(2):
+            cycles = DiagnosisService.calculate_score_deltas(
+                diagnosis.id, checklist_ids=[checklists[0].id]
+            )
+
+        report = DiagnosisService.calculate_completion_percentage(diagnosis.id)
+        planning = next(item for item in report if item["cycle"] == "P")
+        step = planning["steps"][0]
+        self.assertEqual(
+            cycles,
+            [
+                {
+                    "cycle": "P",
+                    "cycle_percentage": round(planning["cycle_percentage"], 2),
+                    "steps": [{"step": 1, "percentage": round(step["percentage"], 2)}],
+                }
+            ],
+        )
+
+
+class JSONRenderingTests(TestCase):
+    def test_orjson_matches_drf_output(self):
+        import json
+        from datetime import date, datetime, timezone
+        from decimal import Decimal
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from utils.renderers import ORJSONRenderer
+
+        data = {
+            "text": "Diagnóstico",
+            "amount": Decimal("1.50"),
+            "lazy": gettext_lazy("Campo"),
+            "nested": [{"id": 1, "date": date(2024, 1, 2)}],
+            "updated_at": datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+        }
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+
+    @override_settings(COMPRESSION_MIN_SIZE=100)
+    def test_large_json_responses_are_compressed(self):
+        import json
+        import brotli
+        from django.http import HttpResponse, JsonResponse
+        from django.test import RequestFactory
+        from utils.compression import CompressionMiddleware
+
+        payload = {"rows": [{"name": "Empresa", "step": step} for step in range(50)]}
+        middleware = CompressionMiddleware(lambda request: JsonResponse(payload))
+        factory = RequestFactory()
+
+        response = middleware(factory.get("/", HTTP_ACCEPT_ENCODING="gzip, br"))
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(json.loads(brotli.decompress(response.content)), payload)
+        response = middleware(factory.get("/", HTTP_ACCEPT_ENCODING="gzip"))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        small = CompressionMiddleware(lambda request: JsonResponse({"id": 1}))
+        response = small(factory.get("/", HTTP_ACCEPT_ENCODING="br"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        binary = CompressionMiddleware(
+            lambda request: HttpResponse(b"x" * 500, content_type="image/png")
+        )
+        response = binary(factory.get("/", HTTP_ACCEPT_ENCODING="br"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from apps.company.models import Company
+        from apps.diagnosis.models import Diagnosis
+        from apps.sign.models import User
+
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(
+                username="etag", password="clave", cedula="etag"
+            )
+        )
+        self.company = Company.objects.create(name="Empresa", nit="9000000001")
+        self.diagnoses = [
+            Diagnosis.objects.create(company=self.company, date_elabored="2024-01-01")
+            for _ in range(2)
+        ]
+
+    def test_unchanged_resources_answer_not_modified(self):
+        from django.urls import reverse
+
+        for url in (
+            reverse("diagnosis-list"),
+            reverse("diagnosis-detail", args=[self.diagnoses[0].id]),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=f"W/{etag}")
+            self.assertEqual(response.status_code, 304)
+
+            self.company.name = f"Empresa {url}"
+            self.company.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+
+    def test_deleted_rows_change_the_list_etag(self):
+        from django.urls import reverse
+
+        url = reverse("diagnosis-list")
+        etag = self.client.get(url)["ETag"]
+        self.diagnoses[1].delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+
+    def test_non_numeric_pk_is_not_found(self):
+        response = self.client.get("/api/v1/diagnosis/abc/")
+        self.assertEqual(response.status_code, 404)
+
+
+class UploadDiagnosisQuestionsTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from apps.diagnosis.models import Diagnosis_Questions
+        from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+        from apps.sign.models import User
+
+        self.requirements = {
+            step: Diagnosis_Requirement.objects.create(
+                name=f"Paso {step}", step=step, cycle="P"
+            )
+            for step in (1, 2)
+        }
+        self.existing = Diagnosis_Questions.objects.create(
+            name="Tiene politica", requirement=self.requirements[1], variable_value=100
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(username="carga", password="clave", cedula="carga")
+        )
+
+    def upload(self, rows):
+        import base64
+        from io import BytesIO
+        import pandas as pd
+
+        excel_file = BytesIO()
+        pd.DataFrame(rows, columns=["PASO PESV", "CRITERIO DE VERIFICACIÓN"]).to_excel(
+            excel_file, index=False
+        )
+        return self.client.post(
+            "/api/v1/diagnosis/uploadDiagnosisQuestions/",
+            {"diagnosis_questions": base64.b64encode(excel_file.getvalue()).decode()},
+            format="json",
+        )
+
+    def test_questions_are_upserted_in_bulk(self):
+        from apps.diagnosis.models import Diagnosis_Questions
+
+        rows = [
+            (1, " TIENE POLITICA "),
+            (1, "Tiene comite"),
+            (1, "Tiene lider"),
+            (2, "Tiene plan"),
+        ]
+        with self.assertNumQueries(7):
+            response = self.upload(rows)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 4)
+
+        self.existing.refresh_from_db()
+        self.assertEqual(
+            (self.existing.name, self.existing.variable_value), ("TIENE POLITICA", 33)
+        )
+        self.assertEqual(Diagnosis_Questions.objects.count(), 4)
+        self.assertEqual(
+            Diagnosis_Questions.objects.get(name="Tiene plan").variable_value, 100
+        )
+
+    def test_every_invalid_row_is_reported(self):
+        from apps.diagnosis.models import Diagnosis_Questions
+
+        response = self.upload(
+            [(1, "Tiene comite"), ("uno", "Tiene lider"), (9, "Tiene plan"), (2, None)]
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["errors"]
+        self.assertEqual(
+            [(error["row"], list(error["errors"])) for error in errors],
+            [
+                (3, ["PASO PESV"]),
+                (4, ["PASO PESV"]),
+                (5, ["CRITERIO DE VERIFICACIÓN"]),
+            ],
+        )
+        self.assertEqual(Diagnosis_Questions.objects.count(), 1)
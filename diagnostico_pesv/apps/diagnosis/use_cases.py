@@ -6,6 +6,7 @@ from apps.diagnosis.interfaces import (
     IComplianceRepository,
     IDiagnosisQuestionRepository,
 )
+from django.db import transaction
 from datetime import datetime
 from typing import List, Dict
 
@@ -75,6 +76,44 @@ class CreateOrUpdateChecklistRequirement:
         return self.repository.save_or_update(self.diagnosis_data)
 
 
+class InitChecklistRequirements:
+    def __init__(
+        self,
+        repository: CheckListRequirementRepositoryInterface,
+        diagnosis: Diagnosis,
+        requirements,
+        compliance_default: Compliance,
+    ):
+        self.repository = repository
+        self.diagnosis = diagnosis
+        self.requirements = requirements
+        self.compliance_default = compliance_default
+
+    def execute(self) -> List[Checklist_Requirement]:
+        """
+        Crea en bloque los Checklist_Requirement que falten en el diagnóstico.
+
+        Los requisitos que ya existen conservan su cumplimiento y observación.
+
+        :return: Lista de Checklist_Requirement creados.
+        """
+        existing_requirement_ids = self.repository.get_requirement_ids_by_diagnosis_id(
+            self.diagnosis.id
+        )
+        data_to_save = [
+            Checklist_Requirement(
+                diagnosis=self.diagnosis,
+                requirement=requirement,
+                compliance=self.compliance_default,
+            )
+            for requirement in self.requirements
+            if requirement.id not in existing_requirement_ids
+        ]
+        if data_to_save:
+            self.repository.massive_save(data_to_save)
+        return data_to_save
+
+
 class GetComplianceById:
     def __init__(self, repository: IComplianceRepository, id: int):
         self.repository = repository
@@ -207,6 +246,63 @@ class CheckListRequirementMassiveUpdate:
         return self.repository.massive_update(self.data_to_save)
 
 
+class ApplyChecklistDeltas:
+    def __init__(
+        self,
+        checklist_repository: CheckListRepositoryInterface,
+        checklist_requirement_repository: CheckListRequirementRepositoryInterface,
+        diagnosis_id: int,
+        questions: List[Dict],
+        requirements: List[Dict],
+    ):
+        self.checklist_repository = checklist_repository
+        self.checklist_requirement_repository = checklist_requirement_repository
+        self.diagnosis_id = diagnosis_id
+        self.questions = questions
+        self.requirements = requirements
+
+    def execute(self) -> Dict:
+        """
+        Aplica solo las respuestas cambiadas del checklist de un diagnóstico.
+
+        :return: Diccionario con los cambios aplicados, los conflictos por
+            version desactualizada y los ids rechazados por no pertenecer al
+            diagnóstico, separados en questions y requirements.
+        """
+        with transaction.atomic():
+            applied_questions, question_conflicts, rejected_questions = [], [], []
+            applied_requirements, requirement_conflicts = [], []
+            rejected_requirements = []
+            if self.questions:
+                applied_questions, question_conflicts, rejected_questions = (
+                    self.checklist_repository.apply_deltas(
+                        self.diagnosis_id, self.questions
+                    )
+                )
+            if self.requirements:
+                (
+                    applied_requirements,
+                    requirement_conflicts,
+                    rejected_requirements,
+                ) = self.checklist_requirement_repository.apply_deltas(
+                    self.diagnosis_id, self.requirements
+                )
+        return {
+            "applied": {
+                "questions": applied_questions,
+                "requirements": applied_requirements,
+            },
+            "conflicts": {
+                "questions": question_conflicts,
+                "requirements": requirement_conflicts,
+            },
+            "rejected": {
+                "questions": rejected_questions,
+                "requirements": rejected_requirements,
+            },
+        }
+
+
 class UpdateDiagnosis:
     def __init__(
         self, repository: DiagnosisRepositoryInterface, data_to_save: Diagnosis
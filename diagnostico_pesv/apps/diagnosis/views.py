@@ -14,7 +14,7 @@ from rest_framework.decorators import (
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from apps.sign.authentication import ClaimsJWTAuthentication
 from apps.diagnosis_requirement.core.models import (
     Diagnosis_Requirement,
     WorkPlan_Recomendation,
@@ -27,12 +27,11 @@ from .models import (
     CheckList,
     Diagnosis,
     Checklist_Requirement,
-    Notification,
 )
 from .serializers import (
     Diagnosis_QuestionsSerializer,
     DiagnosisSerializer,
-    NotificationSerializer,
+    NotificationReceiptSerializer,
 )
 from apps.diagnosis_counter.serializers import FleetSerializer, DriverSerializer
 from apps.company.models import Company, CompanySize
@@ -44,9 +43,16 @@ from io import BytesIO
 from django.conf import settings
 from .helper import *
 from collections import defaultdict
-from .services import DiagnosisService, GenerateReport
+from .services import (
+    DiagnosisQuestionsImport,
+    DiagnosisService,
+    GenerateReport,
+    NotificationService,
+)
+from .read_models import QuestionnaireReadModel
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import status, viewsets
+from rest_framework.exceptions import APIException
 from http import HTTPMethod
 from apps.company.service import CompanyService
 from .repositories import *
@@ -58,13 +64,17 @@ from apps.diagnosis_requirement.infraestructure.repositories import (
     DiagnosisRequirementRepository,
 )
 from django.db.models import Prefetch, OuterRef, Subquery, Q, Sum, Count
-from apps.sign.models import User, QueryLog
-from utils.constants import ComplianceIds
+from apps.sign.models import User
+from apps.sign.outbox import queue_email
+from apps.sign.services import log_query
+from utils.constants import ComplianceIds, DomainEvents
+from utils.events import publish
+from utils.catalog import get_catalog
+from utils.conditional import ConditionalGetMixin, conditional_get
+from utils.idempotency import idempotent
+from utils.pagination import KeysetPagination, paginate
 from collections import OrderedDict
 from apps.corporate_group.repositories import CorporateGroupRepository
-from django.core.mail import EmailMessage
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 
 
 def remove_invalid_requirements(diagnosis_id, valid_requirements):
@@ -101,11 +111,29 @@ def remove_invalid_requirements(diagnosis_id, valid_requirements):
         print(f"Ocurrió un error: {e}")
 
 
-class DiagnosisViewSet(viewsets.ModelViewSet):
+def questionnaire_sources(view, request):
+    """Origenes del validador del cuestionario agrupado de un diagnóstico."""
+    diagnosis_id = request.query_params.get("diagnosis", "")
+    group_by_step = request.query_params.get("group_by_step", "false").lower()
+    if group_by_step != "true" or not diagnosis_id.isdigit() or int(diagnosis_id) <= 0:
+        return None
+    return [
+        CheckList.objects.filter(diagnosis=diagnosis_id),
+        Checklist_Requirement.objects.filter(diagnosis=diagnosis_id),
+        *[
+            get_catalog(name).version()
+            for name in ("diagnosis_requirements", "diagnosis_questions", "compliance")
+        ],
+    ]
+
+
+class DiagnosisViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Diagnosis.objects.all()
     serializer_class = DiagnosisSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    conditional_fields = ("updated_at", "company__updated_at")
     diagnosis_service = DiagnosisService
     company_service = CompanyService
     diagnosis_repository = DiagnosisRepository()
@@ -240,6 +268,7 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False)
+    @conditional_get(questionnaire_sources)
     def findQuestionsByCompanySize(self, request: Request):
         try:
             company_id = request.query_params.get("company")
@@ -258,20 +287,6 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
 
             if diagnosis_id > 0:
                 diagnosis = get_use_case.get_by_id(diagnosis_id)
-
-                checklist_questions = CheckList.objects.filter(
-                    diagnosis_id=diagnosis.id
-                ).select_related("question", "compliance")
-                if not checklist_questions:
-                    questions_queryset = Diagnosis_Questions.objects.all()
-                else:
-                    question_ids = checklist_questions.values_list(
-                        "question_id", flat=True
-                    )
-                    questions_queryset = Diagnosis_Questions.objects.filter(
-                        id__in=question_ids
-                    )
-                # questions_queryset = CheckList.objects.filter(diagnosis_id=diagnosis_id)
             else:
                 try:
                     company = self.company_service.get_company(company_id)
@@ -283,30 +298,12 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 diagnosis = get_use_case.get_unfinalized_diagnosis_for_company(
                     company.id
                 )
-                questions_queryset = Diagnosis_Questions.objects.all()
-
-            use_case_get_check_list = GetCheckListRequirementByDiagnosisId(
-                self.checklist_requirement_repository, diagnosis.id
-            )
-            diagnosis_requirements = use_case_get_check_list.execute()
-
-            # Obtener preguntas de diagnóstico
-            requirements = Diagnosis_Requirement.objects.filter(
-                id__in=diagnosis_requirements.values_list("requirement", flat=True)
-            ).prefetch_related(Prefetch("requirements", queryset=questions_queryset))
 
             if group_by_step:
-                if diagnosis_id > 0:
-                    grouped_questions = DiagnosisService.group_questions_by_step(
-                        diagnosis_requirements,
-                        requirements,
-                        checklist_questions=checklist_questions,
-                        include_compliance=True,
-                    )
-                else:
-                    grouped_questions = DiagnosisService.group_questions_by_step(
-                        diagnosis_requirements, requirements
-                    )
+                # Se arma desde filas values(), sin serializadores (ver read_models)
+                grouped_questions = QuestionnaireReadModel.grouped_by_step(
+                    diagnosis.id, include_compliance=diagnosis_id > 0
+                )
 
                 return Response(grouped_questions, status=status.HTTP_200_OK)
 
@@ -400,7 +397,7 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=[HTTPMethod.POST])
-    def uploadDiagnosisQuestions(request: Request):
+    def uploadDiagnosisQuestions(self, request: Request):
         data = request.data.get("diagnosis_questions")
         if not data:
             return Response(
@@ -415,52 +412,14 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        processed_data = []
-
-        for paso in df["PASO PESV"].unique():
-            preguntas_por_paso = df[df["PASO PESV"] == paso]
-            num_preguntas_por_paso = preguntas_por_paso[
-                "CRITERIO DE VERIFICACIÓN"
-            ].nunique()
-            valor_pregunta = round(100 / num_preguntas_por_paso)
-
-            for i, pregunta in preguntas_por_paso.iterrows():
-                nombre_pregunta = pregunta["CRITERIO DE VERIFICACIÓN"]
-                requisito = Diagnosis_Requirement.objects.get(step=paso)
-                resultado = {
-                    "Requisito": requisito,
-                    "Nombre_Pregunta": nombre_pregunta,
-                    "Valor_Pregunta": valor_pregunta,
-                }
+        questions_import = DiagnosisQuestionsImport(df)
+        questions, errors = questions_import.validate()
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
 
-                question_data = {
-                    "requirement": resultado["Requisito"].id,
-                    "name": str(resultado["Nombre_Pregunta"]).strip(),
-                    "variable_value": resultado["Valor_Pregunta"],
-                }
-
-                try:
-                    existing_question = Diagnosis_Questions.objects.get(
-                        requirement=resultado["Requisito"],
-                        name__iexact=resultado["Nombre_Pregunta"],
-                    )
-                    serializer = Diagnosis_QuestionsSerializer(
-                        existing_question, data=question_data
-                    )
-                except Diagnosis_Questions.DoesNotExist:
-                    serializer = Diagnosis_QuestionsSerializer(data=question_data)
-
-                if serializer.is_valid():
-                    serializer.save()
-                    processed_data.append(serializer.data)
-                else:
-                    errors = {
-                        field: f"at row {i + 1}, column '{field.upper()}' - {error}"
-                        for field, error in serializer.errors.items()
-                    }
-                    return Response(errors, status=status.HTTP_400_BAD_REQUEST)
-
-        return Response(processed_data, status=status.HTTP_201_CREATED)
+        saved = questions_import.save(questions)
+        serializer = Diagnosis_QuestionsSerializer(saved, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=[HTTPMethod.POST])
     def save_count_for_company_in_corporate(self, request: Request):
@@ -566,14 +525,13 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                     {"error": "No se ha realizado el conteo de las empresas."},
                     status=status.HTTP_404_NOT_FOUND,
                 )
-            max_size_subquery = (
-                Diagnosis_Counter.objects.filter(diagnosis=OuterRef("diagnosis"))
-                .order_by("-size")
-                .values("size")[:1]
+            # Conteo de la empresa con el mayor tamaño del grupo
+            record_with_max_size = (
+                Diagnosis_Counter.objects.filter(diagnosis=diagnosis.id)
+                .select_related("company", "size")
+                .order_by("-size", "id")
+                .first()
             )
-            record_with_max_size = Diagnosis_Counter.objects.filter(
-                diagnosis=diagnosis.id, size=Subquery(max_size_subquery)
-            ).first()
 
             corporate_group.nit = record_with_max_size.company.nit
             diagnosis.type = record_with_max_size.size
@@ -588,27 +546,17 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             get_compliance = GetComplianceById(self.compliance_repository, 2)
             compliance_default = get_compliance.execute()
 
-            for requirement in requirements:
-                existing_checklist_requirement = (
-                    use_case.get_by_diagnosis_and_requirement(diagnosis, requirement)
-                )
-                compliance = (
-                    existing_checklist_requirement.compliance
-                    if existing_checklist_requirement
-                    else compliance_default
-                )
-                data = {
-                    "diagnosis": diagnosis,
-                    "compliance": compliance,
-                    "requirement": requirement,
-                }
-                create = CreateOrUpdateChecklistRequirement(
-                    self.checklist_requirement_repository, data
+            with transaction.atomic():
+                init_checklist_requirements = InitChecklistRequirements(
+                    self.checklist_requirement_repository,
+                    diagnosis,
+                    requirements,
+                    compliance_default,
                 )
-                create.execute()
+                init_checklist_requirements.execute()
 
-            corporate_group.save()
-            diagnosis.save()
+                corporate_group.save()
+                diagnosis.save()
             serializer = DiagnosisSerializer(diagnosis)
             return Response(serializer.data)
         except Exception as ex:
@@ -617,10 +565,9 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=[HTTPMethod.POST])
+    @idempotent()
     def saveAnswerCuestions(self, request: Request):
         user = request.user
-        ip_address = request.META.get("REMOTE_ADDR", "0.0.0.0")
-        user_agent = request.META.get("HTTP_USER_AGENT", "")
         consultor_id = request.data.get("consultor")
         external_count_complete = request.data.get("external_count_complete")
         company_id = request.data.get("company")
@@ -713,38 +660,12 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                             vehicle_errors, driver_errors
                         )
 
-                    channel_layer = get_channel_layer()
-                    notification = Notification.objects.create(
-                        user=None,
-                        message=f"Se ha Completado el conteo de la flota vehicular.",
-                        created_at=datetime.now(),
-                        diagnosis=diagnosis,
-                    )
-                    async_to_sync(channel_layer.group_send)(
-                        "diagnosis",  # Nombre del grupo al que enviar el mensaje
-                        {
-                            "type": "external_notification",  # Tipo de mensaje
-                            "notification_data": NotificationSerializer(
-                                notification
-                            ).data,
-                        },
-                    )
-                    async_to_sync(channel_layer.group_send)(
-                        "diagnosis",  # Nombre del grupo al que enviar el mensaje
-                        {
-                            "type": "external_count",  # Tipo de mensaje
-                            "diagnosis_data": DiagnosisSerializer(diagnosis).data,
-                        },
-                    )
-
-                    QueryLog.objects.create(
-                        user=request.user if request.user.is_authenticated else None,
-                        ip_address=ip_address,
-                        action="saveAnswerCuestions",
-                        http_method=request.method,
-                        query_params=dict(request.query_params),
-                        user_agent=user_agent,
+                    # Notificaciones, websockets y log se despachan al confirmar
+                    publish(
+                        DomainEvents.DIAGNOSIS_EXTERNAL_COUNT_COMPLETED.value,
+                        diagnosis_id=diagnosis.id,
                     )
+                    log_query(request, "saveAnswerCuestions")
                     return self.diagnosis_service.build_success_response(
                         vehicle_data, driver_data, diagnosis
                     )
@@ -754,14 +675,7 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                     {"error": "Company not found."}, status=status.HTTP_404_NOT_FOUND
                 )
             except Exception as ex:
-                QueryLog.objects.create(
-                    user=request.user if request.user.is_authenticated else None,
-                    ip_address=ip_address,
-                    action=f"saveAnswerCuestions -error:  {str(ex)}",
-                    http_method=request.method,
-                    query_params=dict(request.query_params),
-                    user_agent=user_agent,
-                )
+                log_query(request, f"saveAnswerCuestions -error:  {str(ex)}")
                 tb_str = traceback.format_exc()
                 return Response(
                     {"error": str(ex), "traceback": tb_str},
@@ -770,6 +684,7 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
         return Response(diagnosis_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=[HTTPMethod.POST])
+    @idempotent()
     def saveDiagnosis(self, request: Request):
         try:
             diagnosis_data = request.data.get("diagnosis_data")
@@ -938,6 +853,12 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                     )
                     massive_create.execute()
 
+                publish(
+                    DomainEvents.DIAGNOSIS_SCORE_CHANGED.value,
+                    diagnosis_id=diagnosis.id,
+                    question_ids=[item["question"] for item in diagnosisDto],
+                )
+
                 if not diagnosis.diagnosis_step == 2:
                     diagnosis.diagnosis_step = 2
                 if consultor.id != diagnosis.consultor.id:
@@ -958,7 +879,81 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(detail=False, methods=[HTTPMethod.PATCH])
+    def autosave_diagnosis(self, request: Request):
+        """
+        Guarda solo las respuestas modificadas del checklist del diagnóstico.
+
+        Cada cambio envia el id de la fila y la version con la que se leyo, los
+        cambios con version desactualizada no se aplican y se retornan en
+        "conflicts" con los datos actuales; los ids que no son del diagnóstico
+        se retornan en "rejected" (en ambos casos HTTP 409). Solo Admin,
+        SuperAdmin o el consultor del diagnóstico pueden guardar (HTTP 403).
+        """
+        diagnosis_id = request.query_params.get("diagnosis", "")
+        if not diagnosis_id.isdigit():
+            return Response(
+                {"error": "El id del diagnostico es obligatiorio"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not self.diagnosis_service.can_edit(request.user, int(diagnosis_id)):
+            return Response(
+                {"error": "No tienes permiso para modificar este diagnóstico"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        if not isinstance(request.data, dict):
+            return Response(
+                {"error": "Se espera un objeto con 'questions' y 'requirements'"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            questions, requirements = self.diagnosis_service.prepare_checklist_deltas(
+                request.data.get("questions", []),
+                request.data.get("requirements", []),
+            )
+        except ValueError as ex:
+            return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            apply_deltas = ApplyChecklistDeltas(
+                self.checklist_repository,
+                self.checklist_requirement_repository,
+                int(diagnosis_id),
+                questions,
+                requirements,
+            )
+            result = apply_deltas.execute()
+            applied = result["applied"]
+            if applied["questions"] or applied["requirements"]:
+                # Se envian los cambios aceptados a los demas usuarios del diagnostico
+                publish(
+                    DomainEvents.CHECKLIST_DELTAS_APPLIED.value,
+                    diagnosis_id=int(diagnosis_id),
+                    questions=applied["questions"],
+                    requirements=applied["requirements"],
+                )
+            scored = [
+                delta["id"]
+                for delta in applied["questions"]
+                if any(name in delta for name in DiagnosisService.SCORE_FIELDS)
+            ]
+            if scored:
+                publish(
+                    DomainEvents.DIAGNOSIS_SCORE_CHANGED.value,
+                    diagnosis_id=int(diagnosis_id),
+                    checklist_ids=scored,
+                )
+            not_applied = [*result["conflicts"].values(), *result["rejected"].values()]
+            if any(not_applied):
+                return Response(result, status=status.HTTP_409_CONFLICT)
+            return Response(result, status=status.HTTP_200_OK)
+        except Exception as ex:
+            return Response(
+                {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
     @action(detail=False, methods=[HTTPMethod.POST])
+    @idempotent()
     def generateReport(self, request: Request):
         try:
             company_id = request.query_params.get("company")
@@ -1294,9 +1289,25 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         diagnosis_id = self.request.data.get("diagnosis")
         if diagnosis_id is not None:
-            return Diagnosis.objects.filter(pk=diagnosis_id)
-        return Diagnosis.objects.all()
+            queryset = Diagnosis.objects.filter(pk=diagnosis_id)
+        else:
+            queryset = Diagnosis.objects.all()
+        if self.request.method == HTTPMethod.GET:
+            queryset = DiagnosisSerializer.setup_eager_loading(queryset, self.request)
+        return queryset
+
+    def get_conditional_sources(self, request):
+        # Con pk <= 0 se busca por grupo empresarial y con un pk no numerico
+        # retrieve responde 404, en ambos casos no se valida
+        if self.action == "retrieve":
+            try:
+                if int(self.kwargs.get("pk", 0)) <= 0:
+                    return None
+            except ValueError:
+                return None
+        return super().get_conditional_sources(request)
 
+    @conditional_get()
     def retrieve(self, request: Request, pk=None, *args, **kwargs):
         """
         Obtiene un diagnositco específica por su ID.
@@ -1325,8 +1336,8 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(instance)
             return Response(serializer.data)
 
-        except Diagnosis.DoesNotExist:
-            # Manejar el caso en que la empresa no se encuentra
+        except (Diagnosis.DoesNotExist, ValueError):
+            # Manejar el caso en que la empresa no se encuentra o el id no es numerico
             return Response(
                 {"error": "El diagnostico no existe."}, status=status.HTTP_404_NOT_FOUND
             )
@@ -1385,17 +1396,17 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
         )
         encoded_file, file_content = generate_report.generate_report("pdf")
 
-        email = EmailMessage(
-            subject=variable_for_email["subject"],
-            body=variable_for_email["body"],
-            from_email="soporte@consultoriaycapacitacionhseq.com",
-            to=[email_to],
-        )
-        email.attach("Diagnostico_PESV.pdf", file_content, "application/pdf")
         try:
-            email.send()
+            # Se envia en segundo plano (ver apps.sign.outbox)
+            queue_email(
+                variable_for_email["subject"],
+                variable_for_email["body"],
+                [email_to],
+                from_email="soporte@consultoriaycapacitacionhseq.com",
+                attachments=[("Diagnostico_PESV.pdf", file_content, "application/pdf")],
+            )
             return Response(
-                {"message": "Correo enviado con éxito"}, status=status.HTTP_200_OK
+                {"message": "Correo en cola de envío"}, status=status.HTTP_202_ACCEPTED
             )
         except Exception as e:
             return Response(
@@ -1405,37 +1416,49 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
 
     @action(detail=False)
     def find_notifications_by_user(self, request: Request):
-        user_id = request.query_params.get("user")
-        user = None
+        """
+        Notificaciones del usuario autenticado, de la más reciente a la más
+        antigua. Con ?unread=true solo las no leídas; se pagina con ?page_size=
+        y ?cursor=.
+        """
         try:
-            user = User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return Response(
-                {"error": "Usuario no existe o esta inactivo"},
-                status=status.HTTP_400_BAD_REQUEST,
+            unread_only = request.query_params.get("unread") in ("true", "1")
+            receipts = NotificationService.feed(request.user, unread_only).order_by(
+                "-created_at", "-id"
             )
-
-        try:
-            notifications = Notification.objects.filter(
-                Q(user=user) | Q(user__isnull=True)
-            ).order_by("-created_at")
-            serializer = NotificationSerializer(notifications, many=True)
-            return Response(serializer.data)
+            return paginate(request, receipts, NotificationReceiptSerializer)
+        except APIException:
+            # Cursor invalido u otros errores de DRF con su propio codigo
+            raise
         except Exception as ex:
             return Response(
                 {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False)
+    def unread_notifications(self, request: Request):
+        return Response({"unread": NotificationService.unread_count(request.user)})
+
     @action(detail=False, methods=[HTTPMethod.PATCH])
     def read_notifications(self, request: Request):
-        try:
-            notifications_ids = request.data.get("notifications", [])
-            notifications = Notification.objects.filter(id__in=notifications_ids)
-            for notify in notifications:
-                notify.read = True
+        """
+        Marca como leídas las notificaciones del usuario autenticado.
 
-            Notification.objects.bulk_update(notifications, ["read"])
-            return Response({"message": True})
+        Body: {"notifications": [ids]} o {"all": true} para marcar todas.
+        """
+        try:
+            if request.data.get("all"):
+                notifications_ids = None
+            else:
+                notifications_ids = request.data.get("notifications", [])
+            updated = NotificationService.mark_read(request.user, notifications_ids)
+            return Response(
+                {
+                    "message": True,
+                    "updated": updated,
+                    "unread": NotificationService.unread_count(request.user),
+                }
+            )
         except Exception as ex:
             return Response(
                 {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -1443,7 +1466,7 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
 
 
 @api_view(["POST"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def uploadsRecomendations(request: Request):
     data = request.data.get("diagnosis_recomendations")
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SignConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.sign'
+
+    def ready(self):
+        # services registra las plantillas de correo de la bandeja de salida
+        from . import catalogs, events, services, signals  # noqa: F401
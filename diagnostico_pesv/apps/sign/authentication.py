@@ -0,0 +1,134 @@
+"""
+    Autenticacion JWT con los grupos del usuario en los claims del token.
+
+    ``get_tokens_for_user`` guarda los nombres de los grupos en el claim
+    ``groups``. Los permisos (IsAdmin, IsSuperAdmin...) se resuelven con
+    ``get_group_names``, que toma los grupos del claim o de la base de datos una
+    sola vez por peticion.
+
+    Si cambian los grupos de un usuario se guarda la fecha en la cache
+    (``auth:roles_changed:<id>``) y los tokens emitidos antes dejan de usar el
+    claim, asi quitar un rol aplica de inmediato.
+
+    ``CachedUserJWTAuthentication`` es para endpoints de solo lectura: no
+    consulta la tabla de usuarios en cada peticion, usa una copia del usuario
+    guardada en la cache que se invalida al modificarlo (ver signals).
+"""
+
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+GROUPS_CLAIM = "groups"
+USER_CACHE_KEY = "auth:user:{}"
+ROLES_CHANGED_KEY = "auth:roles_changed:{}"
+
+# Campos del usuario que se guardan en la cache
+CACHED_USER_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+)
+
+
+def mark_roles_changed(user_id):
+    cache.set(ROLES_CHANGED_KEY.format(user_id), time.time(), None)
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(USER_CACHE_KEY.format(user_id))
+
+
+def groups_from_claims(validated_token, user_id):
+    """Grupos del claim, o None si el token es anterior al ultimo cambio de roles."""
+    names = validated_token.get(GROUPS_CLAIM)
+    if names is None:
+        return None
+    changed_at = cache.get(ROLES_CHANGED_KEY.format(user_id))
+    if changed_at is not None and validated_token.get("iat", 0) <= changed_at:
+        return None
+    return frozenset(names)
+
+
+def get_group_names(user) -> frozenset:
+    """
+    Nombres de los grupos del usuario, se consultan una sola vez por peticion.
+
+    :param user: Usuario de la peticion (User o CachedUser).
+    """
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    names = getattr(user, "_group_names", None)
+    if names is None:
+        names = frozenset(user.groups.values_list("name", flat=True))
+        user._group_names = names
+    return names
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication que toma los grupos del usuario del token."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        names = groups_from_claims(validated_token, user.pk)
+        if names is not None:
+            user._group_names = names
+        return user
+
+
+def _cached_field(name: str):
+    return property(lambda self: self._data[name])
+
+
+class CachedUser(TokenUser):
+    """Usuario de solo lectura armado con la copia en cache, sin consultas."""
+
+    id = pk = _cached_field("id")
+    username = _cached_field("username")
+    email = _cached_field("email")
+    first_name = _cached_field("first_name")
+    last_name = _cached_field("last_name")
+    is_active = _cached_field("is_active")
+    is_staff = _cached_field("is_staff")
+    is_superuser = _cached_field("is_superuser")
+
+    def __init__(self, token, data: dict):
+        super().__init__(token)
+        self._data = data
+        self._group_names = frozenset(data["groups"])
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        key = USER_CACHE_KEY.format(user_id)
+        data = cache.get(key)
+        if data is None:
+            data = (
+                User.objects.filter(pk=user_id).values(*CACHED_USER_FIELDS).first()
+            )
+            if data is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            data["groups"] = list(
+                User.groups.through.objects.filter(user_id=user_id).values_list(
+                    "group__name", flat=True
+                )
+            )
+            cache.set(key, data, settings.AUTH_USER_CACHE_TTL)
+        if not data["is_active"]:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return CachedUser(validated_token, data)
@@ -0,0 +1,11 @@
+from django.contrib.auth.models import Group
+from utils.catalog import register_catalog
+from .menu_index import MenuIndex
+from .models import Menu
+from .serializers import MenuSerializer
+
+
+@register_catalog("menus", models=[Menu, Group, Menu.groups.through])
+def load_menus():
+    menus = Menu.objects.prefetch_related("groups")
+    return MenuIndex(MenuSerializer(menus, many=True).data)
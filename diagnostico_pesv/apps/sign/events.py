@@ -0,0 +1,21 @@
+from django.utils import timezone
+from utils.constants import DomainEvents
+from utils.events import subscribe
+from .models import QueryLog
+from .query_log_buffer import query_log_buffer
+
+
+@subscribe(DomainEvents.QUERY_LOGGED.value)
+def save_query_log(user_id, ip_address, action, http_method, query_params, user_agent):
+    # Se encola, el hilo de query_log_buffer lo guarda por lotes
+    query_log_buffer.add(
+        QueryLog(
+            user_id=user_id,
+            ip_address=ip_address,
+            action=action,
+            http_method=http_method,
+            query_params=query_params,
+            user_agent=user_agent,
+            created_at=timezone.now(),
+        )
+    )
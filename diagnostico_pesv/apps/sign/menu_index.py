@@ -0,0 +1,44 @@
+import json
+from collections import defaultdict
+
+
+class MenuIndex:
+    """
+    Menus serializados por grupo para findMenusByGroups.
+
+    La respuesta de cada conjunto de grupos se arma una vez (con los fragmentos
+    JSON ya serializados) y se guarda, las siguientes son una busqueda en dict.
+    El indice es inmutable salvo por esa memoria de respuestas.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: row["id"])
+        self._fragments = tuple(json.dumps(row, ensure_ascii=False) for row in rows)
+        positions_by_group = defaultdict(list)
+        for position, row in enumerate(rows):
+            for group_id in row["groups"]:
+                positions_by_group[group_id].append(position)
+        self._positions_by_group = {
+            group_id: tuple(positions)
+            for group_id, positions in positions_by_group.items()
+        }
+        self._rendered = {}
+
+    def render(self, group_ids) -> bytes:
+        """Arreglo JSON de los menus de cualquiera de los grupos, sin repetir."""
+        # Solo grupos con menus, asi los ids que envia el cliente no agregan
+        # entradas nuevas: la memoria queda acotada por los grupos existentes
+        key = frozenset(group_ids).intersection(self._positions_by_group)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            positions = sorted(
+                {
+                    position
+                    for group_id in key
+                    for position in self._positions_by_group.get(group_id, ())
+                }
+            )
+            fragments = ",".join(self._fragments[position] for position in positions)
+            rendered = f"[{fragments}]".encode("utf-8")
+            self._rendered[key] = rendered
+        return rendered
@@ -0,0 +1,33 @@
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+
+@database_sync_to_async
+def get_user_from_token(raw_token: str):
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Autentica los websockets con el token de acceso JWT.
+
+    Los navegadores no permiten cabeceras en websockets, el token se envia en
+    la url: ``ws/diagnosis/?token=<access>``. Si no hay token o no es valido se
+    deja el usuario que puso AuthMiddlewareStack (sesión o anonimo).
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        token = query.get("token", [None])[0]
+        if token:
+            user = await get_user_from_token(token)
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
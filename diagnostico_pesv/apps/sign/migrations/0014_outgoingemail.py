@@ -0,0 +1,44 @@
+# Generated by Django 5.1 on 2026-10-19 12:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sign', '0013_user_user_joined_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created_at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated_at')),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('from_email', models.CharField(max_length=255)),
+                ('to', models.JSONField()),
+                ('status', models.CharField(default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=None, null=True)),
+                ('last_error', models.TextField(default=None, null=True)),
+                ('sent_at', models.DateTimeField(default=None, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='email_status_next_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OutgoingEmailAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('content', models.BinaryField()),
+                ('mimetype', models.CharField(max_length=100)),
+                ('email', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='sign.outgoingemail')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-19 12:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sign', '0014_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='template',
+            field=models.CharField(default=None, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='user',
+            field=models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='outgoingemail',
+            name='body',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-19 12:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sign', '0015_outgoingemail_template'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='querylog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from timestamps.models import SoftDeletes, Timestampable
 from django.contrib.auth.models import Group
+from django.utils import timezone
+from utils.constants import EmailStatus
 
 
 # Create your models here.
@@ -14,6 +16,11 @@ class User(AbstractUser):
     change_password = models.BooleanField(default=False, null=False, blank=False)
     external_step = models.IntegerField(default=0)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["date_joined", "id"], name="user_joined_id_idx")
+        ]
+
 
 class QueryLog(SoftDeletes, Timestampable):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
@@ -22,6 +29,9 @@ class QueryLog(SoftDeletes, Timestampable):
     query_params = models.JSONField(null=True, default=None)
     http_method = models.CharField(max_length=10, null=True, default=None)
     user_agent = models.CharField(max_length=255, blank=True, null=True)
+    # Sin auto_now_add: los registros se guardan por lotes y deben conservar
+    # la hora de la peticion, no la del guardado
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return f"QueryLog by {self.user}"
@@ -32,3 +42,43 @@ class Menu(SoftDeletes, Timestampable):
     icon = models.CharField(max_length=250)
     path = models.CharField(max_length=250)
     groups = models.ManyToManyField(Group, related_name="menus")
+
+
+class OutgoingEmail(Timestampable):
+    """
+    Correo en la bandeja de salida (outbox), lo envia la tarea send_outbox.
+
+    Se guarda en la misma transaccion que el cambio que lo origina, asi solo se
+    envia si esa transaccion confirma y no se pierde si el broker no responde.
+    Los adjuntos se eliminan al enviar o descartar el correo y las filas se
+    borran despues de EMAIL_OUTBOX_RETENTION_DAYS (tarea purge_outbox).
+    """
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    # Con plantilla el cuerpo se arma al enviar y no se guarda (datos sensibles)
+    template = models.CharField(max_length=50, null=True, default=None)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, default=None)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField()
+    status = models.CharField(max_length=10, default=EmailStatus.PENDING.value)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, default=None)
+    last_error = models.TextField(null=True, default=None)
+    sent_at = models.DateTimeField(null=True, default=None)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="email_status_next_idx"
+            )
+        ]
+
+
+class OutgoingEmailAttachment(models.Model):
+    email = models.ForeignKey(
+        OutgoingEmail, on_delete=models.CASCADE, related_name="attachments"
+    )
+    filename = models.CharField(max_length=255)
+    content = models.BinaryField()
+    mimetype = models.CharField(max_length=100)
@@ -0,0 +1,217 @@
+"""
+    Bandeja de salida (outbox) de correos.
+
+    ``queue_email`` guarda el correo en OutgoingEmail dentro de la transaccion
+    de la peticion y, al confirmar, encola la tarea ``send_outbox``; la
+    peticion responde sin esperar al servidor SMTP. La tarea toma los correos
+    por lotes y los envia con una sola conexion SMTP abierta. Si un envio falla
+    se reintenta con espera exponencial hasta EMAIL_OUTBOX_MAX_ATTEMPTS veces;
+    celery beat revisa la bandeja cada EMAIL_OUTBOX_INTERVAL segundos por los
+    reintentos y por los correos que no se pudieron encolar.
+
+    Sin CELERY_BROKER_URL (desarrollo y pruebas) la bandeja se envia en el
+    mismo proceso al confirmar la transaccion.
+
+    Los correos con datos sensibles no guardan el cuerpo: se encolan con una
+    ``template`` registrada con ``register_email_template`` que lo arma al
+    enviar. Al enviar o descartar un correo se eliminan sus adjuntos y la tarea
+    ``purge_outbox`` borra las filas con mas de EMAIL_OUTBOX_RETENTION_DAYS.
+"""
+
+import logging
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from utils.constants import EmailStatus
+from .models import OutgoingEmail, OutgoingEmailAttachment
+
+logger = logging.getLogger(__name__)
+
+# Segundos que un lote tomado queda reservado para el worker que lo envia, si
+# el worker muere los correos vuelven a estar disponibles al vencer
+CLAIM_TIMEOUT = 10 * 60
+
+_templates = {}
+
+
+def register_email_template(name: str):
+    """
+    Registra la funcion decorada como constructora del cuerpo de ``name``.
+
+    La funcion recibe el OutgoingEmail (con ``user``) y retorna el cuerpo.
+    """
+
+    def decorator(builder):
+        _templates[name] = builder
+        return builder
+
+    return decorator
+
+
+def queue_email(
+    subject: str,
+    body: str,
+    to: list,
+    from_email: str = None,
+    attachments=(),
+    template: str = None,
+    user=None,
+) -> OutgoingEmail:
+    """
+    Guarda un correo en la bandeja de salida.
+
+    :param to: Lista de destinatarios.
+    :param from_email: Remitente, por defecto DEFAULT_FROM_EMAIL.
+    :param attachments: Tuplas (filename, content, mimetype).
+    :param template: Plantilla registrada que arma el cuerpo al enviar, en
+        ese caso ``body`` se ignora.
+    :param user: Usuario del que la plantilla toma sus datos.
+    """
+    email = OutgoingEmail.objects.create(
+        subject=subject,
+        body="" if template else body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        template=template,
+        user=user,
+    )
+    OutgoingEmailAttachment.objects.bulk_create(
+        OutgoingEmailAttachment(
+            email=email, filename=filename, content=content, mimetype=mimetype
+        )
+        for filename, content, mimetype in attachments
+    )
+    transaction.on_commit(enqueue_outbox)
+    return email
+
+
+def enqueue_outbox():
+    if not settings.CELERY_BROKER_URL:
+        send_outbox()
+        return
+    try:
+        send_outbox.delay()
+    except Exception as ex:
+        # El correo sigue en la bandeja, lo envia la siguiente revision de beat
+        logger.warning(f"No se pudo encolar send_outbox: {ex}")
+
+
+def claim_batch(limit: int) -> list:
+    """Toma hasta ``limit`` correos pendientes, saltando los de otros workers."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailStatus.PENDING.value)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by("id")
+            .values_list("id", flat=True)[:limit]
+        )
+        OutgoingEmail.objects.filter(id__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=CLAIM_TIMEOUT)
+        )
+    return list(
+        OutgoingEmail.objects.filter(id__in=ids)
+        .select_related("user")
+        .prefetch_related("attachments")
+        .order_by("id")
+    )
+
+
+def retry_delay(attempts: int) -> int:
+    """Segundos de espera antes del siguiente intento (exponencial con tope)."""
+    delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return min(delay, settings.EMAIL_OUTBOX_MAX_DELAY)
+
+
+def build_message(email: OutgoingEmail, connection) -> EmailMessage:
+    body = email.body
+    if email.template:
+        body = _templates[email.template](email)
+    message = EmailMessage(
+        subject=email.subject,
+        body=body,
+        from_email=email.from_email,
+        to=email.to,
+        connection=connection,
+    )
+    for attachment in email.attachments.all():
+        message.attach(
+            attachment.filename, bytes(attachment.content), attachment.mimetype
+        )
+    return message
+
+
+def _mark_failed(email: OutgoingEmail, error: Exception):
+    attempts = email.attempts + 1
+    if attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        logger.error(f"Correo {email.id} descartado tras {attempts} intentos: {error}")
+        status, next_attempt_at = EmailStatus.FAILED.value, None
+    else:
+        status = EmailStatus.PENDING.value
+        next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(attempts))
+    OutgoingEmail.objects.filter(id=email.id).update(
+        status=status,
+        attempts=attempts,
+        next_attempt_at=next_attempt_at,
+        last_error=str(error),
+    )
+    if status == EmailStatus.FAILED.value:
+        OutgoingEmailAttachment.objects.filter(email=email.id).delete()
+
+
+def send_batch(limit: int = None) -> int:
+    """
+    Envia un lote de la bandeja por una sola conexion SMTP.
+
+    Cada correo se marca apenas se envia, asi una caida del worker a mitad del
+    lote no repite los ya enviados.
+
+    :return: Cantidad de correos tomados del lote.
+    """
+    emails = claim_batch(limit or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0
+    connection = get_connection()
+    try:
+        for email in emails:
+            try:
+                # Si la conexion se cerro por un error anterior se vuelve a abrir
+                connection.open()
+                connection.send_messages([build_message(email, connection)])
+            except Exception as ex:
+                connection.close()
+                _mark_failed(email, ex)
+                continue
+            OutgoingEmail.objects.filter(id=email.id).update(
+                status=EmailStatus.SENT.value,
+                attempts=email.attempts + 1,
+                next_attempt_at=None,
+                sent_at=timezone.now(),
+            )
+            OutgoingEmailAttachment.objects.filter(email=email.id).delete()
+    finally:
+        connection.close()
+    return len(emails)
+
+
+@shared_task(name="sign.send_outbox", ignore_result=True)
+def send_outbox():
+    """Envia lotes hasta vaciar los correos pendientes disponibles."""
+    batch_size = settings.EMAIL_OUTBOX_BATCH_SIZE
+    while send_batch(batch_size) == batch_size:
+        pass
+
+
+@shared_task(name="sign.purge_outbox", ignore_result=True)
+def purge_outbox():
+    """Borra los correos enviados o descartados con mas de la retencion."""
+    limit = timezone.now() - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)
+    OutgoingEmail.objects.filter(
+        status__in=[EmailStatus.SENT.value, EmailStatus.FAILED.value],
+        created_at__lt=limit,
+    ).delete()
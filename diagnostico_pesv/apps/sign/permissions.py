@@ -2,6 +2,7 @@ from rest_framework.permissions import BasePermission
 from apps.sign.models import User
 from django.contrib.auth.models import Group
 from enum import Enum
+from .authentication import get_group_names
 
 
 class GroupTypes(Enum):
@@ -12,14 +13,14 @@ class GroupTypes(Enum):
 
 class IsSuperAdmin(BasePermission):
     def has_permission(self, user: User):
-        return user and user.groups.filter(name=GroupTypes.SUPER_ADMIN.value).exists()
+        return GroupTypes.SUPER_ADMIN.value in get_group_names(user)
 
 
 class IsAdmin(BasePermission):
     def has_permission(self, user: User):
-        return user and user.groups.filter(name=GroupTypes.ADMIN.value).exists()
+        return GroupTypes.ADMIN.value in get_group_names(user)
 
 
 class IsConsultor(BasePermission):
     def has_permission(self, user: User):
-        return user and user.groups.filter(name=GroupTypes.CONSULTOR.value).exists()
+        return GroupTypes.CONSULTOR.value in get_group_names(user)
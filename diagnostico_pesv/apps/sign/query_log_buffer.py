@@ -0,0 +1,137 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, connection
+from .models import QueryLog
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class QueryLogBuffer:
+    """
+    Cola en memoria (por proceso) de registros de QueryLog.
+
+    Un hilo en segundo plano guarda los registros con ``bulk_create`` cuando
+    junta ``batch_size`` o cada ``flush_interval`` segundos, lo que ocurra
+    primero. Si la cola llega a ``max_pending`` (la base de datos no da abasto)
+    quien encola guarda lo pendiente en su propio hilo antes de seguir, asi la
+    memoria queda acotada y no se pierden registros. Al terminar el proceso se
+    guardan los registros pendientes (``atexit``).
+
+    Con ``QUERY_LOG_BUFFERED = False`` cada registro se guarda de inmediato.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_pending=None):
+        self.batch_size = batch_size or getattr(settings, "QUERY_LOG_BATCH_SIZE", 200)
+        self.flush_interval = flush_interval or getattr(
+            settings, "QUERY_LOG_FLUSH_INTERVAL", 2.0
+        )
+        self._queue = queue.Queue(
+            maxsize=max_pending or getattr(settings, "QUERY_LOG_MAX_PENDING", 10000)
+        )
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def add(self, record: QueryLog):
+        if not getattr(settings, "QUERY_LOG_BUFFERED", True):
+            self._write([record])
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            logger.warning("Cola de QueryLog llena, guardando en la peticion")
+            self.flush()
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self._write([record])
+
+    def _ensure_worker(self):
+        # Tras un fork (gunicorn --preload) el hilo del proceso padre no existe
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="query-log-buffer", daemon=True
+                )
+                self._thread.start()
+
+    def _take(self, limit: int, timeout: float = 0) -> tuple:
+        """Saca hasta ``limit`` registros, esperando maximo ``timeout`` segundos."""
+        batch = []
+        stopping = False
+        deadline = time.monotonic() + timeout
+        while len(batch) < limit:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            batch.append(item)
+        return batch, stopping
+
+    def _write(self, batch: list):
+        if not batch:
+            return
+        try:
+            QueryLog.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception as ex:
+            logger.error(f"Error guardando {len(batch)} registros de QueryLog: {ex}")
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._take(self.batch_size, self.flush_interval)
+                if batch:
+                    # La conexion del hilo pudo vencer (wait_timeout de MySQL)
+                    close_old_connections()
+                    self._write(batch)
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Guarda en el hilo actual todos los registros pendientes."""
+        while True:
+            batch, stopping = self._take(self.batch_size)
+            self._write(batch)
+            if stopping:
+                # La señal de parada es para el hilo, se devuelve a la cola
+                self._queue.put_nowait(_STOP)
+                return
+            if not batch:
+                return
+
+    def stop(self, timeout: float = 10):
+        """Detiene el hilo guardando lo pendiente, se llama al terminar el proceso."""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            self.flush()
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            self.flush()
+            self._queue.put_nowait(_STOP)
+        thread.join(timeout)
+
+
+query_log_buffer = QueryLogBuffer()
+atexit.register(query_log_buffer.stop)
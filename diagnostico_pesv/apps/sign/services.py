@@ -1,61 +1,217 @@
 from celery import shared_task
-from django.core.mail import send_mail
 from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import EmailMessage
-import random
-import string
+import re
+from django.db import IntegrityError, transaction
+from django.db.models import IntegerField, Max
+from django.db.models.functions import Cast, Substr
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from .models import User
+from .outbox import queue_email, register_email_template
+from utils.constants import DomainEvents, EmailTemplates
+from utils.events import publish
 
+# Intentos para guardar un usuario si otro proceso toma el mismo username
+USERNAME_MAX_ATTEMPTS = 5
 
-def send_temporary_password_email(user, temp_password):
-    send_mail(
-        "Contraseña temporal",
-        f"Hola {user.first_name} {user.last_name}, tu contraseña temporal es: {temp_password}",
-        settings.DEFAULT_FROM_EMAIL,
+
+def send_set_password_email(user):
+    """
+    Deja en la bandeja de salida el correo con el enlace para asignar la
+    contraseña.
+
+    El enlace se arma al enviar (set_password_body), asi el token no queda
+    guardado en OutgoingEmail. Deja de servir cuando el usuario asigna su
+    contraseña.
+    """
+    queue_email(
+        "Asigna tu contraseña",
+        "",
         [user.email],
-        fail_silently=False,
+        template=EmailTemplates.SET_PASSWORD.value,
+        user=user,
+    )
+
+
+def set_password_link(user) -> str:
+    """
+    Enlace de un solo uso para que el usuario asigne su contraseña.
+
+    :param user: Usuario al que se le envia el enlace.
+    """
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    return f"{settings.SET_PASSWORD_URL}?uid={uid}&token={token}"
+
+
+@register_email_template(EmailTemplates.SET_PASSWORD.value)
+def set_password_body(email) -> str:
+    # Solo lee datos, los reintentos generan enlaces igualmente validos
+    user = email.user
+    return (
+        f"Hola {user.first_name} {user.last_name}, "
+        f"asigna tu contraseña en el siguiente enlace: {set_password_link(user)}"
+    )
+
+
+def user_from_set_password_token(uid: str, token: str):
+    """
+    Usuario del enlace de asignar contraseña, None si el enlace no es valido
+    o ya se uso.
+
+    :param uid: Id del usuario codificado en base64.
+    :param token: Token generado por set_password_link.
+    """
+    try:
+        user = User.objects.get(pk=urlsafe_base64_decode(uid).decode())
+    except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+        return None
+    if not default_token_generator.check_token(user, token):
+        return None
+    return user
+
+
+def log_query(request, action: str):
+    """
+    Registra la consulta en QueryLog despues de confirmar la transaccion actual.
+
+    :param request: Peticion de DRF de la que se toman usuario, ip y parametros.
+    :param action: Descripcion de la accion a registrar.
+    """
+    publish(
+        DomainEvents.QUERY_LOGGED.value,
+        user_id=request.user.id if request.user.is_authenticated else None,
+        ip_address=request.META.get("REMOTE_ADDR", "0.0.0.0"),
+        action=action,
+        http_method=request.method,
+        query_params=dict(request.query_params),
+        user_agent=request.META.get("HTTP_USER_AGENT", ""),
     )
 
 
-def get_existing_usernames() -> set:
+def base_username(first_name: str, last_name: str) -> str:
+    """
+    Nombre de usuario base: inicial del nombre seguida del apellido.
+
+    :param first_name: El primer nombre del usuario.
+    :param last_name: El apellido del usuario.
+    """
+    first_initial = first_name[0].lower() if first_name else ""
+    last_name_lower = last_name.lower() if last_name else ""
+    return f"{first_initial}{last_name_lower}"
+
+
+def max_username_suffix(base: str):
     """
-    Obtiene todos los nombres de usuario existentes en la base de datos.
+    Mayor sufijo numerico usado con ``base`` (``jperez``, ``jperez1``, ...).
 
-    :return: Un conjunto de nombres de usuario existentes.
+    La consulta se limita al prefijo (rango sobre el indice unico de username)
+    y solo cuenta los nombres que despues de la base tienen unicamente digitos.
+    El prefijo usa ``istartswith`` porque en MySQL ``startswith`` genera
+    ``LIKE BINARY``, que no usa el indice con collation ``_ci``; la expresion
+    regular mantiene la coincidencia exacta.
+
+    :param base: Nombre de usuario base.
+    :return: El sufijo mayor (0 si solo existe la base) o None si no existe.
     """
-    return set(User.objects.values_list("username", flat=True))
+    suffix = Cast(Substr("username", len(base) + 1), IntegerField())
+    return User.objects.filter(
+        username__istartswith=base, username__regex=rf"^{re.escape(base)}[0-9]*$"
+    ).aggregate(suffix=Max(suffix))["suffix"]
+
+
+def _with_suffix(base: str, suffix) -> str:
+    return base if suffix is None else f"{base}{suffix + 1}"
 
 
-def generate_username(
-    first_name: str,
-    last_name: str,
-    unique: bool = False,
-    existing_usernames: set = None,
-) -> str:
+def generate_username(first_name: str, last_name: str, unique: bool = False) -> str:
     """
     Genera un nombre de usuario basado en el nombre y apellido proporcionados.
 
     :param first_name: El primer nombre del usuario.
     :param last_name: El apellido del usuario.
-    :param unique: Si True, intentará generar un nombre de usuario único.
-    :param existing_usernames: Un conjunto de nombres de usuario existentes para verificar la unicidad.
+    :param unique: Si True, agrega el siguiente sufijo libre segun la base de
+        datos. Dos peticiones simultaneas pueden obtener el mismo, quien guarda
+        debe usar ``create_with_unique_username``.
     :return: Un nombre de usuario generado.
     """
-    if existing_usernames is None:
-        existing_usernames = set()
+    base = base_username(first_name, last_name)
+    if not unique:
+        return base
+    return _with_suffix(base, max_username_suffix(base))
 
-    # Crear una base para el nombre de usuario
-    first_initial = first_name[0].lower() if first_name else ""
-    last_name_lower = last_name.lower() if last_name else ""
-    base_username = f"{first_initial}{last_name_lower}"
-
-    # Si es necesario garantizar unicidad, añade un número
-    if unique:
-        username = base_username
-        suffix = 1
-        while username in existing_usernames:
-            username = f"{base_username}{suffix}"
-            suffix += 1
-        return username
-    else:
-        return base_username
+
+def generate_usernames(names: list) -> list:
+    """
+    Genera nombres de usuario unicos para varios usuarios a la vez.
+
+    Se hace una consulta por cada base distinta y los sufijos se asignan en
+    orden dentro del lote, asi dos usuarios del lote con el mismo nombre no
+    reciben el mismo nombre de usuario.
+
+    :param names: Lista de tuplas (first_name, last_name).
+    :return: Los nombres de usuario en el mismo orden.
+    """
+    suffixes = {}
+    usernames = []
+    for first_name, last_name in names:
+        base = base_username(first_name, last_name)
+        if base not in suffixes:
+            suffixes[base] = max_username_suffix(base)
+        usernames.append(_with_suffix(base, suffixes[base]))
+        suffixes[base] = 0 if suffixes[base] is None else suffixes[base] + 1
+    return usernames
+
+
+def _username_taken(usernames) -> bool:
+    return User.objects.filter(username__in=list(usernames)).exists()
+
+
+def create_with_unique_username(create, first_name: str, last_name: str):
+    """
+    Crea un usuario con el siguiente nombre de usuario libre.
+
+    Si otro proceso guardo el mismo nombre entre la consulta y el INSERT se
+    reintenta con un sufijo nuevo, hasta USERNAME_MAX_ATTEMPTS veces. Los
+    IntegrityError por otras columnas (cedula, email) se propagan.
+
+    :param create: Funcion que recibe el nombre de usuario y guarda el usuario.
+    :return: Lo que retorne ``create``.
+    """
+    for attempt in range(USERNAME_MAX_ATTEMPTS):
+        username = generate_username(first_name, last_name, unique=True)
+        try:
+            with transaction.atomic():
+                return create(username)
+        except IntegrityError:
+            if attempt + 1 == USERNAME_MAX_ATTEMPTS or not _username_taken([username]):
+                raise
+
+
+def bulk_create_users(users: list) -> list:
+    """
+    Guarda varios usuarios con ``bulk_create`` generando los nombres de usuario
+    de los que no lo traen.
+
+    Las contraseñas deben venir ya asignadas con ``set_password``. Si el lote
+    choca con nombres guardados por otro proceso se vuelven a generar los
+    nombres y se reintenta, igual que ``create_with_unique_username``.
+
+    :param users: Instancias de User sin guardar.
+    :return: Los usuarios guardados.
+    """
+    pending = [user for user in users if not user.username]
+    for attempt in range(USERNAME_MAX_ATTEMPTS):
+        usernames = generate_usernames(
+            [(user.first_name, user.last_name) for user in pending]
+        )
+        for user, username in zip(pending, usernames):
+            user.username = username
+        try:
+            with transaction.atomic():
+                return User.objects.bulk_create(users)
+        except IntegrityError:
+            if attempt + 1 == USERNAME_MAX_ATTEMPTS or not _username_taken(usernames):
+                raise
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .authentication import invalidate_cached_user, mark_roles_changed
+from .models import User
+
+
+def roles_changed(user_ids):
+    user_ids = list(user_ids)
+
+    def invalidate():
+        for user_id in user_ids:
+            mark_roles_changed(user_id)
+            invalidate_cached_user(user_id)
+
+    # Tambien al confirmar: antes del commit una peticion concurrente pudo
+    # volver a guardar en cache los grupos anteriores
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set=None, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            roles_changed([instance.pk])
+    # Desde Group.user_set la instancia es el grupo y pk_set son usuarios
+    elif action in ("post_add", "post_remove"):
+        roles_changed(pk_set)
+    elif action == "pre_clear":
+        roles_changed(list(instance.user_set.values_list("id", flat=True)))
+
+
+@receiver([post_save, pre_delete], sender=Group)
+def group_changed(sender, instance, created=False, **kwargs):
+    # Al renombrar o eliminar un grupo cambian los roles de sus usuarios
+    if not created:
+        roles_changed(list(instance.user_set.values_list("id", flat=True)))
@@ -0,0 +1,2 @@
+# Tareas de celery de la app, autodiscover_tasks busca este modulo
+from .outbox import purge_outbox, send_outbox  # noqa: F401
@@ -1,3 +1,340 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from .models import QueryLog
+from .query_log_buffer import QueryLogBuffer
+
 
 # Create your tests here.
+@override_settings(QUERY_LOG_BUFFERED=True)
+class QueryLogBufferTests(TestCase):
+    def record(self, number):
+        return QueryLog(ip_address="127.0.0.1", action=f"accion {number}")
+
+    def test_records_are_written_in_batches(self):
+        # Sin hilo: se prueba el guardado por lotes con flush()
+        buffer = QueryLogBuffer(batch_size=10, max_pending=100)
+        buffer._ensure_worker = lambda: None
+        for number in range(25):
+            buffer.add(self.record(number))
+        self.assertEqual(QueryLog.objects.count(), 0)
+
+        with self.assertNumQueries(3):
+            buffer.flush()
+        self.assertEqual(QueryLog.objects.count(), 25)
+
+    def test_created_at_is_the_enqueue_time(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        buffer = QueryLogBuffer(batch_size=10, max_pending=100)
+        buffer._ensure_worker = lambda: None
+        enqueued_at = timezone.now() - timedelta(seconds=30)
+        record = self.record(0)
+        record.created_at = enqueued_at
+        buffer.add(record)
+        buffer.flush()
+        self.assertEqual(QueryLog.objects.get().created_at, enqueued_at)
+
+    def test_full_queue_is_flushed_by_caller(self):
+        buffer = QueryLogBuffer(batch_size=10, max_pending=5)
+        buffer._ensure_worker = lambda: None
+        for number in range(7):
+            buffer.add(self.record(number))
+        # Los 5 primeros se guardaron al llenarse la cola, quedan 2 pendientes
+        self.assertEqual(QueryLog.objects.count(), 5)
+        buffer.stop()
+        self.assertEqual(QueryLog.objects.count(), 7)
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import Group
+        from django.core.cache import cache
+        from apps.sign.models import User
+
+        cache.clear()
+        self.admin_group = Group.objects.create(name="Admin")
+        self.user = User.objects.create_user(
+            username="claims", password="clave", cedula="claims"
+        )
+        self.user.groups.add(self.admin_group)
+        # El cambio de roles de la creacion queda antes de emitir los tokens
+        cache.clear()
+
+    def authenticate(self, authentication_class, token):
+        from rest_framework.test import APIRequestFactory
+
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return authentication_class().authenticate(request)[0]
+
+    def test_permissions_are_resolved_from_claims(self):
+        from apps.sign.authentication import ClaimsJWTAuthentication
+        from apps.sign.permissions import IsAdmin, IsSuperAdmin
+        from utils.tokenManagement import get_tokens_for_user
+
+        token = get_tokens_for_user(self.user)["access"]
+        user = self.authenticate(ClaimsJWTAuthentication, token)
+        with self.assertNumQueries(0):
+            self.assertTrue(IsAdmin().has_permission(user))
+            self.assertFalse(IsSuperAdmin().has_permission(user))
+
+        # Al quitar el rol los tokens anteriores dejan de usar el claim
+        self.user.groups.remove(self.admin_group)
+        user = self.authenticate(ClaimsJWTAuthentication, token)
+        self.assertFalse(IsAdmin().has_permission(user))
+
+    def test_cached_user_skips_the_user_table(self):
+        from rest_framework_simplejwt.exceptions import AuthenticationFailed
+        from apps.sign.authentication import CachedUserJWTAuthentication
+        from apps.sign.permissions import IsAdmin
+        from utils.tokenManagement import get_tokens_for_user
+
+        token = get_tokens_for_user(self.user)["access"]
+        self.authenticate(CachedUserJWTAuthentication, token)
+        with self.assertNumQueries(0):
+            user = self.authenticate(CachedUserJWTAuthentication, token)
+            self.assertEqual((user.pk, user.username), (self.user.pk, "claims"))
+            self.assertTrue(IsAdmin().has_permission(user))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(CachedUserJWTAuthentication, token)
+
+    def test_roles_change_is_invalidated_again_on_commit(self):
+        from django.core.cache import cache
+        from apps.sign.authentication import USER_CACHE_KEY
+
+        key = USER_CACHE_KEY.format(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.admin_group)
+            # Una peticion concurrente guarda los grupos anteriores
+            cache.set(key, {"groups": ["Admin"]})
+        self.assertIsNone(cache.get(key))
+
+
+class MenuCatalogTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import Group
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+        from apps.sign.models import Menu, User
+
+        cache.clear()
+        self.admin_group = Group.objects.create(name="Admin")
+        self.consultor_group = Group.objects.create(name="Consultor")
+        self.users_menu = Menu.objects.create(label="Usuarios", icon="u", path="/u")
+        self.users_menu.groups.add(self.admin_group)
+        self.reports_menu = Menu.objects.create(label="Informes", icon="i", path="/i")
+        self.reports_menu.groups.add(self.admin_group, self.consultor_group)
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(username="menus", password="clave", cedula="menus")
+        )
+
+    def find_menus(self, groups):
+        return self.client.get("/api/v1/sign/menus/group", {"groups": groups})
+
+    def test_menus_are_served_from_the_index(self):
+        response = self.find_menus(f"{self.admin_group.id},{self.consultor_group.id}")
+        self.assertEqual(
+            [menu["label"] for menu in response.json()], ["Usuarios", "Informes"]
+        )
+        with self.assertNumQueries(0):
+            response = self.find_menus(f"{self.consultor_group.id}")
+        self.assertEqual([menu["label"] for menu in response.json()], ["Informes"])
+
+    def test_unknown_groups_do_not_grow_the_index(self):
+        from utils.catalog import get_catalog
+
+        index = get_catalog("menus").get()
+        for group_id in range(1000, 1100):
+            self.assertEqual(index.render([group_id, group_id + 5000]), b"[]")
+        index.render([self.consultor_group.id, 999])
+        self.assertEqual(len(index._rendered), 2)
+
+    def test_menu_groups_change_invalidates_the_index(self):
+        self.find_menus(f"{self.consultor_group.id}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users_menu.groups.add(self.consultor_group)
+        response = self.find_menus(f"{self.consultor_group.id}")
+        self.assertEqual(
+            [menu["label"] for menu in response.json()], ["Usuarios", "Informes"]
+        )
+
+
+class UsernameGenerationTests(TestCase):
+    def create_user(self, username, cedula):
+        from apps.sign.models import User
+
+        return User.objects.create_user(username=username, cedula=cedula)
+
+    def test_next_suffix_is_read_from_the_prefix(self):
+        from apps.sign.services import generate_username
+
+        self.assertEqual(generate_username("Juan", "Perez", unique=True), "jperez")
+        self.create_user("jperez", "1")
+        self.create_user("jperez7", "2")
+        # No son la base seguida de digitos
+        self.create_user("jperezgomez", "3")
+        self.create_user("jperez9x", "4")
+        with self.assertNumQueries(1):
+            self.assertEqual(generate_username("Juan", "Perez", unique=True), "jperez8")
+
+    def test_taken_username_is_retried(self):
+        from unittest import mock
+        from django.db import IntegrityError
+        from apps.sign.services import create_with_unique_username
+
+        self.create_user("adiaz", "1")
+        attempts = []
+
+        def create(username):
+            attempts.append(username)
+            return self.create_user(username, "2")
+
+        # La primera lectura no ve el usuario que otro proceso acaba de guardar
+        with mock.patch(
+            "apps.sign.services.max_username_suffix", side_effect=[None, 0]
+        ):
+            user = create_with_unique_username(create, "Ana", "Diaz")
+        self.assertEqual(attempts, ["adiaz", "adiaz1"])
+        self.assertEqual(user.username, "adiaz1")
+
+        # Un choque por otra columna no se reintenta
+        with self.assertRaises(IntegrityError):
+            create_with_unique_username(
+                lambda username: self.create_user(username, "2"), "Ana", "Diaz"
+            )
+
+    def test_bulk_users_get_distinct_usernames(self):
+        from apps.sign.models import User
+        from apps.sign.services import bulk_create_users
+
+        self.create_user("lruiz", "1")
+        users = [
+            User(first_name="Luis", last_name="Ruiz", cedula="2"),
+            User(first_name="Lina", last_name="Ruiz", cedula="3"),
+            User(first_name="Eva", last_name="Mora", cedula="4"),
+            User(username="propio", first_name="Eva", last_name="Mora", cedula="5"),
+        ]
+        bulk_create_users(users)
+        self.assertEqual(
+            [user.username for user in users], ["lruiz1", "lruiz2", "emora", "propio"]
+        )
+        self.assertEqual(User.objects.count(), 5)
+
+
+class FailingEmailBackend:
+    """Backend de correo que falla siempre, para probar los reintentos."""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP no disponible")
+
+
+class EmailOutboxTests(TestCase):
+    def test_email_is_sent_after_commit(self):
+        from django.core import mail
+        from apps.sign.models import OutgoingEmail
+        from apps.sign.outbox import queue_email
+
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_email(
+                "Informe",
+                "Adjunto",
+                ["cliente@example.com"],
+                attachments=[("informe.pdf", b"%PDF", "application/pdf")],
+            )
+            self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments[0][1], b"%PDF")
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), ("sent", 1))
+        # El PDF no se conserva despues de enviar
+        self.assertFalse(email.attachments.exists())
+
+    def test_set_password_link_is_not_stored(self):
+        from urllib.parse import parse_qs, urlsplit
+        from django.core import mail
+        from apps.sign.models import OutgoingEmail, User
+        from apps.sign.services import send_set_password_email
+
+        user = User.objects.create_user(
+            username="nuevo", email="nuevo@example.com", cedula="nuevo"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            send_set_password_email(user)
+            self.assertEqual(OutgoingEmail.objects.get().body, "")
+
+        # Armar el correo no modifica al usuario
+        user.refresh_from_db()
+        self.assertFalse(user.has_usable_password())
+
+        link = mail.outbox[0].body.rsplit(": ", 1)[1]
+        query = parse_qs(urlsplit(link).query)
+        params = {key: value[0] for key, value in query.items()}
+        url = "/api/v1/sign/set_password"
+        response = self.client.post(url, {**params, "password": "Clave-segura-2024"})
+        self.assertEqual(response.status_code, 204)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password("Clave-segura-2024"))
+        self.assertNotIn(params["token"], OutgoingEmail.objects.get().body)
+
+        # El enlace es de un solo uso
+        response = self.client.post(url, {**params, "password": "Otra-clave-2024"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_old_emails_are_purged(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.sign.models import OutgoingEmail
+        from apps.sign.outbox import purge_outbox
+
+        old, recent, pending = [
+            OutgoingEmail.objects.create(
+                subject="Informe", from_email="a@example.com", to=[], status=status
+            )
+            for status in ("sent", "failed", "pending")
+        ]
+        OutgoingEmail.objects.filter(id__in=[old.id, pending.id]).update(
+            created_at=timezone.now() - timedelta(days=60)
+        )
+        purge_outbox()
+        remaining = set(OutgoingEmail.objects.values_list("id", flat=True))
+        self.assertEqual(remaining, {recent.id, pending.id})
+
+    @override_settings(
+        EMAIL_BACKEND="apps.sign.tests.FailingEmailBackend",
+        EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+        EMAIL_OUTBOX_RETRY_DELAY=60,
+    )
+    def test_failed_email_is_retried_with_backoff(self):
+        from django.utils import timezone
+        from apps.sign.models import OutgoingEmail
+        from apps.sign.outbox import queue_email, send_outbox
+
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_email("Informe", "Adjunto", ["cliente@example.com"])
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), ("pending", 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertIn("SMTP no disponible", email.last_error)
+
+        # Antes de la espera no se vuelve a intentar
+        send_outbox()
+        self.assertEqual(OutgoingEmail.objects.get().attempts, 1)
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        send_outbox()
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), ("failed", 2))
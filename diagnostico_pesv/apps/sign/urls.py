@@ -30,5 +30,7 @@ urlpatterns = [
     path("<int:id>", views.findById),
     path("findAllGroups", views.findAllGroups),
     path("change_password", views.change_password),
+    path("set_password", views.set_password),
+    path("<int:id>/resend_set_password", views.resend_set_password),
     path("menus/group", views.findMenusByGroups),
 ]
@@ -6,41 +6,45 @@ from rest_framework.decorators import (
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework import status
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import IsAuthenticated
 from .serializers import (
     UserSerializer,
     UserDetailSerializer,
     GroupSerializer,
-    MenuSerializer,
 )
-from .models import User, Menu
+from .models import User
 from utils.tokenManagement import (
     get_tokens_for_user,
 )  # Asegúrate de importar correctamente la función
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .authentication import CachedUserJWTAuthentication, ClaimsJWTAuthentication
 from apps.sign.permissions import IsSuperAdmin, IsConsultor, IsAdmin, GroupTypes
 from django.contrib.auth.models import Group
-import random
-import string
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
 from django.core.mail import send_mail
 from django.conf import settings
 from .services import (
-    send_temporary_password_email,
-    generate_username,
-    get_existing_usernames,
+    send_set_password_email,
+    create_with_unique_username,
+    user_from_set_password_token,
 )
 import traceback
 from django.db import transaction
+from utils.catalog import catalog_response
+from utils.pagination import UserKeysetPagination, paginate
 
 
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])  #
+@authentication_classes([ClaimsJWTAuthentication])  #
 def findAll(request):
     try:
-        users = User.objects.all()
-        serializer = UserDetailSerializer(users, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        users = User.objects.prefetch_related("groups")
+        return paginate(request, users, UserDetailSerializer, UserKeysetPagination)
+    except APIException:
+        # Cursor invalido u otros errores de DRF con su propio codigo
+        raise
     except Exception as ex:
         return Response(
             {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -48,7 +52,7 @@ def findAll(request):
 
 
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def findById(request: Request, id):
     """
@@ -65,7 +69,7 @@ def findById(request: Request, id):
 
 
 @api_view(["POST"])
-@authentication_classes([JWTAuthentication])  #
+@authentication_classes([ClaimsJWTAuthentication])  #
 def login(request):
     try:
         user = User.objects.get(email=request.data["email"])
@@ -94,7 +98,7 @@ def login(request):
 
 
 @api_view(["POST"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 def logout(request):
     try:
         refresh_token = request.data.get("refresh")
@@ -113,7 +117,7 @@ def logout(request):
 
 
 @api_view(["POST"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def register(request):
     try:
@@ -138,36 +142,27 @@ def register(request):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            # Asignar un nombre de usuario vacío por defecto
             username = request.data.get("username", None)
-            if not username:
-                request.data["username"] = first_name
 
             serializer = UserSerializer(data=request.data)
             if serializer.is_valid():
                 with transaction.atomic():
-                    temp_password = "".join(
-                        random.choices(string.ascii_letters + string.digits, k=8)
-                    )
-                    user = serializer.save()
-                    user.set_password(temp_password)
-                    user.groups.set(groups)
-
                     # Generar nombre de usuario único si no se proporcionó
-                    if not username:
-                        existing_usernames = get_existing_usernames()
-                        username = generate_username(
+                    if username:
+                        user = serializer.save()
+                    else:
+                        user = create_with_unique_username(
+                            lambda username: serializer.save(username=username),
                             first_name,
                             last_name,
-                            unique=True,
-                            existing_usernames=existing_usernames,
                         )
-                        user.username = username
-
+                    # El usuario asigna su contraseña con el enlace del correo
+                    user.set_unusable_password()
+                    user.groups.set(groups)
                     user.save()
 
-                    # Enviar correo con la contraseña temporal
-                    send_temporary_password_email(user, temp_password)
+                    # Enviar correo con el enlace para asignar la contraseña
+                    send_set_password_email(user)
 
                     # Genera tokens para el usuario registrado
                     refresh = RefreshToken.for_user(user)
@@ -195,7 +190,7 @@ def register(request):
 
 
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def profile(request):
     try:
@@ -209,7 +204,7 @@ def profile(request):
 
 
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def find_by_id(request: Request):
     try:
@@ -227,7 +222,7 @@ def find_by_id(request: Request):
 
 
 @api_view(["PATCH"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def update(request: Request):
     user_id = request.data.get("id")
@@ -240,7 +235,7 @@ def update(request: Request):
 
 
 @api_view(["PATCH"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def change_password(request: Request):
     try:
@@ -258,8 +253,60 @@ def change_password(request: Request):
         )
 
 
+@api_view(["POST"])
+@authentication_classes([])
+def set_password(request: Request):
+    """
+    Asigna la contraseña con el enlace de un solo uso enviado por correo
+    (uid, token y password en el cuerpo).
+    """
+    user = user_from_set_password_token(
+        str(request.data.get("uid", "")), str(request.data.get("token", ""))
+    )
+    if user is None:
+        return Response(
+            {"error": "El enlace no es válido o ya fue usado"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    password = request.data.get("password") or ""
+    try:
+        validate_password(password, user)
+    except ValidationError as ex:
+        return Response({"error": ex.messages}, status=status.HTTP_400_BAD_REQUEST)
+    user.set_password(password)
+    user.change_password = True
+    user.save(update_fields=["password", "change_password"])
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(["POST"])
+@authentication_classes([ClaimsJWTAuthentication])
+@permission_classes([IsAuthenticated])  # Requiere autenticación JWT
+def resend_set_password(request: Request, id):
+    """
+    Vuelve a enviar el enlace para asignar la contraseña, por ejemplo si el
+    correo del registro quedo descartado en la bandeja de salida.
+    """
+    if not (
+        IsAdmin().has_permission(request.user)
+        or IsSuperAdmin().has_permission(request.user)
+    ):
+        return Response(
+            {"error": "No tienes los privilegios para esta operación"},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+    try:
+        user = User.objects.get(pk=id)
+    except User.DoesNotExist:
+        return Response(
+            {"error": "Usuario no encontrado"}, status=status.HTTP_404_NOT_FOUND
+        )
+    send_set_password_email(user)
+    return Response(status=status.HTTP_202_ACCEPTED)
+
+
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def findAllConsultants(request):
     try:
@@ -274,7 +321,7 @@ def findAllConsultants(request):
 
 
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedUserJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def findAllGroups(request):
     try:
@@ -288,16 +335,16 @@ def findAllGroups(request):
 
 
 @api_view(["GET"])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedUserJWTAuthentication])
 @permission_classes([IsAuthenticated])  # Requiere autenticación JWT
 def findMenusByGroups(request: Request):
     try:
         groups_ids = request.query_params.get("groups", "")
-        if groups_ids:
-            groups_ids = groups_ids.split(",")
-        menus = Menu.objects.filter(groups__id__in=groups_ids).distinct()
-        serializer = MenuSerializer(menus, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        groups_ids = [int(item) for item in groups_ids.split(",") if item.isdigit()]
+        # Respuesta ya serializada por conjunto de grupos (ver apps.sign.catalogs)
+        return catalog_response(
+            request, "menus", select=lambda index: index.render(groups_ids)
+        )
     except Exception as ex:
         return Response(
             {"error": str(ex)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
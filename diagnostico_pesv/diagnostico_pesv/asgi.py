@@ -12,14 +12,18 @@ import django
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from django.core.asgi import get_asgi_application
-from . import routing
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "diagnostico_pesv.settings")
 django.setup()
 
+from apps.sign.middleware import JWTAuthMiddleware
+from . import routing
+
 application = ProtocolTypeRouter(
     {
         "http": get_asgi_application(),
-        "websocket": AuthMiddlewareStack(URLRouter(routing.ws_urlpatterns)),
+        "websocket": AuthMiddlewareStack(
+            JWTAuthMiddleware(URLRouter(routing.ws_urlpatterns))
+        ),
     }
 )
@@ -11,7 +11,6 @@ app = Celery("diagnostico_pesv")
 
 # Carga la configuración de Celery desde Django
 app.config_from_object("django.conf:settings", namespace="CELERY")
-app.conf.beat_schedule = {}
 
 # Descubre tareas en aplicaciones de Django
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
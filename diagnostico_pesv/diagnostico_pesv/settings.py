@@ -59,6 +59,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    "utils.compression.CompressionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -79,7 +80,7 @@ CORS_ALLOWED_ORIGINS = [
     "https://pesvapp.consultoriaycapacitacionhseq.com",
 ]
 CORS_ALLOW_METHODS = list(default_methods)
-CORS_ALLOW_HEADERS = list(default_headers)
+CORS_ALLOW_HEADERS = list(default_headers) + ["idempotency-key"]
 ROOT_URLCONF = "diagnostico_pesv.urls"
 
 TEMPLATES = [
@@ -119,6 +120,23 @@ DATABASES = {
     }
 }
 
+# Cache compartida entre workers (Redis), en desarrollo se usa memoria local
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -139,10 +157,24 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": {
-        "rest_framework_simplejwt.authentication.JWTAuthentication"
-    }
+        "apps.sign.authentication.ClaimsJWTAuthentication"
+    },
+    "DEFAULT_RENDERER_CLASSES": [
+        "utils.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "utils.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
+# Respuestas comprimidas (utils.compression) con brotli o gzip
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+COMPRESSION_CONTENT_TYPES = ("application/json", "text/html", "text/csv")
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=90),
@@ -152,6 +184,10 @@ SIMPLE_JWT = {
 }
 
 
+# Segundos que se guarda la copia del usuario de CachedUserJWTAuthentication,
+# se invalida antes si el usuario o sus grupos cambian
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", 60 * 5))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -243,8 +279,89 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 CELERY_RESULT_BACKEND = "django-db"
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+# Bandeja de salida de correos (apps.sign.outbox): correos por lote enviados
+# con una sola conexion SMTP, intentos maximos y espera base entre intentos
+# (se duplica en cada fallo, con tope de EMAIL_OUTBOX_MAX_DELAY segundos)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 50))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 6))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv("EMAIL_OUTBOX_RETRY_DELAY", 60))
+EMAIL_OUTBOX_MAX_DELAY = int(os.getenv("EMAIL_OUTBOX_MAX_DELAY", 60 * 60))
+# Cada cuanto celery beat revisa la bandeja por correos pendientes o reintentos
+EMAIL_OUTBOX_INTERVAL = int(os.getenv("EMAIL_OUTBOX_INTERVAL", 60))
+# Dias que se conservan los correos enviados o descartados
+EMAIL_OUTBOX_RETENTION_DAYS = int(os.getenv("EMAIL_OUTBOX_RETENTION_DAYS", 30))
+# Pagina del frontend donde el usuario nuevo asigna su contraseña, el correo
+# agrega ?uid=...&token=... (el enlace vence en PASSWORD_RESET_TIMEOUT segundos)
+SET_PASSWORD_URL = os.getenv(
+    "SET_PASSWORD_URL", "http://localhost:4200/auth/set-password"
+)
+
+CELERY_BEAT_SCHEDULE = {
+    # Reintentos y correos que no se pudieron encolar (ver apps.sign.outbox)
+    "send-email-outbox": {
+        "task": "sign.send_outbox",
+        "schedule": EMAIL_OUTBOX_INTERVAL,
+    },
+    "purge-email-outbox": {
+        "task": "sign.purge_outbox",
+        "schedule": 60 * 60,
     },
 }
+
+# Con CHANNEL_REDIS_URL (redis://host:6379/1) los mensajes de websocket pasan
+# por Redis y llegan a los sockets de todos los workers ASGI, sin ella se usa la
+# capa en memoria (un solo proceso, desarrollo y pruebas)
+CHANNEL_REDIS_URL = os.getenv("CHANNEL_REDIS_URL")
+if CHANNEL_REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [CHANNEL_REDIS_URL],
+                "prefix": "pesv:ws",
+                "group_expiry": 60 * 60 * 24,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
+# Websocket de diagnósticos: mensajes por segundo (y rafaga) permitidos a cada
+# cliente, tamaño maximo de sus mensajes y segundos que se agrupan los cambios
+# del checklist de un diagnóstico antes de enviarlos
+WEBSOCKET_RATE_LIMIT = float(os.getenv("WEBSOCKET_RATE_LIMIT", 5))
+WEBSOCKET_RATE_BURST = int(os.getenv("WEBSOCKET_RATE_BURST", 20))
+WEBSOCKET_MAX_MESSAGE_SIZE = int(os.getenv("WEBSOCKET_MAX_MESSAGE_SIZE", 1024))
+WEBSOCKET_COALESCE_WINDOW = float(os.getenv("WEBSOCKET_COALESCE_WINDOW", 0.25))
+
+# Los eventos de dominio (utils.events) se despachan en un pool de hilos al
+# confirmar la transaccion, con False se ejecutan en el mismo hilo
+DOMAIN_EVENTS_ASYNC = os.getenv("DOMAIN_EVENTS_ASYNC", "True") == "True"
+DOMAIN_EVENTS_MAX_WORKERS = int(os.getenv("DOMAIN_EVENTS_MAX_WORKERS", 4))
+
+# Respuestas guardadas para la cabecera Idempotency-Key (utils.idempotency)
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 60 * 60 * 24))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 300))
+
+# Segundos que se guarda el resumen de diagnosis_by_company, se invalida antes
+# si cambia algun diagnóstico o empresa
+DIAGNOSIS_SUMMARY_CACHE_TTL = int(os.getenv("DIAGNOSIS_SUMMARY_CACHE_TTL", 60 * 10))
+
+# Cache de find_company_by_nit, los NIT inexistentes se guardan menos tiempo
+COMPANY_NIT_CACHE_TTL = int(os.getenv("COMPANY_NIT_CACHE_TTL", 60 * 5))
+COMPANY_NIT_NEGATIVE_TTL = int(os.getenv("COMPANY_NIT_NEGATIVE_TTL", 30))
+
+# Resultados del autocompletado de CIIU (findCiiuByCode)
+CIIU_SEARCH_LIMIT = int(os.getenv("CIIU_SEARCH_LIMIT", 50))
+CIIU_SEARCH_MAX_LIMIT = int(os.getenv("CIIU_SEARCH_MAX_LIMIT", 500))
+
+# Registros de QueryLog (apps.sign.query_log_buffer): se guardan por lotes en
+# segundo plano, con False se guardan de inmediato
+QUERY_LOG_BUFFERED = os.getenv("QUERY_LOG_BUFFERED", "True") == "True"
+QUERY_LOG_BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", 200))
+QUERY_LOG_FLUSH_INTERVAL = float(os.getenv("QUERY_LOG_FLUSH_INTERVAL", 2))
+QUERY_LOG_MAX_PENDING = int(os.getenv("QUERY_LOG_MAX_PENDING", 10000))
@@ -0,0 +1,132 @@
+"""
+    Catalogos de datos de referencia en memoria (por proceso).
+
+    Cada catalogo carga sus datos con una sola funcion ``loader`` y los guarda
+    junto a la version vigente, que vive en la cache compartida
+    (``catalog:version:<nombre>``). Al guardar o eliminar alguno de los modelos
+    del catalogo se cambia la version cuando confirma la transaccion, y cada
+    proceso vuelve a cargar de forma perezosa en su siguiente lectura. Las
+    tablas intermedias de ManyToMany (``Menu.groups.through``) se escuchan con
+    ``m2m_changed``.
+
+    Los datos cargados se comparten entre hilos y peticiones, los loaders deben
+    retornar estructuras inmutables (tuplas, ``MappingProxyType``) y quien los
+    consume no debe modificarlos.
+
+    Ejemplo:
+        @register_catalog("missions", models=[Mission])
+        def load_missions():
+            return tuple(MissionSerializer(Mission.objects.all(), many=True).data)
+
+        missions = get_catalog("missions").get()
+"""
+
+import threading
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from .conditional import etag_matches
+
+_catalogs = {}
+
+
+class Catalog:
+    def __init__(self, name: str, loader, models=()):
+        self.name = name
+        self.loader = loader
+        self.models = tuple(models)
+        self._lock = threading.Lock()
+        self._snapshot = None
+        for model in self.models:
+            signals = (post_save, post_delete)
+            if model._meta.auto_created:
+                signals = (m2m_changed,)
+            for signal in signals:
+                signal.connect(
+                    self._model_changed,
+                    sender=model,
+                    weak=False,
+                    dispatch_uid=f"catalog:{name}:{model._meta.label}:{signal}",
+                )
+
+    @property
+    def version_key(self) -> str:
+        return f"catalog:version:{self.name}"
+
+    def version(self) -> str:
+        version = cache.get(self.version_key)
+        if version is None:
+            # Primera lectura o cache reiniciada, gana el primer proceso que la cree
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def snapshot(self):
+        """Retorna la tupla (version, datos) vigente, cargando si cambio la version."""
+        version = self.version()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot[0] != version:
+                    snapshot = (version, self.loader())
+                    self._snapshot = snapshot
+        return snapshot
+
+    def get(self):
+        return self.snapshot()[1]
+
+    def invalidate(self):
+        """Cambia la version compartida, todos los procesos recargan al leer."""
+        self._snapshot = None
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def _model_changed(self, action=None, **kwargs):
+        if action is not None and not action.startswith("post_"):
+            return
+        # La version se cambia al confirmar para que ningun proceso cargue y
+        # guarde con la nueva version datos que aun no son visibles
+        self._snapshot = None
+        transaction.on_commit(self.invalidate)
+
+
+def register_catalog(name: str, models=()):
+    """Registra la funcion decorada como loader del catalogo ``name``."""
+
+    def decorator(loader):
+        _catalogs[name] = Catalog(name, loader, models)
+        return loader
+
+    return decorator
+
+
+def get_catalog(name: str) -> Catalog:
+    return _catalogs[name]
+
+
+def catalog_response(request, name: str, select=None) -> Response:
+    """
+    Responde con los datos del catalogo usando GET condicional.
+
+    El ETag se deriva de la version del catalogo, si el cliente envia
+    ``If-None-Match`` con la version vigente se responde 304 sin cuerpo.
+
+    :param name: Nombre del catalogo registrado.
+    :param select: Funcion opcional que recibe los datos y retorna la parte a
+        responder (por ejemplo un filtro por id). Si retorna ``bytes`` se
+        responden tal cual como JSON ya serializado.
+    """
+    version, data = get_catalog(name).snapshot()
+    etag = f'"{name}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if select is not None:
+        data = select(data)
+    if isinstance(data, bytes):
+        return HttpResponse(data, content_type="application/json", headers=headers)
+    return Response(list(data), status=status.HTTP_200_OK, headers=headers)
@@ -0,0 +1,60 @@
+"""
+    Compresion de respuestas con brotli o gzip.
+
+    Igual a ``django.middleware.gzip.GZipMiddleware`` pero solo comprime las
+    respuestas de los tipos de ``COMPRESSION_CONTENT_TYPES`` que superen
+    ``COMPRESSION_MIN_SIZE`` bytes, y usa brotli si el cliente lo acepta.
+"""
+
+import brotli
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+re_accepts_gzip = _lazy_re_compile(r"\bgzip\b")
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    max_random_bytes = 100
+
+    def should_compress(self, response) -> bool:
+        if response.streaming or response.has_header("Content-Encoding"):
+            return False
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return False
+        content_type = response.get("Content-Type", "").split(";")[0].strip()
+        return content_type in settings.COMPRESSION_CONTENT_TYPES
+
+    def process_response(self, request, response):
+        if not self.should_compress(response):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if re_accepts_brotli.search(accept_encoding):
+            encoding = "br"
+            compressed_content = brotli.compress(
+                response.content, quality=settings.COMPRESSION_BROTLI_QUALITY
+            )
+        elif re_accepts_gzip.search(accept_encoding):
+            encoding = "gzip"
+            compressed_content = compress_string(
+                response.content, max_random_bytes=self.max_random_bytes
+            )
+        else:
+            return response
+
+        # Solo si realmente es mas corta
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+        # El ETag fuerte pasa a debil (RFC 9110 8.8.1), ver utils.catalog
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,151 @@
+"""
+    GET condicional (ETag / Last-Modified) a partir de ``updated_at``.
+
+    El validador de una respuesta se calcula con una consulta agregada por cada
+    queryset de origen (cantidad de filas y ``Max`` de los campos de fecha), sin
+    cargar ni serializar las filas. Si el cliente envia ``If-None-Match`` con el
+    ETag vigente se responde 304 y la vista no se ejecuta.
+
+    Los borrados se detectan por la cantidad de filas, por eso el 304 solo se
+    decide con el ETag; ``Last-Modified`` se envia como informacion.
+
+    Uso en viewsets:
+
+        class CompanyViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+            conditional_fields = ("updated_at", "company_diagnosis__updated_at")
+
+    y en acciones:
+
+        @action(detail=False)
+        @conditional_get(lambda view, request: [CheckList.objects.filter(...)])
+        def findQuestions(self, request): ...
+"""
+
+import hashlib
+from functools import wraps
+from django.db.models import Count, Max
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def etag_matches(request, etag: str) -> bool:
+    # GZipMiddleware / CompressionMiddleware convierten el ETag en debil (W/"...")
+    client_etags = [
+        tag.strip().removeprefix("W/")
+        for tag in request.headers.get("If-None-Match", "").split(",")
+    ]
+    return etag in client_etags or "*" in client_etags
+
+
+def compute_validator(request, sources, fields=("updated_at",)):
+    """
+    Calcula el ETag y la fecha de ultima modificacion de los origenes.
+
+    :param sources: Lista de querysets, tuplas (queryset, campos) o textos
+        (por ejemplo la version de un catalogo).
+    :param fields: Campos de fecha por defecto para los querysets sin campos.
+    :return: Tupla (etag, last_modified) con last_modified None si no hay fechas.
+    """
+    parts = [request.get_full_path(), str(request.user.pk)]
+    last_modified = None
+    for source in sources:
+        if isinstance(source, str):
+            parts.append(source)
+            continue
+        queryset, source_fields = (
+            source if isinstance(source, tuple) else (source, fields)
+        )
+        state = queryset.order_by().aggregate(
+            count=Count("pk", distinct=True),
+            **{f"max_{index}": Max(field) for index, field in enumerate(source_fields)},
+        )
+        parts.append(str(state.pop("count")))
+        for value in state.values():
+            parts.append(value.isoformat() if value else "")
+            if value and (last_modified is None or value > last_modified):
+                last_modified = value
+    digest = hashlib.md5("|".join(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"', last_modified
+
+
+def conditional_response(request, sources, build, fields=("updated_at",)):
+    """
+    Responde 304 si el cliente tiene la version vigente, si no llama ``build``.
+
+    :param build: Funcion sin argumentos que genera la respuesta completa.
+    """
+    etag, last_modified = compute_validator(request, sources, fields)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified.timestamp())
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response = build()
+    if response.status_code == status.HTTP_200_OK:
+        for name, value in headers.items():
+            response[name] = value
+    return response
+
+
+def conditional_get(get_sources=None):
+    """
+    Decorador de metodos de viewset para responder con GET condicional.
+
+    :param get_sources: Funcion (view, request) que retorna los origenes del
+        validador, o None para responder sin validador. Por defecto se usa
+        ``view.get_conditional_sources``.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != "GET":
+                return method(self, request, *args, **kwargs)
+            sources = (get_sources or type(self).get_conditional_sources)(
+                self, request
+            )
+            if sources is None:
+                return method(self, request, *args, **kwargs)
+            return conditional_response(
+                request, sources, lambda: method(self, request, *args, **kwargs)
+            )
+
+        return wrapper
+
+    return decorator
+
+
+class ConditionalGetMixin:
+    """
+    GET condicional para ``list`` y ``retrieve`` de un ModelViewSet.
+
+    Si el viewset redefine ``retrieve`` o ``list`` debe decorarlos con
+    ``@conditional_get()``.
+    """
+
+    # Campos de fecha del validador, se pueden incluir relaciones
+    conditional_fields = ("updated_at",)
+
+    def get_queryset(self):
+        # El validador y la vista usan el mismo queryset, se arma una sola vez
+        if getattr(self, "_conditional_queryset", None) is None:
+            self._conditional_queryset = super().get_queryset()
+        return self._conditional_queryset.all()
+
+    def get_conditional_sources(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            queryset = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        return [(queryset, self.conditional_fields)]
+
+    @conditional_get()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get()
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -22,3 +22,26 @@ class CompanySizeEnum(Enum):
     AVANZADO = 3
     ESTANDAR = 2
     BASICO = 1
+
+
+class DomainEvents(Enum):
+    """Nombres de los eventos publicados en utils.events"""
+
+    DIAGNOSIS_EXTERNAL_COUNT_COMPLETED = "diagnosis.external_count_completed"
+    CHECKLIST_DELTAS_APPLIED = "diagnosis.checklist_deltas_applied"
+    DIAGNOSIS_SCORE_CHANGED = "diagnosis.score_changed"
+    QUERY_LOGGED = "sign.query_logged"
+
+
+class EmailStatus(Enum):
+    """Estados de OutgoingEmail"""
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class EmailTemplates(Enum):
+    """Correos de OutgoingEmail cuyo cuerpo se arma al enviar (ver apps.sign.outbox)"""
+
+    SET_PASSWORD = "set_password"
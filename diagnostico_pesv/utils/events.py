@@ -0,0 +1,80 @@
+"""
+    Bus de eventos de dominio.
+
+    Los eventos se publican durante la peticion con ``publish`` y solo se despachan
+    cuando la transaccion confirma (``transaction.on_commit``), de modo que los
+    efectos secundarios (notificaciones, websockets, logs, cache) nunca se ejecutan
+    para datos que luego hacen rollback ni mantienen bloqueos de la base de datos.
+
+    Ejemplo:
+        @subscribe(DomainEvents.DIAGNOSIS_EXTERNAL_COUNT_COMPLETED.value)
+        def notify(diagnosis_id, **payload):
+            ...
+
+        publish(DomainEvents.DIAGNOSIS_EXTERNAL_COUNT_COMPLETED.value, diagnosis_id=diagnosis.id)
+
+    Los payloads deben contener solo datos simples (ids, textos), los handlers
+    consultan lo que necesiten.
+"""
+
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_handlers = defaultdict(list)
+_executor = None
+
+
+def subscribe(event_name: str):
+    """Registra la funcion decorada como handler del evento."""
+
+    def decorator(handler):
+        if handler not in _handlers[event_name]:
+            _handlers[event_name].append(handler)
+        return handler
+
+    return decorator
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "DOMAIN_EVENTS_MAX_WORKERS", 4),
+            thread_name_prefix="domain-events",
+        )
+    return _executor
+
+
+def _run_handlers(event_name: str, payload: dict):
+    try:
+        for handler in list(_handlers.get(event_name, [])):
+            try:
+                handler(**payload)
+            except Exception as ex:
+                logger.error(f"Error en handler {handler.__name__} de {event_name}: {ex}")
+    finally:
+        # Cada hilo del pool abre sus propias conexiones, se liberan al terminar
+        if getattr(settings, "DOMAIN_EVENTS_ASYNC", True):
+            connections.close_all()
+
+
+def dispatch(event_name: str, payload: dict):
+    """Ejecuta los handlers del evento, en segundo plano si DOMAIN_EVENTS_ASYNC."""
+    if getattr(settings, "DOMAIN_EVENTS_ASYNC", True):
+        _get_executor().submit(_run_handlers, event_name, payload)
+    else:
+        _run_handlers(event_name, payload)
+
+
+def publish(event_name: str, using=None, **payload):
+    """
+    Encola el evento para despacharlo cuando confirme la transaccion actual.
+
+    Fuera de un bloque atomic se despacha de inmediato.
+    """
+    transaction.on_commit(lambda: dispatch(event_name, payload), using=using)
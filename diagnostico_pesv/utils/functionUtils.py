@@ -93,6 +93,22 @@ def eliminar_tildes(texto):
     return "".join([c for c in nfkd_form if not unicodedata.category(c) == "Mn"])
 
 
+def normalize_search_terms(texto) -> list:
+    """
+    Separa el texto en palabras en minusculas y sin tildes, para busquedas por
+    prefijo (ver CompanySearchToken).
+
+    Parameters:
+    texto (str): Texto a normalizar.
+
+    Returns:
+    list: Palabras sin repetir, en el orden en que aparecen.
+    """
+    normalized = eliminar_tildes(texto or "").lower()
+    words = "".join(c if c.isalnum() else " " for c in normalized).split()
+    return list(dict.fromkeys(word[:100] for word in words))
+
+
 def validate_max_length(s: str, max_length: int) -> bool:
     return len(s) <= max_length
 
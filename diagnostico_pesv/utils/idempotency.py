@@ -0,0 +1,114 @@
+"""
+    Soporte para la cabecera ``Idempotency-Key`` en endpoints POST costosos.
+
+    La primera respuesta (status < 500) se guarda en la cache compartida y los
+    reintentos con la misma llave dentro del TTL la reciben sin volver a ejecutar
+    la vista. Si llega un duplicado mientras la primera ejecucion sigue en curso,
+    espera a que termine en vez de competir con ella.
+
+    Uso:
+        @action(detail=False, methods=[HTTPMethod.POST])
+        @idempotent()
+        def saveDiagnosis(self, request: Request):
+            ...
+"""
+
+import hashlib
+import json
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def _request_fingerprint(request) -> str:
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    query = json.dumps(sorted(request.query_params.lists()), default=str)
+    return hashlib.sha256(f"{query}|{body}".encode("utf-8")).hexdigest()
+
+
+def _replay(stored) -> Response:
+    return Response(
+        stored["data"],
+        status=stored["status"],
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+def _mismatch() -> Response:
+    return Response(
+        {"error": f"La llave {IDEMPOTENCY_HEADER} ya se uso con otra peticion"},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
+
+
+def idempotent(ttl: int = None, lock_timeout: int = None):
+    """
+    Decorador para acciones de ViewSet que acepta la cabecera Idempotency-Key.
+
+    :param ttl: Segundos que se conserva la respuesta (IDEMPOTENCY_KEY_TTL).
+    :param lock_timeout: Segundos maximos que se espera a una ejecucion en curso
+        (IDEMPOTENCY_LOCK_TIMEOUT).
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+
+            key_ttl = ttl or getattr(settings, "IDEMPOTENCY_KEY_TTL", 60 * 60 * 24)
+            timeout = lock_timeout or getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 300)
+            poll_interval = getattr(settings, "IDEMPOTENCY_POLL_INTERVAL", 0.2)
+
+            user_id = request.user.id if request.user.is_authenticated else "anon"
+            base_key = f"idempotency:{user_id}:{request.path}:{key}"
+            result_key = f"{base_key}:result"
+            lock_key = f"{base_key}:lock"
+            fingerprint = _request_fingerprint(request)
+
+            deadline = time.monotonic() + timeout
+            while True:
+                stored = cache.get(result_key)
+                if stored is not None:
+                    if stored["fingerprint"] != fingerprint:
+                        return _mismatch()
+                    return _replay(stored)
+                if cache.add(lock_key, fingerprint, timeout):
+                    break
+                running_fingerprint = cache.get(lock_key)
+                if running_fingerprint is not None and running_fingerprint != fingerprint:
+                    return _mismatch()
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {"error": "La peticion original aun se esta procesando"},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                time.sleep(poll_interval)
+
+            try:
+                response = view_method(self, request, *args, **kwargs)
+                # Los errores 5xx no se guardan para permitir reintentar
+                if response.status_code < 500 and hasattr(response, "data"):
+                    cache.set(
+                        result_key,
+                        {
+                            "fingerprint": fingerprint,
+                            "status": response.status_code,
+                            "data": response.data,
+                        },
+                        key_ttl,
+                    )
+                return response
+            finally:
+                cache.delete(lock_key)
+
+        return wrapper
+
+    return decorator
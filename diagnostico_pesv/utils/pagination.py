@@ -0,0 +1,110 @@
+"""
+    Paginacion por llave (keyset) sobre (created_at, id).
+
+    En vez de OFFSET, cada pagina se pide con el cursor de la ultima fila de la
+    anterior y se filtra ``(created_at, id) < (cursor_created_at, cursor_id)``,
+    asi el costo de una pagina no depende de que tan profunda sea. Requiere un
+    indice sobre (created_at, id) en la tabla.
+
+    Es opcional para no romper a los clientes que esperan la lista completa:
+    solo se pagina si la peticion envia ``?page_size=`` o ``?cursor=``.
+
+    Respuesta:
+        {"next": "<url con ?cursor=...>" | null, "results": [...]}
+"""
+
+import base64
+import json
+from datetime import datetime
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    ordering_field = "created_at"
+    page_size = 50
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, instance) -> str:
+        position = [getattr(instance, self.ordering_field).isoformat(), instance.pk]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, cursor: str):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return datetime.fromisoformat(value), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound("Cursor invalido")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if (
+            self.cursor_query_param not in params
+            and self.page_size_query_param not in params
+        ):
+            return None
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(f"-{self.ordering_field}", "-pk")
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f"{self.ordering_field}__lt": value})
+                | Q(**{self.ordering_field: value, "pk__lt": pk})
+            )
+
+        # Se pide una fila extra para saber si hay pagina siguiente
+        rows = list(queryset[: page_size + 1])
+        self.has_next = len(rows) > page_size
+        page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class UserKeysetPagination(KeysetPagination):
+    ordering_field = "date_joined"
+
+
+def paginate(request, queryset, serializer_class, pagination_class=KeysetPagination):
+    """
+    Pagina un queryset en vistas de funcion o acciones sin ``pagination_class``.
+
+    Si la peticion no pide paginacion se responde la lista completa como antes.
+    """
+    paginator = pagination_class()
+    page = paginator.paginate_queryset(queryset, request)
+    if page is None:
+        return Response(serializer_class(queryset, many=True).data)
+    return paginator.get_paginated_response(serializer_class(page, many=True).data)
@@ -0,0 +1,43 @@
+"""
+    Renderer y parser JSON de DRF con orjson.
+
+    orjson serializa directamente dict, list, UUID y numpy; para el resto
+    (fechas, Decimal, textos lazy, QuerySet...) se usa el encoder de DRF, asi
+    la salida es la misma que con ``JSONRenderer`` pero en menos tiempo. Las
+    fechas pasan por DRF (OPT_PASSTHROUGH_DATETIME) porque orjson las escribe
+    con microsegundos y ``+00:00`` y DRF con milisegundos y ``Z``.
+"""
+
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_SERIALIZE_NUMPY
+    | orjson.OPT_PASSTHROUGH_DATETIME
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Con indentacion (API navegable, ?indent=) se deja el renderer de DRF
+        if self.get_indent(accepted_media_type or "", renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
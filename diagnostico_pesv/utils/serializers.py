@@ -0,0 +1,67 @@
+"""
+    Utilidades de serializadores de solo lectura.
+
+    ``DynamicFieldsMixin`` permite a los clientes pedir solo lo que necesitan en
+    peticiones GET:
+
+        ?fields=id,name,company_detail.nit   -> solo esos campos (se permiten
+                                                campos anidados con punto)
+        ?expand=company_detail.company_diagnosis
+                                             -> incluye campos diferidos
+
+    Los campos diferidos son los declarados en ``Meta.expandable_fields`` o los
+    recibidos con el argumento ``deferred`` al anidar el serializador, no se
+    incluyen a menos que se pidan en ``?expand=``.
+"""
+
+
+def _split_param(value: str) -> list:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+class DynamicFieldsMixin:
+    def __init__(self, *args, deferred=(), **kwargs):
+        self._deferred = tuple(deferred)
+        super().__init__(*args, **kwargs)
+
+    def _field_path(self) -> str:
+        """Ruta con punto del serializador respecto a la raiz ('' en la raiz)."""
+        names = []
+        node = self
+        while getattr(node, "parent", None) is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return ".".join(reversed(names))
+
+    def _requested(self, param: str):
+        """Nombres pedidos en ``param`` para el nivel de este serializador."""
+        request = self.context.get("request")
+        if request is None or request.method != "GET":
+            return None
+        items = _split_param(request.query_params.get(param))
+        path = self._field_path()
+        prefix = f"{path}." if path else ""
+        names = {
+            item[len(prefix) :].split(".")[0]
+            for item in items
+            if item.startswith(prefix) and len(item) > len(prefix)
+        }
+        return names or None
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        expanded = self._requested("expand") or set()
+        deferred = set(getattr(self.Meta, "expandable_fields", ())) | set(
+            self._deferred
+        )
+        for name in deferred - expanded:
+            fields.pop(name, None)
+
+        selected = self._requested("fields")
+        if selected is not None:
+            for name in list(fields):
+                if name not in selected:
+                    fields.pop(name)
+        return fields
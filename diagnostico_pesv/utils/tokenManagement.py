@@ -1,7 +1,10 @@
 from rest_framework_simplejwt.tokens import RefreshToken
+from apps.sign.authentication import GROUPS_CLAIM, get_group_names
 
 def get_tokens_for_user(user):
     refresh = RefreshToken.for_user(user)
+    # Los grupos viajan en el token (ver apps.sign.authentication)
+    refresh[GROUPS_CLAIM] = sorted(get_group_names(user))
     return {
         'refresh': str(refresh),
         'access': str(refresh.access_token),